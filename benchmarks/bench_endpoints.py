@@ -0,0 +1,371 @@
+"""
+Benchmark de los endpoints de la API sobre bases de datos sintéticas de varios tamaños.
+
+Para cada tamaño se genera una base SQLite con `flask sembrar` (misma semilla,
+mismos datos) y se recorren todas las rutas de `resources.py` de dos formas:
+con el cliente de pruebas de Flask (secuencial, sin red) y contra un servidor
+WSGI real multihilo con varios clientes concurrentes. Por escenario se informa
+el rendimiento (peticiones/s), las latencias p50/p95/p99 y las sentencias SQL
+por petición. Los resultados se guardan en JSON y pueden compararse con una
+ejecución anterior (línea base) para detectar regresiones.
+
+Uso:
+    python benchmarks/bench_endpoints.py [--tamanos 1000,10000] [--peticiones 200] [--hilos 8]
+        [--modos cliente,wsgi] [--salida resultados.json] [--base base.json] [--tolerancia 0.25]
+        [--margen-ms 2]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from musica_api import create_app
+from musica_api.extensions import db
+from musica_api.sintetico import sembrar
+
+SEMILLA = 42
+
+
+class Escenario:
+    """
+    Petición a medir. `preparar(cliente, n)` se ejecuta sin medir antes de las
+    `n` peticiones (p. ej. para crear las filas que luego se eliminan) y
+    `peticion(i)` devuelve `(método, url, cuerpo)` de la i-ésima petición.
+    """
+
+    def __init__(self, nombre, peticion, preparar=None, peticiones=None):
+        self.nombre = nombre
+        self.peticion = peticion
+        self.preparar = preparar
+        self.peticiones = peticiones
+
+
+def escenarios(canciones, usuarios):
+    """
+    Escenarios que cubren todas las rutas de la API.
+
+    Args:
+        canciones (int): Número de canciones de la base de datos
+        usuarios (int): Número de usuarios de la base de datos
+
+    Returns:
+        list: Escenarios a medir
+    """
+    cancion = lambda i: 1 + (i * 7919) % canciones
+    usuario = lambda i: 1 + (i * 104729) % usuarios
+    contador = iter(range(10 ** 9))
+    creadas = {"canciones": [], "usuarios": [], "favoritos": []}
+
+    def crear(tipo, cuerpo_de):
+        def preparar(cliente, n):
+            ruta = {"canciones": "/api/canciones", "usuarios": "/api/usuarios", "favoritos": "/api/favoritos"}[tipo]
+            creadas[tipo] = [cliente.crear(ruta, cuerpo_de(next(contador))) for _ in range(n)]
+        return preparar
+
+    nueva_cancion = lambda i: {"titulo": f"Bench {i}", "artista": f"Artista bench {i % 50}", "genero": "Rock"}
+    nuevo_usuario = lambda i: {"nombre": f"Bench {i}", "correo": f"bench{i}-{time.time_ns()}@bench.test"}
+
+    return [
+        Escenario("ping", lambda i: ("GET", "/api/ping", None)),
+        Escenario("usuarios.listar", lambda i: ("GET", "/api/usuarios?limit=50", None)),
+        Escenario("usuarios.obtener", lambda i: ("GET", f"/api/usuarios/{usuario(i)}", None)),
+        Escenario("usuarios.lote_ids", lambda i: ("GET", f"/api/usuarios?ids={usuario(i)},{usuario(i + 1)},{usuario(i + 2)}", None)),
+        Escenario("usuarios.crear", lambda i: ("POST", "/api/usuarios", nuevo_usuario(next(contador)))),
+        Escenario("usuarios.actualizar", lambda i: ("PUT", f"/api/usuarios/{creadas['usuarios'][i]}", nuevo_usuario(next(contador))),
+                  preparar=crear("usuarios", nuevo_usuario)),
+        Escenario("usuarios.eliminar", lambda i: ("DELETE", f"/api/usuarios/{creadas['usuarios'][i]}", None),
+                  preparar=crear("usuarios", nuevo_usuario)),
+        Escenario("canciones.listar", lambda i: ("GET", "/api/canciones?limit=50", None)),
+        Escenario("canciones.listar_campos", lambda i: ("GET", "/api/canciones?limit=500&fields=id,titulo,artista", None)),
+        Escenario("canciones.listar_500", lambda i: ("GET", "/api/canciones?limit=500", None)),
+        Escenario("canciones.lote_ids", lambda i: ("GET", "/api/canciones?ids=" + ",".join(str(cancion(i + k)) for k in range(20)), None)),
+        Escenario("canciones.obtener", lambda i: ("GET", f"/api/canciones/{cancion(i)}", None)),
+        Escenario("canciones.crear", lambda i: ("POST", "/api/canciones", nueva_cancion(next(contador)))),
+        Escenario("canciones.importar_lote", lambda i: ("POST", "/api/canciones/lote",
+                                                        [nueva_cancion(next(contador)) for _ in range(50)])),
+        Escenario("canciones.actualizar", lambda i: ("PUT", f"/api/canciones/{creadas['canciones'][i]}", nueva_cancion(next(contador))),
+                  preparar=crear("canciones", nueva_cancion)),
+        Escenario("canciones.eliminar", lambda i: ("DELETE", f"/api/canciones/{creadas['canciones'][i]}", None),
+                  preparar=crear("canciones", nueva_cancion)),
+        Escenario("canciones.exportar", lambda i: ("GET", "/api/canciones/exportar?formato=ndjson&genero=Rock", None), peticiones=5),
+        Escenario("canciones.populares", lambda i: ("GET", "/api/canciones/populares?limit=50", None)),
+        Escenario("canciones.autocompletar", lambda i: ("GET", f"/api/canciones/autocompletar?q={'amnlcs'[i % 6]}", None)),
+        Escenario("canciones.buscar", lambda i: ("GET", "/api/canciones/buscar?q=amor&limit=50", None)),
+        Escenario("canciones.buscar_relevancia", lambda i: ("GET", "/api/canciones/buscar?q=noche&orden=relevancia&limit=50", None)),
+        Escenario("canciones.buscar_difusa", lambda i: ("GET", "/api/canciones/buscar?modo=difusa&q=corazn&limit=20", None)),
+        Escenario("favoritos.listar", lambda i: ("GET", "/api/favoritos?limit=50", None)),
+        Escenario("favoritos.crear", lambda i: ("POST", "/api/favoritos", {"id_usuario": usuario(i), "id_cancion": creadas["canciones"][i]}),
+                  preparar=crear("canciones", nueva_cancion)),
+        Escenario("favoritos.obtener", lambda i: ("GET", f"/api/favoritos/{creadas['favoritos'][i]}", None),
+                  preparar=crear("favoritos", lambda i: {"id_usuario": usuario(i), "id_cancion": cancion(i + 5)})),
+        Escenario("favoritos.eliminar", lambda i: ("DELETE", f"/api/favoritos/{creadas['favoritos'][i]}", None),
+                  preparar=crear("favoritos", lambda i: {"id_usuario": usuario(i), "id_cancion": cancion(i + 7)})),
+        Escenario("favoritos.exportar", lambda i: ("GET", f"/api/favoritos/exportar?formato=csv&id_usuario={usuario(i)}", None)),
+        Escenario("usuarios.favoritos", lambda i: ("GET", f"/api/usuarios/{usuario(i)}/favoritos?limit=50", None)),
+        Escenario("usuarios.recomendaciones", lambda i: ("GET", f"/api/usuarios/{usuario(i)}/recomendaciones", None)),
+        Escenario("usuarios.favoritos_lote", lambda i: ("POST", f"/api/usuarios/{usuario(i)}/favoritos/lote",
+                                                        {"agregar": [cancion(i + k) for k in range(10)]})),
+        Escenario("usuarios.marcar_favorito", lambda i: ("POST", f"/api/usuarios/{usuario(i)}/favoritos/{cancion(i + 11)}", None)),
+        Escenario("usuarios.desmarcar_favorito", lambda i: ("DELETE", f"/api/usuarios/{usuario(i)}/favoritos/{cancion(i + 11)}", None)),
+    ]
+
+
+class ClientePrueba:
+    """Peticiones con el cliente de pruebas de Flask (sin red)."""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def peticion(self, metodo, url, cuerpo):
+        respuesta = self.cliente.open(url, method=metodo, json=cuerpo)
+        respuesta.get_data()
+        return respuesta.status_code
+
+    def crear(self, url, cuerpo):
+        return self.cliente.post(url, json=cuerpo).get_json()["id"]
+
+
+class ClienteHTTP:
+    """Peticiones HTTP contra un servidor WSGI real, una conexión por petición."""
+
+    def __init__(self, puerto):
+        self.puerto = puerto
+
+    def peticion(self, metodo, url, cuerpo):
+        conexion = http.client.HTTPConnection("127.0.0.1", self.puerto, timeout=60)
+        try:
+            datos = json.dumps(cuerpo) if cuerpo is not None else None
+            cabeceras = {"Content-Type": "application/json"} if datos is not None else {}
+            conexion.request(metodo, url, body=datos, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            return respuesta.status
+        finally:
+            conexion.close()
+
+    def crear(self, url, cuerpo):
+        conexion = http.client.HTTPConnection("127.0.0.1", self.puerto, timeout=60)
+        try:
+            conexion.request("POST", url, body=json.dumps(cuerpo), headers={"Content-Type": "application/json"})
+            return json.loads(conexion.getresponse().read())["id"]
+        finally:
+            conexion.close()
+
+
+class ContadorSQL:
+    """Cuenta las sentencias SQL ejecutadas por el motor."""
+
+    def __init__(self, engine):
+        self.total = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args):
+        with self._lock:
+            self.total += 1
+
+
+def percentil(valores, p):
+    """Percentil por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+def medir(cliente, escenario, peticiones, hilos, contador, calentamiento=0):
+    """
+    Ejecuta las peticiones de un escenario y resume sus métricas. Los
+    escenarios de lectura se calientan antes con peticiones que no se miden.
+
+    Returns:
+        dict: Peticiones, errores, rendimiento, latencias (ms) y SQL por petición
+    """
+    peticiones = escenario.peticiones or peticiones
+    if escenario.preparar:
+        escenario.preparar(cliente, peticiones)
+    solicitudes = [escenario.peticion(i) for i in range(peticiones)]
+    if solicitudes[0][0] == "GET":
+        for i in range(min(calentamiento, peticiones)):
+            cliente.peticion(*solicitudes[i])
+    latencias, errores = [], 0
+
+    def ejecutar(solicitud):
+        inicio = time.perf_counter()
+        codigo = cliente.peticion(*solicitud)
+        return time.perf_counter() - inicio, codigo
+
+    sql_inicial = contador.total
+    inicio = time.perf_counter()
+    if hilos > 1:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            resultados = list(ejecutor.map(ejecutar, solicitudes))
+    else:
+        resultados = [ejecutar(s) for s in solicitudes]
+    duracion = time.perf_counter() - inicio
+
+    for latencia, codigo in resultados:
+        latencias.append(latencia * 1000)
+        if codigo >= 400:
+            errores += 1
+    return {
+        "peticiones": peticiones,
+        "errores": errores,
+        "rps": round(peticiones / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50), 3),
+        "p95_ms": round(percentil(latencias, 95), 3),
+        "p99_ms": round(percentil(latencias, 99), 3),
+        "sql_por_peticion": round((contador.total - sql_inicial) / peticiones, 2)
+    }
+
+
+def preparar_base(directorio, canciones):
+    """
+    Crea y siembra la base de datos de un tamaño.
+
+    Returns:
+        Flask: Aplicación conectada a la base sembrada
+    """
+    ruta = os.path.join(directorio, f"bench_{canciones}.db")
+    app = create_app("production", {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{ruta}",
+        "SECRET_KEY": "bench",
+        "CACHE_ENTIDADES": True
+    })
+    with app.app_context():
+        sembrar(db.engine, canciones, max(1, canciones // 10), canciones * 5, semilla=SEMILLA)
+        app.test_cli_runner().invoke(args=["recomendaciones", "--completo"])
+    return app
+
+
+def ejecutar_tamano(app, canciones, modos, peticiones, hilos, calentamiento):
+    """Mide todos los escenarios con los modos indicados para una base ya sembrada."""
+    resultados = {}
+    with app.app_context():
+        contador = ContadorSQL(db.engine)
+    for modo in modos:
+        if modo == "cliente":
+            cliente, hilos_modo, servidor = ClientePrueba(app), 1, None
+        else:
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            servidor = make_server("127.0.0.1", 0, app, threaded=True)
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            cliente, hilos_modo = ClienteHTTP(servidor.server_port), hilos
+        try:
+            resultados[modo] = {}
+            for escenario in escenarios(canciones, max(1, canciones // 10)):
+                metricas = medir(cliente, escenario, peticiones, hilos_modo, contador, calentamiento)
+                resultados[modo][escenario.nombre] = metricas
+                print(
+                    f"{canciones:>8} {modo:8} {escenario.nombre:30} {metricas['rps']:>9.1f} req/s  "
+                    f"p50 {metricas['p50_ms']:8.2f}  p95 {metricas['p95_ms']:8.2f}  "
+                    f"p99 {metricas['p99_ms']:8.2f} ms  sql {metricas['sql_por_peticion']:6.2f}  "
+                    f"errores {metricas['errores']}"
+                )
+        finally:
+            if servidor is not None:
+                servidor.shutdown()
+    return resultados
+
+
+def comparar(actual, base, tolerancia, margen_ms):
+    """
+    Compara una ejecución con la línea base.
+
+    Una regresión es un p95 mayor que el de la base en más de la tolerancia
+    relativa y del margen absoluto (para no marcar el ruido de los endpoints
+    de menos de un milisegundo), o más sentencias SQL por petición que en la base.
+
+    Returns:
+        list: Descripción de cada regresión encontrada
+    """
+    regresiones = []
+    for tamano, modos in actual["resultados"].items():
+        for modo, escenarios_actuales in modos.items():
+            referencia = base.get("resultados", {}).get(tamano, {}).get(modo, {})
+            for nombre, metricas in escenarios_actuales.items():
+                previo = referencia.get(nombre)
+                if previo is None:
+                    continue
+                limite = max(previo["p95_ms"] * (1 + tolerancia), previo["p95_ms"] + margen_ms)
+                if metricas["p95_ms"] > limite:
+                    regresiones.append(
+                        f"{tamano}/{modo}/{nombre}: p95 {previo['p95_ms']} -> {metricas['p95_ms']} ms"
+                    )
+                # Las cachés hacen que el promedio varíe en fracciones entre ejecuciones
+                if metricas["sql_por_peticion"] >= previo["sql_por_peticion"] + 0.5:
+                    regresiones.append(
+                        f"{tamano}/{modo}/{nombre}: SQL por petición "
+                        f"{previo['sql_por_peticion']} -> {metricas['sql_por_peticion']}"
+                    )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tamanos", default="1000,10000", help="Número de canciones por base, separados por comas")
+    parser.add_argument("--peticiones", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--hilos", type=int, default=8, help="Clientes concurrentes contra el servidor WSGI")
+    parser.add_argument("--modos", default="cliente,wsgi", help="'cliente', 'wsgi' o ambos")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--base", help="Resultados JSON de referencia con los que comparar")
+    parser.add_argument("--calentamiento", type=int, default=20, help="Peticiones de lectura sin medir por escenario")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento relativo de p95 tolerado")
+    parser.add_argument("--margen-ms", type=float, default=2.0, help="Aumento absoluto de p95 tolerado (ms)")
+    args = parser.parse_args()
+
+    actual = {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "peticiones": args.peticiones,
+            "hilos": args.hilos,
+            "calentamiento": args.calentamiento,
+            "semilla": SEMILLA
+        },
+        "resultados": {}
+    }
+    modos = [m for m in args.modos.split(",") if m]
+    with tempfile.TemporaryDirectory() as directorio:
+        for canciones in (int(t) for t in args.tamanos.split(",")):
+            app = preparar_base(directorio, canciones)
+            actual["resultados"][str(canciones)] = ejecutar_tamano(
+                app, canciones, modos, args.peticiones, args.hilos, args.calentamiento
+            )
+            with app.app_context():
+                db.engine.dispose()
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(actual, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            regresiones = comparar(actual, json.load(archivo), args.tolerancia, args.margen_ms)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto a la línea base")
+
+
+if __name__ == "__main__":
+    main()
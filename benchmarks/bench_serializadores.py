@@ -0,0 +1,91 @@
+"""
+Benchmark de serialización: `marshal` de flask-restx frente a los serializadores
+precompilados de `musica_api.serializadores`, sobre listados de 10.000 filas.
+Los serializadores compilados se miden con `json` de la biblioteca estándar y,
+si está instalado, con `orjson`.
+
+Uso:
+    python benchmarks/bench_serializadores.py [--filas 10000] [--repeticiones 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_restx import marshal
+
+from musica_api.api_models import cancion_pagina_model, favorito_pagina_model
+from musica_api.serializadores import compilar, orjson
+
+
+def _canciones(filas):
+    """Genera objetos con los atributos de `Cancion`."""
+    ahora = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        SimpleNamespace(
+            id=i, titulo=f"Canción {i}", artista=f"Artista {i % 500}", album=f"Álbum {i % 1000}",
+            duracion=180 + i % 120, año=1970 + i % 55, genero="Rock", fecha_creacion=ahora
+        )
+        for i in range(1, filas + 1)
+    ]
+
+
+def _favoritos(filas):
+    """Genera objetos con los atributos de `Favorito` y sus relaciones."""
+    ahora = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        SimpleNamespace(
+            id=i, id_usuario=i % 100, id_cancion=i, fecha_marcado=ahora,
+            usuario=SimpleNamespace(id=i % 100, nombre=f"Usuario {i % 100}"),
+            cancion=SimpleNamespace(id=i, titulo=f"Canción {i}", artista=f"Artista {i % 500}")
+        )
+        for i in range(1, filas + 1)
+    ]
+
+
+def _medir(funcion, repeticiones):
+    """Devuelve el mejor tiempo (en segundos) de varias ejecuciones."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Filas: {args.filas}  orjson: {'instalado' if orjson else 'no instalado'}")
+    casos = [
+        ("cancion", cancion_pagina_model, _canciones(args.filas)),
+        ("favorito", favorito_pagina_model, _favoritos(args.filas)),
+    ]
+    for nombre, modelo, elementos in casos:
+        sobre = {"items": elementos, "next": None}
+        serializar = compilar(modelo)
+        assert serializar(sobre) == marshal(sobre, modelo)
+
+        restx = _medir(lambda: json.dumps(marshal(sobre, modelo)).encode(), args.repeticiones)
+        codificadores = [
+            ("json", lambda datos: json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode())
+        ]
+        if orjson is not None:
+            codificadores.append(("orjson", orjson.dumps))
+        linea = f"{nombre:10} marshal+json: {restx * 1000:8.1f} ms"
+        for codificador, codificar in codificadores:
+            compilado = _medir(lambda: codificar(serializar(sobre)), args.repeticiones)
+            linea += f"  compilado+{codificador}: {compilado * 1000:8.1f} ms ({restx / compilado:4.1f}x)"
+        print(linea)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,37 +3,73 @@ Módulo principal de inicialización de la aplicación Flask.
 Configura la aplicación, las extensiones y registra los namespaces.
 """
 from flask import Flask
-from .extensions import api, db
+from .extensions import api, db, configurar_sqlite
 from .resources import ns
-from .config import get_config
+from .config import get_config, config_by_name, opciones_motor
+from .busqueda import asegurar_indice_fts
+from .cache import init_cache
+from .autocompletado import init_autocompletado, sincronizar
+from .recomendaciones import init_recomendaciones
+from .instrumentacion import init_instrumentacion
+from .metricas import init_metricas
+from .consultas_lentas import init_consultas_lentas
+from .comandos import registrar_comandos
+from .migraciones import migrar
 
-def create_app(config_name=None):
+def create_app(config_name=None, ajustes=None):
     """
     Crea y configura la aplicación Flask con sus extensiones.
     
     Args:
         config_name (str): Nombre de la configuración a utilizar (default, development, testing, production).
                           Si es None, se utiliza la configuración según las variables de entorno.
+        ajustes (dict): Valores de configuración que reemplazan a los del entorno elegido
+                        (p. ej. otra `SQLALCHEMY_DATABASE_URI` para pruebas de rendimiento).
     
     Returns:
         Flask: La aplicación Flask configurada y lista para usar.
     """
-    # TODO: Crear la app Flask
+    app = Flask(__name__)
     
     # Aplicar configuración según entorno
-    # FIXME: Debe usar el método para leer la configuración
-    config_obj = ""
+    config_obj = config_by_name.get(config_name) or get_config()
     app.config.from_object(config_obj)
+    if ajustes:
+        app.config.update(ajustes)
+    
+    # Opciones del motor según la URI final, si no se indicaron explícitamente
+    if "SQLALCHEMY_ENGINE_OPTIONS" not in app.config:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = opciones_motor(app.config["SQLALCHEMY_DATABASE_URI"])
     
     # Inicialización de extensiones
-    # TODO: las variables 'api' y 'db'
+    db.init_app(app)
+    api.init_app(app)
+    init_cache(app)
+    init_autocompletado(app)
+    init_recomendaciones(app)
+    init_instrumentacion(app)
+    init_metricas(app)
+    init_consultas_lentas(app)
     
-    # Registro de namespaces
+    # Registro de namespaces y comandos
     api.add_namespace(ns)
+    registrar_comandos(app)
     
-    # Crear todas las tablas en la base de datos
     with app.app_context():
-        db.create_all()
+        # PRAGMA de SQLite, registrados antes de abrir la primera conexión
+        configurar_sqlite(db.engine, app.config["SQLITE_PRAGMAS"])
+        
+        # Crear las tablas que falten y aplicar las migraciones pendientes
+        if app.config["MIGRAR_AL_INICIAR"]:
+            migrar(db.engine)
+        
+        # Índice de texto completo para la búsqueda de canciones (solo SQLite con FTS5)
+        if app.config["BUSQUEDA_FTS"]:
+            asegurar_indice_fts(db.engine)
+        
+        # Índice de prefijos para el autocompletado, construido a partir de las canciones existentes
+        if app.config["AUTOCOMPLETADO"]:
+            sincronizar(app.extensions["autocompletado"], db.engine)
     
     return app
 
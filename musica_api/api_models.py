@@ -36,12 +36,38 @@ cancion_model = api.inherit("Cancion", cancion_base, {
     "fecha_creacion": fields.DateTime(description="Fecha de creación del registro")
 })
 
+# Modelo para el informe de importación masiva de canciones
+error_fila_model = api.model("ErrorFila", {
+    "fila": fields.Integer(description="Número de fila (empezando en 1)"),
+    "error": fields.String(description="Motivo por el que la fila no se importó")
+})
+
+importacion_model = api.model("Importacion", {
+    "procesadas": fields.Integer(description="Filas leídas"),
+    "insertadas": fields.Integer(description="Filas insertadas"),
+    "errores": fields.List(fields.Nested(error_fila_model), description="Errores por fila")
+})
+
 # Modelos para Favorito
 favorito_input = api.model("FavoritoInput", {
     "id_usuario": fields.Integer(required=True, description="ID del usuario"),
     "id_cancion": fields.Integer(required=True, description="ID de la canción")
 })
 
+# Modelos para marcar/desmarcar favoritos en lote
+favoritos_lote_input = api.model("FavoritosLoteInput", {
+    "agregar": fields.List(fields.Integer, description="IDs de canciones a marcar como favoritas"),
+    "eliminar": fields.List(fields.Integer, description="IDs de canciones a desmarcar")
+})
+
+favoritos_lote_model = api.model("FavoritosLote", {
+    "agregadas": fields.List(fields.Integer, description="Canciones marcadas como favoritas"),
+    "ya_presentes": fields.List(fields.Integer, description="Canciones que ya eran favoritas"),
+    "inexistentes": fields.List(fields.Integer, description="Canciones a marcar que no existen"),
+    "eliminadas": fields.List(fields.Integer, description="Canciones desmarcadas"),
+    "no_marcadas": fields.List(fields.Integer, description="Canciones a desmarcar que no eran favoritas")
+})
+
 # Modelo para mostrar detalles completos de un favorito
 cancion_simple = api.model("CancionSimple", {
     "id": fields.Integer(description="ID de la canción"),
@@ -49,6 +75,14 @@ cancion_simple = api.model("CancionSimple", {
     "artista": fields.String(description="Artista de la canción")
 })
 
+cancion_popular_model = api.inherit("CancionPopular", cancion_simple, {
+    "favoritos_count": fields.Integer(description="Número de usuarios que la marcaron como favorita")
+})
+
+autocompletado_model = api.model("Autocompletado", {
+    "items": fields.List(fields.Nested(cancion_popular_model), description="Sugerencias ordenadas por popularidad")
+})
+
 usuario_simple = api.model("UsuarioSimple", {
     "id": fields.Integer(description="ID del usuario"),
     "nombre": fields.String(description="Nombre del usuario")
@@ -64,8 +98,97 @@ favorito_model = api.model("Favorito", {
 })
 
 # Modelo para mostrar canciones favoritas de un usuario
+cancion_favorita_model = api.inherit("CancionFavorita", cancion_simple, {
+    "fecha_marcado": fields.DateTime(description="Fecha en que se marcó como favorita")
+})
+
 favoritos_usuario_model = api.model("FavoritosUsuario", {
     "usuario": fields.Nested(usuario_simple),
-    "canciones_favoritas": fields.List(fields.Nested(cancion_simple))
+    "canciones_favoritas": fields.List(fields.Nested(cancion_favorita_model)),
+    "next": fields.String(description="Cursor opaco de la página siguiente (null en la última página)")
 })
 
+
+# Modelos para respuestas paginadas por cursor
+def modelo_paginado(nombre, modelo):
+    """
+    Crea el modelo de sobre (envelope) para un listado paginado.
+
+    Args:
+        nombre (str): Nombre del modelo en la documentación Swagger
+        modelo: Modelo de API de los elementos del listado
+
+    Returns:
+        Model: Modelo con los elementos y el cursor de la página siguiente
+    """
+    return api.model(nombre, {
+        "items": fields.List(fields.Nested(modelo), description="Elementos de la página"),
+        "next": fields.String(description="Cursor opaco de la página siguiente (null en la última página)")
+    })
+
+# Modelos para obtener varias entidades por ID en una sola petición
+def modelo_lote(nombre, modelo):
+    """
+    Crea el modelo de respuesta de una obtención en lote por IDs.
+
+    Args:
+        nombre (str): Nombre del modelo en la documentación Swagger
+        modelo: Modelo de API de los elementos
+
+    Returns:
+        Model: Modelo con los elementos encontrados y los IDs inexistentes
+    """
+    return api.model(nombre, {
+        "items": fields.List(fields.Nested(modelo), description="Elementos en el orden de los IDs pedidos"),
+        "inexistentes": fields.List(fields.Integer, description="IDs pedidos que no existen")
+    })
+
+usuario_lote_model = modelo_lote("UsuarioLote", usuario_model)
+cancion_lote_model = modelo_lote("CancionLote", cancion_model)
+
+usuario_pagina_model = modelo_paginado("UsuarioPagina", usuario_model)
+cancion_pagina_model = modelo_paginado("CancionPagina", cancion_model)
+favorito_pagina_model = modelo_paginado("FavoritoPagina", favorito_model)
+# Modelos para las recomendaciones de un usuario
+recomendacion_model = api.inherit("Recomendacion", cancion_simple, {
+    "puntaje": fields.Float(description="Suma de similitudes con las canciones favoritas del usuario")
+})
+
+recomendaciones_usuario_model = api.model("RecomendacionesUsuario", {
+    "usuario": fields.Nested(usuario_simple),
+    "recomendaciones": fields.List(fields.Nested(recomendacion_model))
+})
+
+cancion_popular_pagina_model = modelo_paginado("CancionPopularPagina", cancion_popular_model)
+
+# Modelos para la instrumentación acumulada por ruta
+instrumentacion_ruta_model = api.model("InstrumentacionRuta", {
+    "ruta": fields.String(description="Método y regla de URL"),
+    "peticiones": fields.Integer(description="Peticiones medidas"),
+    "consultas_media": fields.Float(description="Sentencias SQL por petición"),
+    "db_ms_medio": fields.Float(description="Tiempo medio en la base de datos (ms)"),
+    "serializacion_ms_medio": fields.Float(description="Tiempo medio de serialización (ms)"),
+    "total_ms_medio": fields.Float(description="Tiempo medio total (ms)"),
+    "total_ms_maximo": fields.Float(description="Tiempo total máximo (ms)")
+})
+
+instrumentacion_model = api.model("Instrumentacion", {
+    "rutas": fields.List(fields.Nested(instrumentacion_ruta_model))
+})
+
+# Modelos para el registro de consultas lentas
+consulta_lenta_model = api.model("ConsultaLenta", {
+    "fecha": fields.String(description="Momento de la consulta (ISO 8601, UTC)"),
+    "duracion_ms": fields.Float(description="Duración de la sentencia (ms)"),
+    "ruta": fields.String(description="Método y regla de URL de la petición que la originó"),
+    "sentencia": fields.String(description="SQL enviado al driver"),
+    "parametros": fields.Raw(description="Parámetros de la sentencia (truncados)"),
+    "executemany": fields.Boolean(description="Si se ejecutó con varios conjuntos de parámetros"),
+    "plan": fields.List(fields.String, description="Plan de ejecución (EXPLAIN QUERY PLAN / EXPLAIN)"),
+    "error_plan": fields.String(description="Error al obtener el plan, si lo hubo")
+})
+
+consultas_lentas_model = api.model("ConsultasLentas", {
+    "total": fields.Integer(description="Consultas lentas registradas desde el inicio del proceso"),
+    "items": fields.List(fields.Nested(consulta_lenta_model), description="Las más recientes primero")
+})
@@ -0,0 +1,336 @@
+"""
+Módulo de autocompletado de canciones.
+Mantiene en memoria un índice de prefijos (arreglo ordenado de claves
+normalizadas) sobre el título y el artista de las canciones, construido al
+iniciar la aplicación y actualizado al confirmar escrituras de `Cancion`.
+Los resultados se ordenan por número de favoritos.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from .extensions import db
+from .models import Cancion
+
+
+def normalizar(texto):
+    """
+    Normaliza un texto para compararlo por prefijos: minúsculas, sin acentos y
+    con los espacios colapsados.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        str: Texto normalizado
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_acentos.casefold().split())
+
+
+class IndicePrefijos:
+    """
+    Índice de prefijos acotado en número de canciones, seguro entre hilos.
+
+    Cada canción aporta como claves su título y su artista normalizados y, para
+    encontrar también palabras intermedias, el resto del texto a partir de cada
+    palabra. Si se alcanza el máximo, se conservan las canciones más populares:
+    un montículo de (popularidad, id) da la menos popular sin recorrer el
+    índice, y sus entradas obsoletas se descartan al consultarlo.
+    """
+
+    def __init__(self, maximo_canciones=100000, longitud_clave=40, maximo_candidatos=5000):
+        """
+        Args:
+            maximo_canciones (int): Número máximo de canciones indexadas
+            longitud_clave (int): Caracteres conservados de cada clave
+            maximo_candidatos (int): Claves recorridas como máximo por búsqueda
+        """
+        self.maximo_canciones = maximo_canciones
+        self.longitud_clave = longitud_clave
+        self.maximo_candidatos = maximo_candidatos
+        self._claves = []
+        self._canciones = {}
+        self._por_popularidad = []
+        self._lock = threading.RLock()
+        self.ultimo_id = 0
+        self.sincronizado = None
+
+    def __len__(self):
+        return len(self._canciones)
+
+    def _claves_de(self, titulo, artista):
+        """Claves de prefijo de una canción."""
+        claves = set()
+        for texto in (normalizar(titulo), normalizar(artista)):
+            palabras = texto.split(" ")
+            for i in range(len(palabras)):
+                clave = " ".join(palabras[i:])[:self.longitud_clave]
+                if clave:
+                    claves.add(clave)
+        return claves
+
+    def _registrar(self, id, titulo, artista, popularidad, claves):
+        """Guarda los datos de una canción y su entrada en el montículo de popularidad."""
+        self._canciones[id] = [titulo, artista, popularidad, claves]
+        heapq.heappush(self._por_popularidad, (popularidad, id))
+        # Compacta el montículo cuando las entradas obsoletas superan a las vigentes
+        if len(self._por_popularidad) > 2 * len(self._canciones) + 64:
+            self._reconstruir_popularidad()
+
+    def _reconstruir_popularidad(self):
+        """Reconstruye el montículo de popularidad a partir de las canciones indexadas."""
+        self._por_popularidad = [(cancion[2], id) for id, cancion in self._canciones.items()]
+        heapq.heapify(self._por_popularidad)
+
+    def _menos_popular(self):
+        """ID de la canción menos popular (la de menor ID si empatan), descartando entradas obsoletas."""
+        while self._por_popularidad:
+            popularidad, id = self._por_popularidad[0]
+            cancion = self._canciones.get(id)
+            if cancion is not None and cancion[2] == popularidad:
+                return id
+            heapq.heappop(self._por_popularidad)
+        return None
+
+    def agregar(self, id, titulo, artista, popularidad=0):
+        """
+        Indexa (o reindexa) una canción.
+
+        Args:
+            id (int): ID de la canción
+            titulo (str): Título
+            artista (str): Artista
+            popularidad (int): Número de favoritos
+        """
+        with self._lock:
+            self.ultimo_id = max(self.ultimo_id, id)
+            if id in self._canciones:
+                self.eliminar(id)
+            elif len(self._canciones) >= self.maximo_canciones:
+                if popularidad <= 0:
+                    return
+                menos_popular = self._menos_popular()
+                if self._canciones[menos_popular][2] >= popularidad:
+                    return
+                self.eliminar(menos_popular)
+
+            claves = self._claves_de(titulo, artista)
+            self._registrar(id, titulo, artista, popularidad, claves)
+            for clave in claves:
+                insort(self._claves, (clave, id))
+
+    def agregar_varias(self, filas):
+        """
+        Indexa muchas canciones de una vez, ordenando las claves al final en lugar
+        de insertarlas una a una (construcción inicial y cargas masivas).
+
+        Args:
+            filas: Iterable de (id, titulo, artista, popularidad)
+        """
+        with self._lock:
+            nuevas = []
+            for id, titulo, artista, popularidad in filas:
+                lleno = len(self._canciones) >= self.maximo_canciones
+                if lleno and popularidad <= 0 and id not in self._canciones:
+                    continue
+                if lleno or id in self._canciones:
+                    self._claves.extend(nuevas)
+                    self._claves.sort()
+                    nuevas = []
+                    self.agregar(id, titulo, artista, popularidad)
+                    continue
+                self.ultimo_id = max(self.ultimo_id, id)
+                claves = self._claves_de(titulo, artista)
+                self._registrar(id, titulo, artista, popularidad, claves)
+                nuevas.extend((clave, id) for clave in claves)
+            self._claves.extend(nuevas)
+            self._claves.sort()
+
+    def eliminar(self, id):
+        """
+        Elimina una canción del índice si está indexada.
+
+        Args:
+            id (int): ID de la canción
+        """
+        with self._lock:
+            cancion = self._canciones.pop(id, None)
+            if cancion is None:
+                return
+            for clave in cancion[3]:
+                posicion = bisect_left(self._claves, (clave, id))
+                if posicion < len(self._claves) and self._claves[posicion] == (clave, id):
+                    del self._claves[posicion]
+
+    def actualizar_popularidad(self, popularidades):
+        """
+        Reemplaza la popularidad de las canciones indexadas.
+
+        Args:
+            popularidades (dict): {id: favoritos}; las ausentes pasan a 0
+        """
+        with self._lock:
+            for id, cancion in self._canciones.items():
+                cancion[2] = popularidades.get(id, 0)
+            self._reconstruir_popularidad()
+
+    def buscar(self, texto, limite):
+        """
+        Busca las canciones cuyo título o artista (o alguna de sus palabras)
+        empieza por el texto, ordenadas por popularidad.
+
+        Args:
+            texto (str): Prefijo a buscar
+            limite (int): Número máximo de resultados
+
+        Returns:
+            list: Diccionarios con id, titulo, artista y favoritos_count
+        """
+        prefijo = normalizar(texto)[:self.longitud_clave]
+        if not prefijo:
+            return []
+        with self._lock:
+            ids = set()
+            posicion = bisect_left(self._claves, (prefijo,))
+            fin = min(len(self._claves), posicion + self.maximo_candidatos)
+            while posicion < fin and self._claves[posicion][0].startswith(prefijo):
+                ids.add(self._claves[posicion][1])
+                posicion += 1
+            mejores = heapq.nlargest(limite, ids, key=lambda i: (self._canciones[i][2], -i))
+            return [
+                {
+                    "id": id,
+                    "titulo": self._canciones[id][0],
+                    "artista": self._canciones[id][1],
+                    "favoritos_count": self._canciones[id][2]
+                }
+                for id in mejores
+            ]
+
+
+def init_autocompletado(app):
+    """
+    Crea el índice de autocompletado de la aplicación según su configuración.
+
+    Args:
+        app (Flask): Aplicación a configurar
+    """
+    if app.config["AUTOCOMPLETADO"]:
+        app.extensions["autocompletado"] = IndicePrefijos(
+            maximo_canciones=app.config["AUTOCOMPLETADO_MAXIMO_CANCIONES"],
+            longitud_clave=app.config["AUTOCOMPLETADO_LONGITUD_CLAVE"]
+        )
+
+
+def indice_actual():
+    """
+    Devuelve el índice de autocompletado de la aplicación actual.
+
+    Returns:
+        IndicePrefijos: El índice, o None si está deshabilitado o no hay contexto de aplicación
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("autocompletado")
+
+
+def sincronizar(indice, engine):
+    """
+    Indexa las canciones creadas fuera del ORM (importación masiva, carga de
+    datos) y refresca la popularidad de las indexadas. En la primera
+    sincronización se cargan las canciones más populares hasta el máximo.
+
+    Args:
+        indice (IndicePrefijos): Índice a sincronizar
+        engine: Motor SQLAlchemy
+    """
+    with engine.connect() as conexion:
+        if not inspect(conexion).has_table(Cancion.__tablename__):
+            return
+        columnas = (Cancion.id, Cancion.titulo, Cancion.artista, Cancion.favoritos_count)
+        if indice.sincronizado is None:
+            consulta = (
+                select(*columnas)
+                .order_by(Cancion.favoritos_count.desc(), Cancion.id.desc())
+                .limit(indice.maximo_canciones)
+            )
+        else:
+            consulta = select(*columnas).where(Cancion.id > indice.ultimo_id).order_by(Cancion.id)
+        ultimo_id = conexion.execute(select(Cancion.id).order_by(Cancion.id.desc()).limit(1)).scalar()
+
+        indice.agregar_varias(conexion.execution_options(yield_per=1000).execute(consulta))
+        indice.ultimo_id = max(indice.ultimo_id, ultimo_id or 0)
+
+        # El índice ix_cancion_populares permite leer solo las canciones con favoritos
+        indice.actualizar_popularidad(dict(conexion.execute(
+            select(Cancion.id, Cancion.favoritos_count).where(Cancion.favoritos_count > 0)
+        ).all()))
+    indice.sincronizado = time.monotonic()
+
+
+def autocompletar(texto, limite):
+    """
+    Obtiene sugerencias para un prefijo, sincronizando antes el índice si ha
+    pasado el intervalo configurado.
+
+    Args:
+        texto (str): Prefijo escrito por el usuario
+        limite (int): Número máximo de sugerencias
+
+    Returns:
+        list: Sugerencias ordenadas por popularidad, o None si el índice está deshabilitado
+    """
+    indice = indice_actual()
+    if indice is None:
+        return None
+    intervalo = current_app.config["AUTOCOMPLETADO_REFRESCO"]
+    if indice.sincronizado is None or time.monotonic() - indice.sincronizado > intervalo:
+        sincronizar(indice, db.engine)
+    return indice.buscar(texto, limite)
+
+
+# Actualización incremental ante escrituras de canciones a través del ORM. Los
+# cambios se aplican al confirmar la transacción y se descartan si se revierte.
+@event.listens_for(Cancion, "after_insert")
+@event.listens_for(Cancion, "after_update")
+def _registrar_cancion(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info.setdefault("autocompletado", []).append(
+            (target.id, (target.titulo, target.artista, target.favoritos_count or 0))
+        )
+
+
+@event.listens_for(Cancion, "after_delete")
+def _registrar_eliminacion(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info.setdefault("autocompletado", []).append((target.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_cambios(sesion):
+    """Aplica al índice los cambios de canciones de la transacción confirmada."""
+    cambios = sesion.info.pop("autocompletado", [])
+    indice = indice_actual()
+    if indice is None:
+        return
+    for id, datos in cambios:
+        if datos is None:
+            indice.eliminar(id)
+        else:
+            indice.agregar(id, *datos)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_cambios(sesion, transaccion_previa):
+    """Descarta los cambios pendientes de una transacción revertida."""
+    sesion.info.pop("autocompletado", None)
@@ -0,0 +1,199 @@
+"""
+Módulo de búsqueda de texto completo de canciones.
+Mantiene una tabla virtual FTS5 de SQLite sincronizada con `cancion` mediante
+triggers, y construye las consultas de búsqueda con un camino alternativo
+(`ilike`) para motores de base de datos sin FTS5.
+"""
+import re
+import weakref
+
+from flask import current_app
+from sqlalchemy import Float, event, false, func, literal_column, select, table, column, text, type_coerce
+
+from .extensions import db
+from .models import Cancion
+
+# Columnas de `cancion` indexadas en la tabla virtual
+COLUMNAS_FTS = ("titulo", "artista", "album", "genero")
+
+# Tabla virtual FTS5 (contenido externo: no duplica los datos de `cancion`)
+cancion_fts = table("cancion_fts", column("rowid"), *(column(c) for c in COLUMNAS_FTS))
+
+_columnas = ", ".join(COLUMNAS_FTS)
+_nuevas = ", ".join(f"new.{c}" for c in COLUMNAS_FTS)
+_antiguas = ", ".join(f"old.{c}" for c in COLUMNAS_FTS)
+
+_DDL_FTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS cancion_fts USING fts5("
+    f"{_columnas}, content='cancion', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS cancion_fts_ai AFTER INSERT ON cancion BEGIN "
+    f"INSERT INTO cancion_fts(rowid, {_columnas}) VALUES (new.id, {_nuevas}); END",
+    f"CREATE TRIGGER IF NOT EXISTS cancion_fts_ad AFTER DELETE ON cancion BEGIN "
+    f"INSERT INTO cancion_fts(cancion_fts, rowid, {_columnas}) VALUES ('delete', old.id, {_antiguas}); END",
+    f"CREATE TRIGGER IF NOT EXISTS cancion_fts_au AFTER UPDATE OF {_columnas} ON cancion BEGIN "
+    f"INSERT INTO cancion_fts(cancion_fts, rowid, {_columnas}) VALUES ('delete', old.id, {_antiguas}); "
+    f"INSERT INTO cancion_fts(rowid, {_columnas}) VALUES (new.id, {_nuevas}); END",
+)
+
+# Caché por motor de la disponibilidad de FTS5
+_fts_por_motor = weakref.WeakKeyDictionary()
+
+
+def _soporta_fts5(conexion):
+    """Indica si la conexión es SQLite compilado con FTS5."""
+    if conexion.dialect.name != "sqlite":
+        return False
+    opciones = conexion.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return "ENABLE_FTS5" in opciones
+
+
+def crear_indice_fts(conexion):
+    """
+    Crea la tabla virtual FTS5 y sus triggers si no existen.
+    Si la tabla se crea sobre una tabla `cancion` con datos, se reconstruye el índice.
+
+    Args:
+        conexion: Conexión SQLAlchemy sobre la que ejecutar el DDL
+
+    Returns:
+        bool: True si el índice FTS5 está disponible
+    """
+    if not _soporta_fts5(conexion):
+        return False
+    existia = conexion.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cancion_fts'"
+    ).first() is not None
+    for sentencia in _DDL_FTS:
+        conexion.exec_driver_sql(sentencia)
+    if not existia:
+        conexion.exec_driver_sql("INSERT INTO cancion_fts(cancion_fts) VALUES ('rebuild')")
+    return True
+
+
+def asegurar_indice_fts(engine):
+    """
+    Garantiza que el índice FTS5 exista en una base de datos ya creada.
+
+    Args:
+        engine: Motor SQLAlchemy de la aplicación
+
+    Returns:
+        bool: True si el índice FTS5 está disponible
+    """
+    with engine.begin() as conexion:
+        disponible = crear_indice_fts(conexion)
+    _fts_por_motor[engine] = disponible
+    return disponible
+
+
+@event.listens_for(Cancion.__table__, "after_create")
+def _crear_fts_tras_tabla(target, conexion, **kw):
+    """Crea el índice FTS5 junto con la tabla `cancion`."""
+    crear_indice_fts(conexion)
+
+
+@event.listens_for(Cancion.__table__, "before_drop")
+def _eliminar_fts_antes_tabla(target, conexion, **kw):
+    """Elimina la tabla virtual FTS5 antes de eliminar `cancion`."""
+    if _soporta_fts5(conexion):
+        conexion.exec_driver_sql("DROP TABLE IF EXISTS cancion_fts")
+
+
+def fts_disponible():
+    """
+    Indica si la búsqueda FTS5 puede usarse con el motor de la aplicación actual.
+
+    Returns:
+        bool: True si FTS5 está habilitado en la configuración y en la base de datos
+    """
+    if not current_app.config.get("BUSQUEDA_FTS", True):
+        return False
+    engine = db.engine
+    if engine not in _fts_por_motor:
+        with engine.connect() as conexion:
+            _fts_por_motor[engine] = _soporta_fts5(conexion) and conexion.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cancion_fts'"
+            ).first() is not None
+    return _fts_por_motor[engine]
+
+
+def expresion_fts(texto, columnas=None):
+    """
+    Convierte texto libre en una expresión MATCH de FTS5 segura.
+    Cada palabra se cita (para neutralizar la sintaxis de FTS5) y se busca por prefijo.
+
+    Args:
+        texto (str): Texto introducido por el usuario
+        columnas (tuple): Columnas a las que restringir la búsqueda (todas si es None)
+
+    Returns:
+        str: Expresión MATCH, o None si el texto no contiene palabras
+    """
+    palabras = re.findall(r"\w+", texto or "")
+    if not palabras:
+        return None
+    terminos = " ".join(f'"{p}"*' for p in palabras)
+    if columnas:
+        return f"{{{' '.join(columnas)}}} : ({terminos})"
+    return terminos
+
+
+def buscar(q=None, titulo=None, artista=None, genero=None, ranking=False):
+    """
+    Construye la consulta de búsqueda de canciones.
+
+    Con FTS5 disponible, `q`, `titulo` y `artista` se resuelven contra el índice
+    de texto completo (búsqueda por palabras y prefijos). En otros motores se
+    usa `ilike` como alternativa.
+
+    Args:
+        q (str): Texto libre sobre título, artista, álbum y género
+        titulo (str): Texto a buscar en el título
+        artista (str): Texto a buscar en el artista
+        genero (str): Género exacto
+        ranking (bool): Si se ordena por relevancia (bm25) en lugar de por ID
+
+    Returns:
+        tuple: (consulta, columnas_orden) donde la consulta devuelve filas
+        `(Cancion, puntaje, id)` si se ordena por relevancia y objetos `Cancion`
+        en otro caso
+    """
+    query = Cancion.query
+    puntaje = None
+
+    if fts_disponible():
+        filtros = [(q, None), (titulo, ("titulo",)), (artista, ("artista",))]
+        expresiones = [expresion_fts(texto, columnas) for texto, columnas in filtros if texto]
+        if None in expresiones:
+            # Un filtro indicado sin palabras (p. ej. solo signos) no coincide con
+            # ninguna canción, igual que con `ilike`
+            query = query.filter(false())
+        elif expresiones:
+            coincidencias = select(
+                cancion_fts.c.rowid.label("id"),
+                # Tipado como Float para que el cursor de paginación valide el puntaje
+                type_coerce(func.bm25(literal_column("cancion_fts")), Float).label("puntaje"),
+            ).where(
+                text("cancion_fts MATCH :expresion").bindparams(
+                    expresion=" AND ".join(f"({e})" for e in expresiones)
+                )
+            ).subquery("coincidencias")
+            query = query.join(coincidencias, coincidencias.c.id == Cancion.id)
+            puntaje = coincidencias.c.puntaje
+    else:
+        if q:
+            query = query.filter(db.or_(*(
+                getattr(Cancion, c).ilike(f"%{q}%") for c in COLUMNAS_FTS
+            )))
+        if titulo:
+            query = query.filter(Cancion.titulo.ilike(f"%{titulo}%"))
+        if artista:
+            query = query.filter(Cancion.artista.ilike(f"%{artista}%"))
+
+    if genero:
+        query = query.filter(Cancion.genero == genero)
+
+    if ranking and puntaje is not None:
+        return query.add_columns(puntaje, Cancion.id.label("id")), [puntaje, Cancion.id]
+    return query, [Cancion.id]
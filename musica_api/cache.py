@@ -0,0 +1,249 @@
+"""
+Módulo de caché en proceso para lecturas frecuentes de entidades.
+Implementa una caché LRU con caducidad (TTL) y contadores de aciertos, fallos
+y desalojos. Las entradas se invalidan desde los eventos de `models.py` al
+confirmar cada transacción, y una lectura concurrente que cargó la fila antes
+del commit no puede volver a guardar una versión anterior a la invalidada.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from .extensions import db
+
+
+class CacheLRU:
+    """
+    Caché LRU acotada en tamaño y con tiempo de vida por entrada, segura entre hilos.
+    """
+
+    def __init__(self, tamano_maximo=10000, ttl=300):
+        """
+        Args:
+            tamano_maximo (int): Número máximo de entradas
+            ttl (float): Segundos de vida de cada entrada (0 para no caducar)
+        """
+        self.tamano_maximo = tamano_maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._versiones_minimas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave):
+        """
+        Obtiene un valor de la caché.
+
+        Args:
+            clave: Clave de la entrada
+
+        Returns:
+            El valor almacenado, o None si no existe o caducó
+        """
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            valor, caducidad = entrada
+            if caducidad and caducidad < time.monotonic():
+                del self._datos[clave]
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor, version=None):
+        """
+        Guarda un valor, desalojando la entrada menos usada si se supera el tamaño.
+        Se descarta si su versión es anterior a la mínima fijada al invalidar la clave.
+
+        Args:
+            clave: Clave de la entrada
+            valor: Valor a almacenar
+            version (int): Versión de la fila leída, si se conoce
+        """
+        ahora = time.monotonic()
+        caducidad = ahora + self.ttl if self.ttl else None
+        with self._lock:
+            minima = self._versiones_minimas.get(clave)
+            if minima is not None and (minima[1] is None or minima[1] >= ahora):
+                if version is not None and version < minima[0]:
+                    return
+            self._datos[clave] = (valor, caducidad)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano_maximo:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self, clave, version_minima=None):
+        """
+        Elimina una entrada de la caché si existe.
+
+        Args:
+            clave: Clave de la entrada
+            version_minima (int): Versión mínima que se aceptará al volver a
+                guardar la clave durante el TTL (lecturas en curso de la fila anterior)
+        """
+        with self._lock:
+            if self._datos.pop(clave, None) is not None:
+                self.invalidaciones += 1
+            if version_minima is not None:
+                caducidad = time.monotonic() + self.ttl if self.ttl else None
+                self._versiones_minimas[clave] = (version_minima, caducidad)
+                self._versiones_minimas.move_to_end(clave)
+                while len(self._versiones_minimas) > self.tamano_maximo:
+                    self._versiones_minimas.popitem(last=False)
+
+    def limpiar(self):
+        """Elimina todas las entradas."""
+        with self._lock:
+            self._datos.clear()
+            self._versiones_minimas.clear()
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            dict: Entradas, aciertos, fallos, desalojos, invalidaciones y tasa de aciertos
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "invalidaciones": self.invalidaciones,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0
+            }
+
+
+def init_cache(app):
+    """
+    Crea la caché de entidades de la aplicación según su configuración.
+
+    Args:
+        app (Flask): Aplicación a configurar
+    """
+    if app.config["CACHE_ENTIDADES"]:
+        app.extensions["cache_entidades"] = CacheLRU(
+            tamano_maximo=app.config["CACHE_TAMANO_MAXIMO"],
+            ttl=app.config["CACHE_TTL"]
+        )
+
+
+def cache_actual():
+    """
+    Devuelve la caché de entidades de la aplicación actual.
+
+    Returns:
+        CacheLRU: La caché, o None si está deshabilitada o no hay contexto de aplicación
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("cache_entidades")
+
+
+def clave_entidad(modelo, id):
+    """Clave de caché de una entidad."""
+    return (modelo.__name__, id)
+
+
+def obtener_entidad(modelo, id):
+    """
+    Obtiene una entidad por su clave primaria pasando por la caché (read-through).
+
+    En un acierto se devuelve una instancia desconectada de la sesión, reconstruida
+    a partir de los valores de columna almacenados, apta solo para lectura.
+
+    Args:
+        modelo: Clase del modelo (Cancion o Usuario)
+        id (int): Clave primaria
+
+    Returns:
+        La entidad, o None si no existe
+    """
+    cache = cache_actual()
+    if cache is None:
+        return db.session.get(modelo, id)
+
+    clave = clave_entidad(modelo, id)
+    valores = cache.obtener(clave)
+    if valores is not None:
+        return _desde_valores(modelo, valores)
+
+    entidad = db.session.get(modelo, id)
+    if entidad is not None:
+        cache.guardar(clave, _valores(entidad), entidad.version)
+    return entidad
+
+
+def obtener_entidades(modelo, ids):
+    """
+    Obtiene varias entidades por clave primaria pasando por la caché: las que no
+    están en caché se resuelven con una única consulta `IN` y se almacenan.
+
+    Args:
+        modelo: Clase del modelo (Cancion o Usuario)
+        ids (list): Claves primarias
+
+    Returns:
+        dict: {id: entidad} con las entidades encontradas
+    """
+    cache = cache_actual()
+    encontradas = {}
+    faltantes = list(ids)
+    if cache is not None:
+        faltantes = []
+        for id in ids:
+            valores = cache.obtener(clave_entidad(modelo, id))
+            if valores is None:
+                faltantes.append(id)
+            else:
+                encontradas[id] = _desde_valores(modelo, valores)
+
+    if faltantes:
+        for entidad in db.session.scalars(db.select(modelo).where(modelo.id.in_(faltantes))):
+            encontradas[entidad.id] = entidad
+            if cache is not None:
+                cache.guardar(clave_entidad(modelo, entidad.id), _valores(entidad), entidad.version)
+    return encontradas
+
+
+def _valores(entidad):
+    """Valores de columna de una entidad, tal como se guardan en la caché."""
+    return {
+        atributo.key: getattr(entidad, atributo.key)
+        for atributo in inspect(type(entidad)).column_attrs
+    }
+
+
+def _desde_valores(modelo, valores):
+    """Reconstruye una instancia desconectada a partir de los valores en caché."""
+    entidad = modelo(**valores)
+    make_transient_to_detached(entidad)
+    return entidad
+
+
+def invalidar_entidad(modelo, id, version_minima=None):
+    """
+    Invalida la entrada de caché de una entidad.
+
+    Args:
+        modelo: Clase del modelo (Cancion o Usuario)
+        id (int): Clave primaria
+        version_minima (int): Versión mínima que se aceptará al volver a guardarla
+    """
+    cache = cache_actual()
+    if cache is not None and id is not None:
+        cache.invalidar(clave_entidad(modelo, id), version_minima)
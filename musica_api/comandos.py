@@ -0,0 +1,89 @@
+"""
+Módulo de comandos de línea de órdenes (`flask <comando>`).
+Agrupa las tareas de mantenimiento de la base de datos.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .extensions import db
+from .migraciones import MIGRACIONES, migrar, version_actual
+from .models import reconciliar_favoritos_count
+from .recomendaciones import recalcular_completo, recalcular_pendientes
+from .sintetico import sembrar
+
+
+@click.command("migrar")
+@click.option("--estado", is_flag=True, help="Muestra la versión del esquema sin aplicar cambios.")
+@with_appcontext
+def migrar_comando(estado):
+    """Aplica las migraciones pendientes del esquema."""
+    if estado:
+        with db.engine.begin() as conexion:
+            actual = version_actual(conexion)
+        click.echo(f"Versión del esquema: {actual} (última disponible: {MIGRACIONES[-1][0]})")
+        return
+    aplicadas = migrar(db.engine)
+    if aplicadas:
+        click.echo(f"Migraciones aplicadas: {', '.join(map(str, aplicadas))}")
+    else:
+        click.echo("El esquema ya está actualizado")
+
+
+@click.command("reconciliar-favoritos")
+@with_appcontext
+def reconciliar_favoritos_comando():
+    """Recalcula los contadores de favoritos de las canciones."""
+    with db.engine.begin() as conexion:
+        corregidas = reconciliar_favoritos_count(conexion)
+    click.echo(f"Canciones corregidas: {corregidas}")
+
+
+@click.command("recomendaciones")
+@click.option("--completo", is_flag=True, help="Reconstruye todo el índice en lugar de solo las canciones pendientes.")
+@with_appcontext
+def recomendaciones_comando(completo):
+    """Actualiza el índice de canciones similares usado por las recomendaciones."""
+    recalcular = recalcular_completo if completo else recalcular_pendientes
+    total = recalcular(
+        db.engine,
+        current_app.config["RECOMENDACIONES_TOP_K"],
+        current_app.config["RECOMENDACIONES_TAMANO_LOTE"]
+    )
+    click.echo(f"Canciones recalculadas: {total}")
+
+
+@click.command("sembrar")
+@click.option("--canciones", default=1000, show_default=True, help="Número de canciones.")
+@click.option("--usuarios", default=100, show_default=True, help="Número de usuarios.")
+@click.option("--favoritos", default=10000, show_default=True, help="Número aproximado de favoritos.")
+@click.option("--zipf", "exponente", default=1.0, show_default=True, help="Exponente de la ley de Zipf de la popularidad.")
+@click.option("--semilla", default=42, show_default=True, help="Semilla de la generación (misma semilla, mismos datos).")
+@click.option("--lote", "tamano_lote", type=int, default=None, help="Filas por lote (por defecto SEMBRADO_TAMANO_LOTE).")
+@with_appcontext
+def sembrar_comando(canciones, usuarios, favoritos, exponente, semilla, tamano_lote):
+    """Genera datos sintéticos deterministas para pruebas de escala."""
+    insertadas = sembrar(
+        db.engine, canciones, usuarios, favoritos,
+        exponente=exponente,
+        semilla=semilla,
+        tamano_lote=tamano_lote or current_app.config["SEMBRADO_TAMANO_LOTE"]
+    )
+    click.echo(
+        f"Canciones: {insertadas['canciones']}, usuarios: {insertadas['usuarios']}, "
+        f"favoritos: {insertadas['favoritos']}"
+    )
+    click.echo("Ejecuta `flask recomendaciones --completo` para reconstruir el índice de similitud")
+
+
+def registrar_comandos(app):
+    """
+    Registra los comandos de la aplicación en `app.cli`.
+
+    Args:
+        app (Flask): Aplicación a configurar
+    """
+    app.cli.add_command(migrar_comando)
+    app.cli.add_command(reconciliar_favoritos_comando)
+    app.cli.add_command(recomendaciones_comando)
+    app.cli.add_command(sembrar_comando)
@@ -0,0 +1,83 @@
+"""
+Módulo de peticiones condicionales HTTP.
+Deriva ETags fuertes de la columna `version` de las entidades y evalúa las
+cabeceras `If-None-Match` (lecturas) e `If-Match` (escrituras).
+"""
+import hashlib
+
+from flask import request
+
+
+def valor_etag(entidad):
+    """
+    Calcula el valor (sin comillas) del ETag de una entidad versionada.
+
+    Args:
+        entidad: Instancia de un modelo con columnas `id` y `version`
+
+    Returns:
+        str: Valor del ETag, único por tabla, fila y versión
+    """
+    return f"{entidad.__tablename__}-{entidad.id}-{entidad.version}"
+
+
+def valor_etag_lote(entidades):
+    """
+    Calcula el valor del ETag de una lista ordenada de entidades versionadas:
+    cambia si cambia, se añade o se elimina cualquiera de ellas.
+
+    Args:
+        entidades (list): Instancias de modelos versionados, en el orden de la respuesta
+
+    Returns:
+        str: Valor del ETag de la colección
+    """
+    resumen = hashlib.sha1("|".join(valor_etag(e) for e in entidades).encode("utf-8"))
+    return f"lote-{resumen.hexdigest()}"
+
+
+def _valor(objetivo):
+    """Admite una entidad versionada o un valor de ETag ya calculado."""
+    return objetivo if isinstance(objetivo, str) else valor_etag(objetivo)
+
+
+def cabeceras_etag(entidad):
+    """
+    Construye la cabecera ETag de una entidad.
+
+    Args:
+        entidad: Instancia de un modelo versionado o valor de ETag ya calculado
+
+    Returns:
+        dict: Cabeceras HTTP a añadir a la respuesta
+    """
+    return {"ETag": f'"{_valor(entidad)}"'}
+
+
+def no_modificado(entidad):
+    """
+    Indica si la representación que tiene el cliente sigue vigente (If-None-Match).
+
+    Args:
+        entidad: Instancia de un modelo versionado o valor de ETag ya calculado
+
+    Returns:
+        bool: True si se puede responder 304 Not Modified
+    """
+    return request.if_none_match.contains_weak(_valor(entidad))
+
+
+def precondicion_fallida(entidad):
+    """
+    Indica si una escritura debe rechazarse por `If-Match` (comparación fuerte).
+    Sin cabecera `If-Match` la escritura siempre se permite.
+
+    Args:
+        entidad: Instancia de un modelo versionado
+
+    Returns:
+        bool: True si se debe responder 412 Precondition Failed
+    """
+    if "If-Match" not in request.headers:
+        return False
+    return not request.if_match.contains(valor_etag(entidad))
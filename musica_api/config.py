@@ -8,28 +8,135 @@ from dotenv import load_dotenv
 # Cargar variables de entorno desde archivo .env si existe
 load_dotenv()
 
+def opciones_motor(uri):
+    """
+    Calcula las opciones del motor SQLAlchemy según el tipo de base de datos.
+    
+    Args:
+        uri (str): URI de conexión a la base de datos
+    
+    Returns:
+        dict: Opciones para SQLALCHEMY_ENGINE_OPTIONS. En SQLite la concurrencia se
+              ajusta con PRAGMA (ver SQLITE_PRAGMAS); en servidores se dimensiona el pool.
+    """
+    if uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_pre_ping': True
+    }
+
 class Config:
     """Configuración base para la aplicación."""
     # Configuración de la base de datos
-    # FIXME: la ubicación de la base de datos no funciona
-    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite://Users/Admin/Public/musica.db')
+    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///musica.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', 'False').lower() == 'true'
+    # SQLALCHEMY_ENGINE_OPTIONS se calcula en create_app con opciones_motor a partir
+    # de la URI final, salvo que una configuración o los ajustes la definan
+    
+    # Aplicar las migraciones del esquema al crear la aplicación (o usar `flask migrar`)
+    MIGRAR_AL_INICIAR = os.getenv('MIGRAR_AL_INICIAR', 'True').lower() == 'true'
+    
+    # PRAGMA aplicados a cada conexión SQLite nueva
+    SQLITE_PRAGMAS = {
+        'foreign_keys': 'ON',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))
+    }
     
     # Configuración de la API
     API_TITLE = os.getenv('API_TITLE', 'API de Música')
     API_VERSION = os.getenv('API_VERSION', '1.0')
     
+    # Paginación por cursor de los listados
+    PAGINACION_LIMITE_DEFECTO = int(os.getenv('PAGINACION_LIMITE_DEFECTO', '50'))
+    PAGINACION_LIMITE_MAXIMO = int(os.getenv('PAGINACION_LIMITE_MAXIMO', '500'))
+    
+    # Búsqueda difusa por trigramas (modo=difusa): similitud mínima y candidatos evaluados
+    BUSQUEDA_DIFUSA_UMBRAL = float(os.getenv('BUSQUEDA_DIFUSA_UMBRAL', '0.3'))
+    BUSQUEDA_DIFUSA_CANDIDATOS = int(os.getenv('BUSQUEDA_DIFUSA_CANDIDATOS', '200'))
+    
+    # Máximo de IDs por petición al obtener canciones o usuarios en lote (?ids=)
+    LOTE_IDS_MAXIMO = int(os.getenv('LOTE_IDS_MAXIMO', '100'))
+    
+    # Búsqueda de texto completo con FTS5 (se ignora en motores distintos de SQLite)
+    BUSQUEDA_FTS = os.getenv('BUSQUEDA_FTS', 'True').lower() == 'true'
+    
+    # Índice en memoria de prefijos de título/artista para el autocompletado
+    AUTOCOMPLETADO = os.getenv('AUTOCOMPLETADO', 'True').lower() == 'true'
+    AUTOCOMPLETADO_MAXIMO_CANCIONES = int(os.getenv('AUTOCOMPLETADO_MAXIMO_CANCIONES', '100000'))
+    AUTOCOMPLETADO_LONGITUD_CLAVE = int(os.getenv('AUTOCOMPLETADO_LONGITUD_CLAVE', '40'))
+    AUTOCOMPLETADO_REFRESCO = float(os.getenv('AUTOCOMPLETADO_REFRESCO', '300'))
+    AUTOCOMPLETADO_LIMITE = int(os.getenv('AUTOCOMPLETADO_LIMITE', '10'))
+    
+    # Filas por INSERT/transacción en la importación masiva de canciones
+    IMPORTACION_TAMANO_LOTE = int(os.getenv('IMPORTACION_TAMANO_LOTE', '1000'))
+    
+    # Filas por INSERT/transacción al generar datos sintéticos (flask sembrar)
+    SEMBRADO_TAMANO_LOTE = int(os.getenv('SEMBRADO_TAMANO_LOTE', '10000'))
+    
+    # Filas leídas por viaje a la base de datos al exportar en flujo
+    EXPORTACION_YIELD_PER = int(os.getenv('EXPORTACION_YIELD_PER', '1000'))
+    
+    # Máximo de canciones por petición al marcar/desmarcar favoritos en lote
+    FAVORITOS_LOTE_MAXIMO = int(os.getenv('FAVORITOS_LOTE_MAXIMO', '1000'))
+    
+    # Estrategia de carga de usuario/canción al serializar favoritos: 'joined', 'selectin' o 'select' (perezosa)
+    FAVORITOS_ESTRATEGIA_CARGA = os.getenv('FAVORITOS_ESTRATEGIA_CARGA', 'joined')
+    
+    # Caché en proceso de lecturas de canciones y usuarios por ID. Las escrituras la
+    # invalidan solo en el proceso que las hace: con varios procesos, los demás pueden
+    # servir datos obsoletos durante hasta CACHE_TTL segundos
+    CACHE_ENTIDADES = os.getenv('CACHE_ENTIDADES', 'True').lower() == 'true'
+    CACHE_TAMANO_MAXIMO = int(os.getenv('CACHE_TAMANO_MAXIMO', '10000'))
+    CACHE_TTL = float(os.getenv('CACHE_TTL', '300'))
+    
+    # Índice precalculado de canciones similares para las recomendaciones. Cada
+    # RECOMENDACIONES_REFRESCO segundos una petición de recomendaciones procesa un lote
+    # de la cola de pendientes (0 lo desactiva: hay que programar `flask recomendaciones`)
+    RECOMENDACIONES_TOP_K = int(os.getenv('RECOMENDACIONES_TOP_K', '50'))
+    RECOMENDACIONES_TAMANO_LOTE = int(os.getenv('RECOMENDACIONES_TAMANO_LOTE', '500'))
+    RECOMENDACIONES_REFRESCO = float(os.getenv('RECOMENDACIONES_REFRESCO', '60'))
+    
+    # Medición por petición de SQL, serialización y tiempo total (cabecera Server-Timing)
+    INSTRUMENTACION = os.getenv('INSTRUMENTACION', 'False').lower() == 'true'
+    
+    # Métricas en formato Prometheus (GET /metrics). Con varios procesos, directorio
+    # compartido donde cada uno vuelca sus contadores cada METRICAS_INTERVALO segundos
+    METRICAS = os.getenv('METRICAS', 'True').lower() == 'true'
+    METRICAS_DIRECTORIO = os.getenv('METRICAS_DIRECTORIO')
+    METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', '5'))
+    
+    # Registro de consultas lentas: umbral (ms), entradas conservadas, captura del
+    # plan de ejecución y escritura como logs JSON (sin parámetros). El plan y los
+    # logs solo están activos por defecto en desarrollo
+    CONSULTAS_LENTAS = os.getenv('CONSULTAS_LENTAS', 'True').lower() == 'true'
+    CONSULTAS_LENTAS_UMBRAL_MS = float(os.getenv('CONSULTAS_LENTAS_UMBRAL_MS', '100'))
+    CONSULTAS_LENTAS_MAXIMO = int(os.getenv('CONSULTAS_LENTAS_MAXIMO', '100'))
+    CONSULTAS_LENTAS_EXPLAIN = os.getenv('CONSULTAS_LENTAS_EXPLAIN', 'False').lower() == 'true'
+    CONSULTAS_LENTAS_LOG = os.getenv('CONSULTAS_LENTAS_LOG', 'False').lower() == 'true'
+    
+    # Token de los endpoints de administración (cabecera X-Admin-Token); sin token
+    # solo están disponibles en depuración y pruebas
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    
     # Otras configuraciones generales
     SECRET_KEY = os.getenv('SECRET_KEY', 'clave-secreta-predeterminada')
 
 class DevelopmentConfig(Config):
     """Configuración para entorno de desarrollo."""
     DEBUG = True
+    INSTRUMENTACION = os.getenv('INSTRUMENTACION', 'True').lower() == 'true'
+    CONSULTAS_LENTAS_EXPLAIN = os.getenv('CONSULTAS_LENTAS_EXPLAIN', 'True').lower() == 'true'
+    CONSULTAS_LENTAS_LOG = os.getenv('CONSULTAS_LENTAS_LOG', 'True').lower() == 'true'
+    SQLITE_PRAGMAS = {**Config.SQLITE_PRAGMAS, 'journal_mode': 'WAL'}
     
 class TestingConfig(Config):
     """Configuración para entorno de pruebas."""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///musica_test.db'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     
 class ProductionConfig(Config):
     """Configuración para entorno de producción."""
@@ -37,6 +144,16 @@ class ProductionConfig(Config):
     # En producción, asegurarse de tener una clave secreta fuerte
     SECRET_KEY = os.getenv('SECRET_KEY')
     
+    # WAL permite lecturas concurrentes con un escritor; NORMAL es seguro en modo WAL
+    SQLITE_PRAGMAS = {
+        **Config.SQLITE_PRAGMAS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-64000')),
+        'temp_store': 'MEMORY'
+    }
+    
 # Mapeo de configuraciones por entorno
 config_by_name = {
     'development': DevelopmentConfig,
@@ -0,0 +1,190 @@
+"""
+Módulo de registro de consultas lentas.
+Captura las sentencias SQL que superan un umbral de duración junto con sus
+parámetros, la ruta que las originó y su plan de ejecución (`EXPLAIN QUERY
+PLAN` en SQLite, `EXPLAIN` en otros motores). Las entradas se guardan en un
+búfer circular acotado, al que solo se accede con el token de administración,
+y, opcionalmente, se escriben como logs JSON sin los parámetros, que pueden
+contener datos personales.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+from .extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Límites al guardar parámetros, para acotar la memoria de cada entrada
+_MAXIMO_PARAMETROS = 50
+_MAXIMO_TEXTO = 200
+
+# Sentencias cuyo plan de ejecución se captura
+_EXPLICABLES = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+class RegistroConsultasLentas:
+    """
+    Búfer circular de consultas lentas, seguro entre hilos.
+    """
+
+    def __init__(self, maximo=100):
+        """
+        Args:
+            maximo (int): Número máximo de entradas conservadas
+        """
+        self._entradas = deque(maxlen=maximo)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def registrar(self, entrada):
+        """
+        Guarda una entrada, descartando la más antigua si el búfer está lleno.
+
+        Args:
+            entrada (dict): Consulta lenta
+        """
+        with self._lock:
+            self._entradas.append(entrada)
+            self.total += 1
+
+    def entradas(self):
+        """
+        Devuelve las entradas conservadas.
+
+        Returns:
+            list: Entradas de la más reciente a la más antigua
+        """
+        with self._lock:
+            return list(reversed(self._entradas))
+
+    def limpiar(self):
+        """Elimina las entradas conservadas."""
+        with self._lock:
+            self._entradas.clear()
+
+
+def _serializable(valor):
+    """Convierte un parámetro en un valor JSON, truncando textos y colecciones largas."""
+    if valor is None or isinstance(valor, (bool, int, float)):
+        return valor
+    if isinstance(valor, (list, tuple)):
+        return [_serializable(v) for v in valor[:_MAXIMO_PARAMETROS]]
+    if isinstance(valor, dict):
+        return {str(k): _serializable(v) for k, v in list(valor.items())[:_MAXIMO_PARAMETROS]}
+    texto = valor.isoformat() if isinstance(valor, datetime) else str(valor)
+    return texto if len(texto) <= _MAXIMO_TEXTO else texto[:_MAXIMO_TEXTO] + "…"
+
+
+def plan_de_ejecucion(conexion_dbapi, dialecto, sentencia, parametros):
+    """
+    Obtiene el plan de ejecución de una consulta con un cursor del driver, sin
+    pasar por los eventos de SQLAlchemy. En motores distintos de SQLite se
+    ejecuta dentro de un SAVEPOINT para que un error no anule la transacción.
+
+    Args:
+        conexion_dbapi: Conexión del driver en la que se ejecutó la consulta
+        dialecto (str): Nombre del dialecto de SQLAlchemy
+        sentencia (str): SQL tal como se envió al driver
+        parametros: Parámetros tal como se enviaron al driver
+
+    Returns:
+        list: Líneas del plan (en SQLite, sangradas según su nivel)
+    """
+    cursor = conexion_dbapi.cursor()
+    try:
+        if dialecto == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sentencia}", parametros)
+            niveles, lineas = {0: -1}, []
+            for id, padre, _, detalle in cursor.fetchall():
+                niveles[id] = niveles.get(padre, -1) + 1
+                lineas.append("  " * niveles[id] + detalle)
+            return lineas
+        cursor.execute("SAVEPOINT plan_consulta_lenta")
+        try:
+            cursor.execute(f"EXPLAIN {sentencia}", parametros)
+            return [fila[0] for fila in cursor.fetchall()]
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT plan_consulta_lenta")
+            raise
+        finally:
+            cursor.execute("RELEASE SAVEPOINT plan_consulta_lenta")
+    finally:
+        cursor.close()
+
+
+def _ruta_actual():
+    """Método y regla de URL de la petición en curso, o None fuera de una petición."""
+    if not has_request_context():
+        return None
+    regla = request.url_rule.rule if request.url_rule is not None else request.path
+    return f"{request.method} {regla}"
+
+
+def init_consultas_lentas(app):
+    """
+    Registra los eventos del motor que detectan las consultas lentas si el
+    registro está habilitado en la configuración.
+
+    Args:
+        app (Flask): Aplicación a configurar (con `db` ya inicializado)
+    """
+    if not app.config["CONSULTAS_LENTAS"]:
+        return
+    registro = app.extensions["consultas_lentas"] = RegistroConsultasLentas(
+        app.config["CONSULTAS_LENTAS_MAXIMO"]
+    )
+    umbral = app.config["CONSULTAS_LENTAS_UMBRAL_MS"] / 1000
+    explicar = app.config["CONSULTAS_LENTAS_EXPLAIN"]
+    escribir_log = app.config["CONSULTAS_LENTAS_LOG"]
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _inicio_consulta(conn, cursor, statement, parameters, context, executemany):
+        context._consulta_lenta_inicio = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _fin_consulta(conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - context._consulta_lenta_inicio
+        if duracion < umbral:
+            return
+        entrada = {
+            "fecha": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "duracion_ms": round(duracion * 1000, 3),
+            "ruta": _ruta_actual(),
+            "sentencia": statement,
+            "parametros": _serializable(parameters),
+            "executemany": executemany,
+            "plan": None
+        }
+        # Solo sentencias con búsqueda de filas (EXPLAIN sin ANALYZE no las ejecuta);
+        # se omiten INSERT, PRAGMA y DDL
+        partes = statement.split(None, 1)
+        if explicar and not executemany and partes and partes[0].upper() in _EXPLICABLES:
+            try:
+                entrada["plan"] = plan_de_ejecucion(
+                    conn.connection.dbapi_connection, conn.dialect.name, statement, parameters
+                )
+            except Exception as e:
+                entrada["error_plan"] = str(e)
+        registro.registrar(entrada)
+        if escribir_log:
+            sin_parametros = {k: v for k, v in entrada.items() if k != "parametros"}
+            logger.warning(json.dumps({"evento": "consulta_lenta", **sin_parametros}, ensure_ascii=False))
+
+
+def consultas_lentas_actual():
+    """
+    Devuelve el registro de consultas lentas de la aplicación actual.
+
+    Returns:
+        RegistroConsultasLentas: El registro, o None si está deshabilitado
+    """
+    return current_app.extensions.get("consultas_lentas")
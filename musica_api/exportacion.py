@@ -0,0 +1,128 @@
+"""
+Módulo de exportación de datos en flujo.
+Genera respuestas CSV o NDJSON a partir de consultas recorridas con un cursor
+de servidor (`yield_per`), con memoria constante e independiente del tamaño de la tabla.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+# Formatos de exportación soportados: (tipo MIME, extensión)
+FORMATOS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson")
+}
+
+# Tamaño aproximado de cada fragmento enviado al cliente
+_TAMANO_FRAGMENTO = 64 * 1024
+
+
+def _serializar(valor):
+    """Convierte valores no serializables (fechas) a texto ISO 8601."""
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def generar_csv(columnas, filas):
+    """
+    Genera el contenido CSV en fragmentos de texto.
+
+    Args:
+        columnas (list): Nombres de las columnas
+        filas: Iterable de tuplas con los valores
+
+    Yields:
+        str: Fragmentos del documento CSV
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for fila in filas:
+        escritor.writerow([_serializar(v) for v in fila])
+        if buffer.tell() >= _TAMANO_FRAGMENTO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generar_ndjson(columnas, filas):
+    """
+    Genera el contenido NDJSON (un objeto JSON por línea) en fragmentos de texto.
+
+    Args:
+        columnas (list): Nombres de las columnas
+        filas: Iterable de tuplas con los valores
+
+    Yields:
+        str: Fragmentos del documento NDJSON
+    """
+    partes = []
+    tamano = 0
+    for fila in filas:
+        linea = json.dumps(
+            {c: _serializar(v) for c, v in zip(columnas, fila)}, ensure_ascii=False
+        ) + "\n"
+        partes.append(linea)
+        tamano += len(linea)
+        if tamano >= _TAMANO_FRAGMENTO:
+            yield "".join(partes)
+            partes, tamano = [], 0
+    yield "".join(partes)
+
+
+def comprimir_gzip(fragmentos):
+    """
+    Comprime en formato gzip un flujo de fragmentos de bytes.
+
+    Args:
+        fragmentos: Iterable de bytes
+
+    Yields:
+        bytes: Fragmentos comprimidos
+    """
+    compresor = zlib.compressobj(wbits=31)
+    for fragmento in fragmentos:
+        comprimido = compresor.compress(fragmento)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def respuesta_exportacion(nombre, columnas, filas, formato="csv", gzip=False):
+    """
+    Construye una respuesta HTTP en flujo con los datos exportados.
+
+    Args:
+        nombre (str): Nombre base del archivo descargado
+        columnas (list): Nombres de las columnas
+        filas: Iterable perezoso de tuplas (por ejemplo, un resultado con `yield_per`)
+        formato (str): 'csv' o 'ndjson'
+        gzip (bool): Si se comprime la salida
+
+    Returns:
+        Response: Respuesta de Flask en flujo
+
+    Raises:
+        ValueError: Si el formato no está soportado
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    mimetype, extension = FORMATOS[formato]
+    generador = generar_csv if formato == "csv" else generar_ndjson
+
+    contenido = (fragmento.encode("utf-8") for fragmento in generador(columnas, filas))
+    archivo = f"{nombre}.{extension}"
+    if gzip:
+        contenido = comprimir_gzip(contenido)
+        mimetype = "application/gzip"
+        archivo += ".gz"
+
+    return Response(
+        stream_with_context(contenido),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{archivo}"'}
+    )
@@ -4,6 +4,7 @@ Define las instancias de las extensiones utilizadas en todo el proyecto.
 """
 from flask_sqlalchemy import SQLAlchemy 
 from flask_restx import Api
+from sqlalchemy import event
 
 # API RESTful con documentación Swagger integrada
 api = Api(
@@ -14,6 +15,23 @@ api = Api(
 )
 
 # ORM para interactuar con la base de datos
-# FIXME: el objeto está mal inicializado
-db = database()
+db = SQLAlchemy()
 
+
+def configurar_sqlite(engine, pragmas):
+    """
+    Registra los PRAGMA a aplicar en cada conexión nueva de un motor SQLite.
+    
+    Args:
+        engine: Motor SQLAlchemy de la aplicación
+        pragmas (dict): PRAGMA y sus valores (p. ej. {'journal_mode': 'WAL'})
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+    
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+        cursor.close()
@@ -0,0 +1,124 @@
+"""
+Módulo de importación masiva de canciones.
+Valida las filas de forma incremental contra `cancion_base` e inserta por lotes
+con `executemany`, confirmando cada lote en su propia transacción.
+"""
+import json
+
+from flask_restx import fields
+
+from .api_models import cancion_base
+from .extensions import db
+from .models import Cancion
+from .trigramas import indexar
+
+
+def validar_fila(datos, modelo=cancion_base, tabla=Cancion.__table__):
+    """
+    Valida una fila de entrada contra un modelo de API.
+
+    Args:
+        datos (dict): Fila recibida
+        modelo: Modelo de API con los campos permitidos
+        tabla: Tabla destino, usada para validar longitudes máximas
+
+    Returns:
+        dict: Fila normalizada solo con los campos del modelo
+
+    Raises:
+        ValueError: Si la fila no es válida
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("La fila debe ser un objeto JSON")
+
+    fila = {}
+    for nombre, campo in modelo.items():
+        valor = datos.get(nombre)
+        if valor is None:
+            if campo.required:
+                raise ValueError(f"El campo '{nombre}' es obligatorio")
+            fila[nombre] = None
+            continue
+        if isinstance(campo, fields.Integer):
+            if isinstance(valor, bool) or not isinstance(valor, int):
+                raise ValueError(f"El campo '{nombre}' debe ser un entero")
+        elif isinstance(campo, fields.String):
+            if not isinstance(valor, str):
+                raise ValueError(f"El campo '{nombre}' debe ser una cadena")
+            longitud = getattr(tabla.c[nombre].type, "length", None)
+            if longitud and len(valor) > longitud:
+                raise ValueError(f"El campo '{nombre}' supera los {longitud} caracteres")
+            if campo.required and not valor.strip():
+                raise ValueError(f"El campo '{nombre}' es obligatorio")
+        fila[nombre] = valor
+    return fila
+
+
+def leer_ndjson(flujo):
+    """
+    Lee un flujo NDJSON línea a línea sin cargarlo completo en memoria.
+
+    Args:
+        flujo: Flujo binario de la petición
+
+    Yields:
+        tuple: (número de fila, objeto decodificado o excepción ValueError)
+    """
+    numero = 0
+    for linea in flujo:
+        linea = linea.strip()
+        if not linea:
+            continue
+        numero += 1
+        try:
+            yield numero, json.loads(linea)
+        except ValueError as e:
+            yield numero, ValueError(f"JSON inválido: {e}")
+
+
+def importar_canciones(filas, tamano_lote):
+    """
+    Valida e inserta canciones por lotes.
+
+    Args:
+        filas: Iterable de tuplas (número de fila, datos) donde los datos pueden
+               ser una excepción ValueError para filas ilegibles
+        tamano_lote (int): Número de filas por INSERT/transacción
+
+    Returns:
+        dict: Informe con filas procesadas, insertadas y errores por fila
+    """
+    informe = {"procesadas": 0, "insertadas": 0, "errores": []}
+    lote = []
+
+    def confirmar_lote():
+        try:
+            insertadas = db.session.execute(
+                db.insert(Cancion).returning(Cancion.id, Cancion.titulo, Cancion.artista, Cancion.album),
+                [datos for _, datos in lote]
+            ).all()
+            indexar(db.session, insertadas, nuevas=True)
+            db.session.commit()
+            informe["insertadas"] += len(lote)
+        except Exception as e:
+            db.session.rollback()
+            informe["errores"].extend(
+                {"fila": numero, "error": f"Error al insertar el lote: {e}"} for numero, _ in lote
+            )
+        lote.clear()
+
+    for numero, datos in filas:
+        informe["procesadas"] += 1
+        try:
+            if isinstance(datos, ValueError):
+                raise datos
+            lote.append((numero, validar_fila(datos)))
+        except ValueError as e:
+            informe["errores"].append({"fila": numero, "error": str(e)})
+            continue
+        if len(lote) >= tamano_lote:
+            confirmar_lote()
+
+    if lote:
+        confirmar_lote()
+    return informe
@@ -0,0 +1,163 @@
+"""
+Módulo de instrumentación de peticiones.
+Mide por petición el número de sentencias SQL, el tiempo en la base de datos,
+el tiempo de serialización y el tiempo total, los publica en la cabecera
+`Server-Timing` de la respuesta y los acumula por ruta.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from .extensions import db
+
+
+class EstadisticasRutas:
+    """
+    Acumulado de las mediciones por ruta (método y regla de URL), seguro entre hilos.
+    """
+
+    def __init__(self):
+        self._rutas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, ruta, medicion, total):
+        """
+        Suma la medición de una petición a su ruta.
+
+        Args:
+            ruta (str): Método y regla de URL (p. ej. 'GET /api/canciones/<int:id>')
+            medicion (dict): Consultas y segundos en base de datos y serialización
+            total (float): Segundos totales de la petición
+        """
+        with self._lock:
+            acumulado = self._rutas.get(ruta)
+            if acumulado is None:
+                acumulado = self._rutas[ruta] = {
+                    "peticiones": 0, "consultas": 0, "db": 0.0, "serializacion": 0.0, "total": 0.0, "maximo": 0.0
+                }
+            acumulado["peticiones"] += 1
+            acumulado["consultas"] += medicion["consultas"]
+            acumulado["db"] += medicion["db"]
+            acumulado["serializacion"] += medicion["serializacion"]
+            acumulado["total"] += total
+            acumulado["maximo"] = max(acumulado["maximo"], total)
+
+    def limpiar(self):
+        """Elimina las mediciones acumuladas."""
+        with self._lock:
+            self._rutas.clear()
+
+    def estadisticas(self):
+        """
+        Devuelve los promedios por ruta.
+
+        Returns:
+            list: Por ruta, peticiones, consultas medias y tiempos medios y máximo (ms)
+        """
+        with self._lock:
+            return [
+                {
+                    "ruta": ruta,
+                    "peticiones": a["peticiones"],
+                    "consultas_media": round(a["consultas"] / a["peticiones"], 2),
+                    "db_ms_medio": round(a["db"] * 1000 / a["peticiones"], 3),
+                    "serializacion_ms_medio": round(a["serializacion"] * 1000 / a["peticiones"], 3),
+                    "total_ms_medio": round(a["total"] * 1000 / a["peticiones"], 3),
+                    "total_ms_maximo": round(a["maximo"] * 1000, 3)
+                }
+                for ruta, a in sorted(self._rutas.items())
+            ]
+
+
+def _medicion_actual():
+    """Medición de la petición en curso, o None fuera de una petición instrumentada."""
+    return g.get("instrumentacion") if has_request_context() else None
+
+
+@contextmanager
+def medir_serializacion():
+    """Suma a la petición en curso el tiempo del bloque como tiempo de serialización."""
+    medicion = _medicion_actual()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion["serializacion"] += time.perf_counter() - inicio
+
+
+def server_timing(medicion, total):
+    """
+    Construye el valor de la cabecera `Server-Timing` de una petición.
+
+    Args:
+        medicion (dict): Consultas y segundos en base de datos y serialización
+        total (float): Segundos totales de la petición
+
+    Returns:
+        str: Métricas db, serializacion, app (el resto) y total, en milisegundos
+    """
+    resto = max(0.0, total - medicion["db"] - medicion["serializacion"])
+    return ", ".join([
+        f'db;dur={medicion["db"] * 1000:.2f};desc="{medicion["consultas"]} consultas"',
+        f'serializacion;dur={medicion["serializacion"] * 1000:.2f}',
+        f"app;dur={resto * 1000:.2f}",
+        f"total;dur={total * 1000:.2f}"
+    ])
+
+
+def init_instrumentacion(app):
+    """
+    Registra los eventos del motor y los hooks de petición si la
+    instrumentación está habilitada en la configuración.
+
+    Args:
+        app (Flask): Aplicación a configurar (con `db` ya inicializado)
+    """
+    if not app.config["INSTRUMENTACION"]:
+        return
+    app.extensions["instrumentacion"] = EstadisticasRutas()
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _inicio_sentencia(conn, cursor, statement, parameters, context, executemany):
+        context._instrumentacion_inicio = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _fin_sentencia(conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - context._instrumentacion_inicio
+        medicion = _medicion_actual()
+        if medicion is not None:
+            medicion["consultas"] += 1
+            medicion["db"] += duracion
+
+    @app.before_request
+    def _iniciar_medicion():
+        g.instrumentacion = {"inicio": time.perf_counter(), "consultas": 0, "db": 0.0, "serializacion": 0.0}
+
+    @app.after_request
+    def _publicar_medicion(respuesta):
+        medicion = g.pop("instrumentacion", None)
+        if medicion is None:
+            return respuesta
+        total = time.perf_counter() - medicion["inicio"]
+        respuesta.headers["Server-Timing"] = server_timing(medicion, total)
+        regla = request.url_rule.rule if request.url_rule is not None else "<sin ruta>"
+        current_app.extensions["instrumentacion"].registrar(f"{request.method} {regla}", medicion, total)
+        return respuesta
+
+
+def instrumentacion_actual():
+    """
+    Devuelve el acumulado por ruta de la aplicación actual.
+
+    Returns:
+        EstadisticasRutas: El acumulado, o None si la instrumentación está deshabilitada
+    """
+    return current_app.extensions.get("instrumentacion")
@@ -0,0 +1,445 @@
+"""
+Módulo de métricas en formato de texto de Prometheus (`GET /metrics`).
+Cuenta peticiones, errores y latencias por ruta y método, peticiones en curso,
+estado del pool de conexiones y aciertos de la caché de entidades.
+
+Los contadores de cada hilo se guardan en un fragmento propio, de modo que
+registrar una petición no toma ningún lock; los fragmentos se suman al
+exportar. Con varios procesos (`METRICAS_DIRECTORIO`), cada uno vuelca
+periódicamente su instantánea a un archivo JSON del directorio compartido,
+identificado por PID y momento de inicio, y `/metrics` agrega las de todos
+tras heredar los contadores de los procesos terminados y borrar sus archivos.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from flask import Response, current_app, g, request
+
+from .cache import cache_actual
+from .extensions import db
+
+# Límites superiores (segundos) de los buckets del histograma de latencias
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Fragmentos nuevos que se acumulan como mínimo antes de recoger los de hilos terminados
+_MINIMO_RECOGIDA = 64
+
+
+class Metricas:
+    """
+    Contadores e histogramas del proceso, repartidos en un fragmento por hilo.
+
+    Cada fragmento es un diccionario escrito solo por su hilo: las claves son
+    tuplas `(métrica, *etiquetas)` y los valores, números o (en los
+    histogramas) listas con los conteos por bucket, la suma y el total.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._nuevos = deque()
+        self._fragmentos = []
+        self._acumulado = {}
+        self._lock = threading.Lock()
+        self._umbral_recogida = _MINIMO_RECOGIDA
+
+    def _fragmento(self):
+        """
+        Fragmento del hilo actual, creado y registrado en su primer uso. El
+        registro no toma el lock (`deque.append` es atómico); los fragmentos de
+        hilos terminados se recogen al exportar o, con un hilo por petición,
+        cuando los nuevos duplican a los vivos, si el lock está libre.
+        """
+        datos = getattr(self._local, "datos", None)
+        if datos is None:
+            datos = self._local.datos = {}
+            self._nuevos.append((threading.current_thread(), datos))
+            if len(self._nuevos) >= self._umbral_recogida and self._lock.acquire(blocking=False):
+                try:
+                    self._recoger_hilos_terminados()
+                finally:
+                    self._lock.release()
+        return datos
+
+    def _recoger_hilos_terminados(self):
+        """
+        Incorpora los fragmentos nuevos y suma al acumulado los de hilos
+        terminados (servidores con un hilo por petición). Requiere el lock.
+        """
+        while self._nuevos:
+            self._fragmentos.append(self._nuevos.popleft())
+        vivos = []
+        for hilo, datos in self._fragmentos:
+            if hilo.is_alive():
+                vivos.append((hilo, datos))
+            else:
+                _sumar(self._acumulado, datos)
+        self._fragmentos = vivos
+        self._umbral_recogida = max(_MINIMO_RECOGIDA, len(vivos))
+
+    def heredar(self, contadores):
+        """
+        Suma al proceso los contadores de otro proceso terminado.
+
+        Args:
+            contadores (dict): Valores por clave
+        """
+        with self._lock:
+            _sumar(self._acumulado, contadores)
+
+    def incrementar(self, clave, valor=1):
+        """
+        Suma un valor a un contador o indicador del hilo actual.
+
+        Args:
+            clave (tuple): Nombre de la métrica seguido de sus etiquetas
+            valor (float): Cantidad a sumar (negativa para restar en un indicador)
+        """
+        datos = self._fragmento()
+        datos[clave] = datos.get(clave, 0) + valor
+
+    def observar(self, clave, valor):
+        """
+        Registra una observación en un histograma.
+
+        Args:
+            clave (tuple): Nombre de la métrica seguido de sus etiquetas
+            valor (float): Valor observado (segundos)
+        """
+        datos = self._fragmento()
+        histograma = datos.get(clave)
+        if histograma is None:
+            histograma = datos[clave] = [0] * (len(BUCKETS) + 3)
+        histograma[bisect_left(BUCKETS, valor)] += 1
+        histograma[-2] += valor
+        histograma[-1] += 1
+
+    def instantanea(self):
+        """
+        Suma los fragmentos de todos los hilos.
+
+        Returns:
+            dict: Valores por clave
+        """
+        with self._lock:
+            self._recoger_hilos_terminados()
+            total = {}
+            _sumar(total, self._acumulado)
+            for _, datos in self._fragmentos:
+                # La copia de un diccionario es atómica: el hilo propietario puede seguir escribiendo
+                _sumar(total, dict(datos))
+            return total
+
+
+def _sumar(destino, origen):
+    """Suma valores numéricos e histogramas de `origen` en `destino`."""
+    for clave, valor in origen.items():
+        if isinstance(valor, list):
+            previo = destino.get(clave)
+            destino[clave] = list(valor) if previo is None else [a + b for a, b in zip(previo, valor)]
+        else:
+            destino[clave] = destino.get(clave, 0) + valor
+
+
+def _indicadores_proceso():
+    """Valores instantáneos del proceso: pool de conexiones y caché de entidades."""
+    indicadores = {}
+    pool = db.engine.pool
+    for estado, medida in (("en_uso", "checkedout"), ("disponibles", "checkedin"), ("desbordamiento", "overflow")):
+        if hasattr(pool, medida):
+            indicadores[("musica_db_pool_conexiones", estado)] = getattr(pool, medida)()
+    if hasattr(pool, "size"):
+        indicadores[("musica_db_pool_tamano",)] = pool.size()
+    cache = cache_actual()
+    if cache is not None:
+        estadisticas = cache.estadisticas()
+        indicadores[("musica_cache_entradas",)] = estadisticas["entradas"]
+    return indicadores
+
+
+def _valores_proceso(metricas):
+    """
+    Valores del proceso separados en contadores (monótonos, incluidos los de la
+    caché de entidades) e indicadores instantáneos (peticiones en curso, pool y caché).
+    """
+    contadores = metricas.instantanea()
+    indicadores = _indicadores_proceso()
+    indicadores[("musica_peticiones_en_curso",)] = contadores.pop(("musica_peticiones_en_curso",), 0)
+    cache = cache_actual()
+    if cache is not None:
+        estadisticas = cache.estadisticas()
+        # Se suman a los heredados de procesos terminados, si los hay
+        _sumar(contadores, {
+            ("musica_cache_aciertos_total",): estadisticas["aciertos"],
+            ("musica_cache_fallos_total",): estadisticas["fallos"],
+            ("musica_cache_desalojos_total",): estadisticas["desalojos"]
+        })
+    return contadores, indicadores
+
+
+_identidad = {}
+
+
+def identidad_proceso():
+    """
+    Identifica al proceso actual por su PID y el momento en que se consultó por
+    primera vez con ese PID, de modo que un proceso que reutiliza el PID de otro
+    terminado (o creado con fork) no sobrescribe su archivo.
+
+    Returns:
+        tuple: (pid, inicio en nanosegundos)
+    """
+    pid = os.getpid()
+    if pid not in _identidad:
+        _identidad.clear()
+        _identidad[pid] = (pid, time.time_ns())
+    return _identidad[pid]
+
+
+def volcar(metricas, directorio):
+    """
+    Escribe de forma atómica la instantánea del proceso en el directorio compartido.
+
+    Args:
+        metricas (Metricas): Métricas del proceso
+        directorio (str): Directorio compartido por los procesos
+    """
+    contadores, indicadores = _valores_proceso(metricas)
+    pid, inicio = identidad_proceso()
+    documento = {
+        "pid": pid,
+        "inicio": inicio,
+        "contadores": [[list(c), v] for c, v in contadores.items()],
+        "indicadores": [[list(c), v] for c, v in indicadores.items()]
+    }
+    ruta = os.path.join(directorio, f"metricas-{pid}-{inicio}.json")
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(documento, archivo)
+    os.replace(temporal, ruta)
+
+
+def _proceso_vivo(pid):
+    """Indica si existe un proceso con el PID dado."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _leer_volcados(directorio):
+    """Documentos de los archivos de métricas del directorio, por ruta."""
+    documentos = {}
+    for nombre in os.listdir(directorio):
+        if not (nombre.startswith("metricas-") and nombre.endswith(".json")):
+            continue
+        ruta = os.path.join(directorio, nombre)
+        try:
+            with open(ruta, encoding="utf-8") as archivo:
+                documentos[ruta] = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+    return documentos
+
+
+def _recoger_procesos_terminados(metricas, directorio, documentos):
+    """
+    Hereda los contadores de los archivos de procesos terminados y los borra.
+    Un archivo es de un proceso terminado si su PID no existe o si hay otro más
+    reciente con el mismo PID. Cada archivo se reclama renombrándolo, de modo
+    que solo lo hereda un proceso aunque varios exporten a la vez.
+
+    Returns:
+        set: Rutas originales de los archivos heredados
+    """
+    propio = identidad_proceso()
+    recientes = {}
+    for documento in documentos.values():
+        recientes[documento["pid"]] = max(recientes.get(documento["pid"], 0), documento["inicio"])
+    reclamados = []
+    for ruta, documento in documentos.items():
+        pid, inicio = documento["pid"], documento["inicio"]
+        if (pid, inicio) == propio or (inicio == recientes[pid] and _proceso_vivo(pid)):
+            continue
+        reclamado = f"{ruta}.recogido-{propio[0]}-{propio[1]}"
+        try:
+            os.rename(ruta, reclamado)
+        except FileNotFoundError:
+            continue
+        metricas.heredar({tuple(c): v for c, v in documento["contadores"]})
+        reclamados.append(reclamado)
+    if reclamados:
+        # El volcado con los heredados se escribe antes de borrar los reclamados
+        volcar(metricas, directorio)
+        for reclamado in reclamados:
+            os.remove(reclamado)
+    return {reclamado.rsplit(".recogido-", 1)[0] for reclamado in reclamados}
+
+
+def agregar(metricas, directorio=None):
+    """
+    Reúne los valores a exportar: los del proceso o, con directorio compartido,
+    la suma de los de todos los procesos. Los contadores de procesos terminados
+    se conservan (son monótonos) al heredarlos este proceso; sus indicadores
+    instantáneos, no.
+
+    Args:
+        metricas (Metricas): Métricas del proceso
+        directorio (str): Directorio compartido por los procesos, o None
+
+    Returns:
+        tuple: (contadores, indicadores), diccionarios de valores por clave
+    """
+    if not directorio:
+        return _valores_proceso(metricas)
+
+    volcar(metricas, directorio)
+    documentos = _leer_volcados(directorio)
+    heredados = _recoger_procesos_terminados(metricas, directorio, documentos)
+    contadores, indicadores = _valores_proceso(metricas)
+    propio = identidad_proceso()
+    for ruta, documento in documentos.items():
+        if ruta in heredados or (documento["pid"], documento["inicio"]) == propio:
+            continue
+        _sumar(contadores, {tuple(c): v for c, v in documento["contadores"]})
+        _sumar(indicadores, {tuple(c): v for c, v in documento["indicadores"]})
+    return contadores, indicadores
+
+
+def _etiquetas(nombres, valores):
+    """Etiquetas en formato Prometheus, con los valores escapados."""
+    if not nombres:
+        return ""
+    escapados = (
+        str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in valores
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(nombres, escapados)) + "}"
+
+
+def _numero(valor):
+    """Número en formato Prometheus."""
+    if isinstance(valor, float):
+        return repr(valor) if valor != int(valor) else str(int(valor))
+    return str(valor)
+
+
+# Métricas exportadas: nombre -> (tipo, ayuda, nombres de las etiquetas)
+DEFINICIONES = {
+    "musica_peticiones_total": ("counter", "Peticiones atendidas", ("ruta", "metodo", "codigo")),
+    "musica_errores_total": ("counter", "Peticiones respondidas con un código 5xx", ("ruta", "metodo")),
+    "musica_peticion_duracion_segundos": ("histogram", "Duración de las peticiones", ("ruta", "metodo")),
+    "musica_peticiones_en_curso": ("gauge", "Peticiones en curso", ()),
+    "musica_db_pool_conexiones": ("gauge", "Conexiones del pool por estado", ("estado",)),
+    "musica_db_pool_tamano": ("gauge", "Tamaño configurado del pool de conexiones", ()),
+    "musica_cache_aciertos_total": ("counter", "Aciertos de la caché de entidades", ()),
+    "musica_cache_fallos_total": ("counter", "Fallos de la caché de entidades", ()),
+    "musica_cache_desalojos_total": ("counter", "Desalojos de la caché de entidades", ()),
+    "musica_cache_entradas": ("gauge", "Entradas en la caché de entidades", ()),
+    "musica_cache_tasa_aciertos": ("gauge", "Proporción de aciertos de la caché de entidades", ())
+}
+
+
+def exportar(contadores, indicadores):
+    """
+    Genera el documento de texto de Prometheus.
+
+    Args:
+        contadores (dict): Contadores e histogramas por clave
+        indicadores (dict): Indicadores instantáneos por clave
+
+    Returns:
+        str: Documento en el formato de exposición de texto 0.0.4
+    """
+    valores = {**contadores, **indicadores}
+    consultas = valores.get(("musica_cache_aciertos_total",), 0) + valores.get(("musica_cache_fallos_total",), 0)
+    if consultas:
+        valores[("musica_cache_tasa_aciertos",)] = valores[("musica_cache_aciertos_total",)] / consultas
+    valores.setdefault(("musica_peticiones_en_curso",), 0)
+
+    lineas = []
+    for nombre, (tipo, ayuda, etiquetas) in DEFINICIONES.items():
+        series = sorted((c[1:], v) for c, v in valores.items() if c[0] == nombre)
+        if not series:
+            continue
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for valores_etiquetas, valor in series:
+            if tipo != "histogram":
+                lineas.append(f"{nombre}{_etiquetas(etiquetas, valores_etiquetas)} {_numero(valor)}")
+                continue
+            acumulado = 0
+            for limite, cantidad in zip(BUCKETS + ("+Inf",), valor):
+                acumulado += cantidad
+                lineas.append(
+                    f"{nombre}_bucket{_etiquetas(etiquetas + ('le',), valores_etiquetas + (limite,))} {acumulado}"
+                )
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas, valores_etiquetas)} {_numero(valor[-2])}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas, valores_etiquetas)} {valor[-1]}")
+    return "\n".join(lineas) + "\n"
+
+
+def init_metricas(app):
+    """
+    Registra los hooks de petición y el endpoint `/metrics` si las métricas
+    están habilitadas en la configuración.
+
+    Args:
+        app (Flask): Aplicación a configurar
+    """
+    if not app.config["METRICAS"]:
+        return
+    metricas = app.extensions["metricas"] = Metricas()
+    directorio = app.config["METRICAS_DIRECTORIO"]
+    intervalo = app.config["METRICAS_INTERVALO"]
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    ultimo_volcado = [time.monotonic()]
+
+    @app.before_request
+    def _iniciar_peticion():
+        g.metricas_inicio = g.metricas_en_curso = time.perf_counter()
+        metricas.incrementar(("musica_peticiones_en_curso",))
+
+    @app.after_request
+    def _registrar_peticion(respuesta):
+        inicio = g.pop("metricas_inicio", None)
+        if inicio is None:
+            return respuesta
+        ruta = request.url_rule.rule if request.url_rule is not None else "<sin ruta>"
+        metricas.incrementar(("musica_peticiones_total", ruta, request.method, str(respuesta.status_code)))
+        if respuesta.status_code >= 500:
+            metricas.incrementar(("musica_errores_total", ruta, request.method))
+        metricas.observar(("musica_peticion_duracion_segundos", ruta, request.method), time.perf_counter() - inicio)
+        if directorio and time.monotonic() - ultimo_volcado[0] > intervalo:
+            ultimo_volcado[0] = time.monotonic()
+            volcar(metricas, directorio)
+        return respuesta
+
+    @app.teardown_request
+    def _finalizar_peticion(error):
+        if g.pop("metricas_en_curso", None) is not None:
+            metricas.incrementar(("musica_peticiones_en_curso",), -1)
+
+    def metricas_endpoint():
+        contadores, indicadores = agregar(metricas, directorio)
+        return Response(exportar(contadores, indicadores), content_type=TIPO_CONTENIDO)
+
+    app.add_url_rule("/metrics", "metricas", metricas_endpoint)
+
+
+def metricas_actuales():
+    """
+    Devuelve las métricas del proceso de la aplicación actual.
+
+    Returns:
+        Metricas: Las métricas, o None si están deshabilitadas
+    """
+    return current_app.extensions.get("metricas")
@@ -0,0 +1,177 @@
+"""
+Módulo de migraciones del esquema de la base de datos.
+Aplica cambios versionados sobre bases de datos existentes (columnas e índices
+nuevos) y registra la versión aplicada en la tabla `esquema_version`.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect
+
+from .extensions import db
+from .models import Usuario, Cancion, Favorito, reconciliar_favoritos_count
+from .trigramas import reindexar
+
+# Tabla de control de versiones del esquema
+esquema_version = db.Table(
+    "esquema_version",
+    db.Column("version", db.Integer, primary_key=True),
+    db.Column("descripcion", db.String(200), nullable=False),
+    db.Column("fecha_aplicada", db.DateTime, nullable=False)
+)
+
+
+def _agregar_columna(conexion, modelo, nombre):
+    """
+    Añade a una tabla existente la columna definida en el modelo, si falta.
+
+    Args:
+        conexion: Conexión SQLAlchemy
+        modelo: Clase del modelo que define la columna
+        nombre (str): Nombre de la columna
+    """
+    tabla = modelo.__table__
+    existentes = {c["name"] for c in inspect(conexion).get_columns(tabla.name)}
+    if nombre in existentes:
+        return
+    columna = tabla.c[nombre]
+    tipo = columna.type.compile(dialect=conexion.dialect)
+    sentencia = f'ALTER TABLE {tabla.name} ADD COLUMN "{nombre}" {tipo}'
+    if columna.server_default is not None:
+        sentencia += f" NOT NULL DEFAULT {columna.server_default.arg}"
+    conexion.exec_driver_sql(sentencia)
+
+
+def _crear_indices(conexion, modelo, *nombres):
+    """Crea los índices del modelo con los nombres indicados que aún no existan."""
+    for indice in modelo.__table__.indexes:
+        if indice.name in nombres:
+            indice.create(conexion, checkfirst=True)
+
+
+def _cascada_en_claves_foraneas(conexion, modelo):
+    """
+    Recrea las claves foráneas de una tabla existente que en el modelo tienen
+    `ON DELETE CASCADE` y en la base de datos no. SQLite no permite alterar
+    restricciones, así que allí se reconstruye la tabla copiando sus filas.
+
+    Args:
+        conexion: Conexión SQLAlchemy
+        modelo: Clase del modelo con las claves foráneas actualizadas
+    """
+    tabla = modelo.__table__
+    inspector = inspect(conexion)
+    en_cascada = {fk.parent.name for fk in tabla.foreign_keys if fk.ondelete == "CASCADE"}
+    pendientes = [
+        fk for fk in inspector.get_foreign_keys(tabla.name)
+        if fk["constrained_columns"][0] in en_cascada
+        and (fk.get("options") or {}).get("ondelete", "").upper() != "CASCADE"
+    ]
+    if not pendientes:
+        return
+
+    if conexion.dialect.name != "sqlite":
+        for fk in pendientes:
+            columna = fk["constrained_columns"][0]
+            conexion.exec_driver_sql(f'ALTER TABLE {tabla.name} DROP CONSTRAINT "{fk["name"]}"')
+            conexion.exec_driver_sql(
+                f'ALTER TABLE {tabla.name} ADD CONSTRAINT "{fk["name"]}" '
+                f'FOREIGN KEY ({columna}) REFERENCES {fk["referred_table"]} '
+                f'({fk["referred_columns"][0]}) ON DELETE CASCADE'
+            )
+        return
+
+    anterior = f"{tabla.name}_anterior"
+    columnas = ", ".join(
+        f'"{c["name"]}"' for c in inspector.get_columns(tabla.name) if c["name"] in tabla.c
+    )
+    for indice in inspector.get_indexes(tabla.name):
+        conexion.exec_driver_sql(f'DROP INDEX "{indice["name"]}"')
+    conexion.exec_driver_sql(f"ALTER TABLE {tabla.name} RENAME TO {anterior}")
+    tabla.create(conexion)
+    conexion.exec_driver_sql(
+        f"INSERT INTO {tabla.name} ({columnas}) SELECT {columnas} FROM {anterior}"
+    )
+    conexion.exec_driver_sql(f"DROP TABLE {anterior}")
+
+
+def _migracion_1(conexion):
+    _agregar_columna(conexion, Usuario, "version")
+    _agregar_columna(conexion, Cancion, "version")
+
+
+def _migracion_2(conexion):
+    _crear_indices(conexion, Cancion, "ix_cancion_artista", "ix_cancion_genero", "ix_cancion_anio")
+    _crear_indices(
+        conexion, Favorito,
+        "ix_favorito_id_cancion", "ix_favorito_usuario_fecha", "ix_favorito_fecha_marcado"
+    )
+
+
+def _migracion_3(conexion):
+    _agregar_columna(conexion, Cancion, "favoritos_count")
+    _crear_indices(conexion, Cancion, "ix_cancion_populares")
+    reconciliar_favoritos_count(conexion)
+
+
+def _migracion_4(conexion):
+    # La tabla cancion_trigrama la crea create_all; aquí se llena para las canciones existentes
+    reindexar(conexion)
+
+
+def _migracion_5(conexion):
+    _cascada_en_claves_foraneas(conexion, Favorito)
+
+
+# Migraciones en orden: (versión, descripción, función). Deben ser idempotentes,
+# ya que también se ejecutan sobre bases de datos recién creadas.
+MIGRACIONES = [
+    (1, "Columna version en usuario y cancion (ETags)", _migracion_1),
+    (2, "Índices secundarios de cancion y favorito", _migracion_2),
+    (3, "Contador de favoritos en cancion", _migracion_3),
+    (4, "Índice de trigramas de cancion (búsqueda difusa)", _migracion_4),
+    (5, "ON DELETE CASCADE en las claves foráneas de favorito", _migracion_5),
+]
+
+
+def version_actual(conexion):
+    """
+    Obtiene la versión del esquema registrada en la base de datos.
+
+    Args:
+        conexion: Conexión SQLAlchemy
+
+    Returns:
+        int: Última versión aplicada (0 si no hay ninguna)
+    """
+    esquema_version.create(conexion, checkfirst=True)
+    return conexion.execute(db.select(db.func.max(esquema_version.c.version))).scalar() or 0
+
+
+def migrar(engine):
+    """
+    Crea las tablas que falten y aplica las migraciones pendientes, cada una en
+    su propia transacción.
+
+    Args:
+        engine: Motor SQLAlchemy de la aplicación
+
+    Returns:
+        list: Versiones aplicadas en esta ejecución
+    """
+    with engine.begin() as conexion:
+        db.metadata.create_all(conexion)
+        actual = version_actual(conexion)
+
+    aplicadas = []
+    for version, descripcion, funcion in MIGRACIONES:
+        if version <= actual:
+            continue
+        with engine.begin() as conexion:
+            funcion(conexion)
+            conexion.execute(esquema_version.insert().values(
+                version=version,
+                descripcion=descripcion,
+                fecha_aplicada=datetime.utcnow()
+            ))
+        aplicadas.append(version)
+    return aplicadas
@@ -3,7 +3,10 @@ Módulo de modelos de datos para la aplicación.
 Define las clases de modelos SQLAlchemy que representan las tablas de la base de datos.
 """
 from .extensions import db
+from .cache import invalidar_entidad
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
 class Usuario(db.Model):
     """
@@ -13,9 +16,15 @@ class Usuario(db.Model):
     nombre = db.Column(db.String(100), nullable=False)
     correo = db.Column(db.String(100), unique=True, nullable=False)
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+    # Versión de la fila, incrementada en cada actualización (base de los ETags)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     
-    # Relación con favoritos
-    favoritos = db.relationship("Favorito", back_populates="usuario", cascade="all, delete-orphan")
+    # Relación con favoritos (al eliminar, la base de datos los borra en cascada)
+    favoritos = db.relationship(
+        "Favorito", back_populates="usuario", cascade="all, delete-orphan", passive_deletes=True
+    )
+    
+    __mapper_args__ = {"version_id_col": version}
     
     def __repr__(self):
         return f"<Usuario {self.nombre}>"
@@ -32,9 +41,25 @@ class Cancion(db.Model):
     año = db.Column(db.Integer)
     genero = db.Column(db.String(50))
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    # Versión de la fila, incrementada en cada actualización (base de los ETags)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Número de favoritos, mantenido de forma incremental (ver ajustar_favoritos_count)
+    favoritos_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    
+    # Relación con favoritos (al eliminar, la base de datos los borra en cascada)
+    favoritos = db.relationship(
+        "Favorito", back_populates="cancion", cascade="all, delete-orphan", passive_deletes=True
+    )
     
-    # Relación con favoritos
-    favoritos = db.relationship("Favorito", back_populates="cancion", cascade="all, delete-orphan")
+    __mapper_args__ = {"version_id_col": version}
+    
+    # Índices para los filtros de búsqueda
+    __table_args__ = (
+        db.Index("ix_cancion_artista", "artista"),
+        db.Index("ix_cancion_genero", "genero"),
+        db.Index("ix_cancion_anio", "año"),
+        db.Index("ix_cancion_populares", "favoritos_count", "id"),
+    )
     
     def __repr__(self):
         return f"<Cancion {self.titulo} - {self.artista}>"
@@ -44,19 +69,196 @@ class Favorito(db.Model):
     Modelo para representar una relación de favorito entre un usuario y una canción.
     """
     id = db.Column(db.Integer, primary_key=True)
-    id_usuario = db.Column(db.Integer, db.ForeignKey("usuario.id"), nullable=False)
-    id_cancion = db.Column(db.Integer, db.ForeignKey("cancion.id"), nullable=False)
+    id_usuario = db.Column(db.Integer, db.ForeignKey("usuario.id", ondelete="CASCADE"), nullable=False)
+    id_cancion = db.Column(db.Integer, db.ForeignKey("cancion.id", ondelete="CASCADE"), nullable=False)
     fecha_marcado = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relaciones
-    usuario = db.relationship("Usuario", back_populates="favoritos")
-    cancion = db.relationship("Cancion", back_populates="favoritos")
+    # Relaciones (la carga ansiosa se decide por consulta, ver FAVORITOS_ESTRATEGIA_CARGA)
+    usuario = db.relationship("Usuario", back_populates="favoritos", lazy="select")
+    cancion = db.relationship("Cancion", back_populates="favoritos", lazy="select")
     
-    # Índice único para evitar duplicados
+    # Índice único para evitar duplicados, e índices para borrados por canción
+    # y para listar los favoritos de un usuario ordenados por fecha
     __table_args__ = (
         db.UniqueConstraint('id_usuario', 'id_cancion', name='uq_usuario_cancion'),
+        db.Index("ix_favorito_id_cancion", "id_cancion"),
+        db.Index("ix_favorito_usuario_fecha", "id_usuario", "fecha_marcado"),
+        db.Index("ix_favorito_fecha_marcado", "fecha_marcado"),
     )
     
     def __repr__(self):
         return f"<Favorito: Usuario {self.id_usuario} - Canción {self.id_cancion}>"
 
+
+class CancionSimilar(db.Model):
+    """
+    Modelo del índice precalculado de canciones similares (top-k por canción),
+    según la co-ocurrencia de ambas en los favoritos de los usuarios.
+    """
+    __tablename__ = "cancion_similar"
+    
+    id_cancion = db.Column(db.Integer, db.ForeignKey("cancion.id", ondelete="CASCADE"), primary_key=True)
+    id_similar = db.Column(db.Integer, db.ForeignKey("cancion.id", ondelete="CASCADE"), primary_key=True)
+    puntaje = db.Column(db.Float, nullable=False)  # Similitud coseno
+    
+    __table_args__ = (
+        db.Index("ix_cancion_similar_id_similar", "id_similar"),
+    )
+    
+    def __repr__(self):
+        return f"<CancionSimilar {self.id_cancion} ~ {self.id_similar}: {self.puntaje:.3f}>"
+
+class CancionTrigrama(db.Model):
+    """
+    Modelo del índice invertido de trigramas de título, artista y álbum, usado
+    por la búsqueda tolerante a errores de escritura.
+    """
+    __tablename__ = "cancion_trigrama"
+    
+    trigrama = db.Column(db.String(3), primary_key=True)
+    id_cancion = db.Column(db.Integer, db.ForeignKey("cancion.id", ondelete="CASCADE"), primary_key=True)
+    
+    __table_args__ = (
+        db.Index("ix_cancion_trigrama_id_cancion", "id_cancion"),
+        {"sqlite_with_rowid": False},
+    )
+    
+    def __repr__(self):
+        return f"<CancionTrigrama {self.trigrama!r} {self.id_cancion}>"
+
+class SimilitudPendiente(db.Model):
+    """
+    Modelo de la cola de canciones cuyos favoritos cambiaron y cuyas similitudes
+    deben recalcularse en la próxima actualización incremental.
+    """
+    __tablename__ = "similitud_pendiente"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    id_cancion = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<SimilitudPendiente {self.id_cancion}>"
+
+# Invalidación de la caché de entidades ante cambios en las filas
+def _recordar_invalidacion(target, version_minima):
+    """
+    Recuerda la entidad escrita para invalidarla al confirmar la transacción, con
+    la versión mínima que podrá volver a guardarse en la caché.
+    """
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info.setdefault("cache_invalidar", []).append((type(target), target.id, version_minima))
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Cancion, "after_update")
+def _invalidar_cache_actualizada(mapper, connection, target):
+    _recordar_invalidacion(target, target.version)
+
+@event.listens_for(Usuario, "after_delete")
+@event.listens_for(Cancion, "after_delete")
+def _invalidar_cache_eliminada(mapper, connection, target):
+    # Ninguna lectura de la fila eliminada puede volver a guardarse
+    _recordar_invalidacion(target, target.version + 1)
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_cache_tras_commit(sesion):
+    """Invalida las entidades modificadas en la transacción confirmada."""
+    for modelo, id, version in sesion.info.pop("cache_invalidar", []):
+        invalidar_entidad(modelo, id, version)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_invalidaciones(sesion, transaccion_previa):
+    """Descarta las invalidaciones pendientes de una transacción revertida."""
+    sesion.info.pop("cache_invalidar", None)
+
+# Contador de favoritos por canción
+def ajustar_favoritos_count(conexion, ids_cancion, delta):
+    """
+    Suma `delta` al contador de favoritos de las canciones indicadas y las marca
+    como pendientes de recalcular sus similitudes.
+    Se actualiza la tabla directamente para no alterar la versión (ETag) de la canción.
+    
+    Args:
+        conexion: Conexión o sesión SQLAlchemy de la transacción en curso
+        ids_cancion (list): IDs de las canciones afectadas (una vez por favorito)
+        delta (int): +1 al marcar, -1 al desmarcar
+    """
+    ids_cancion = list(ids_cancion)
+    if not ids_cancion:
+        return
+    tabla = Cancion.__table__
+    conexion.execute(
+        tabla.update()
+        .where(tabla.c.id.in_(ids_cancion))
+        .values(favoritos_count=tabla.c.favoritos_count + delta)
+    )
+    # Las similitudes de estas canciones quedan pendientes de recalcular
+    conexion.execute(
+        SimilitudPendiente.__table__.insert(),
+        [{"id_cancion": i} for i in ids_cancion]
+    )
+
+def reconciliar_favoritos_count(conexion):
+    """
+    Recalcula en bloque los contadores de favoritos que se hayan desviado.
+    
+    Args:
+        conexion: Conexión o sesión SQLAlchemy
+    
+    Returns:
+        int: Número de canciones corregidas
+    """
+    tabla = Cancion.__table__
+    favorito = Favorito.__table__
+    real = (
+        db.select(db.func.count())
+        .where(favorito.c.id_cancion == tabla.c.id)
+        .scalar_subquery()
+    )
+    resultado = conexion.execute(
+        tabla.update().where(tabla.c.favoritos_count != real).values(favoritos_count=real)
+    )
+    return resultado.rowcount
+
+@event.listens_for(Favorito, "after_insert")
+def _incrementar_favoritos_count(mapper, connection, target):
+    """Mantiene el contador al crear favoritos a través del ORM."""
+    ajustar_favoritos_count(connection, [target.id_cancion], 1)
+
+@event.listens_for(Favorito, "after_delete")
+def _decrementar_favoritos_count(mapper, connection, target):
+    """Mantiene el contador al eliminar favoritos a través del ORM."""
+    ajustar_favoritos_count(connection, [target.id_cancion], -1)
+
+@event.listens_for(Usuario, "before_delete")
+def _descontar_favoritos_usuario(mapper, connection, target):
+    """
+    Antes de que la base de datos borre en cascada los favoritos de un usuario,
+    descuenta sus canciones y las marca como pendientes de recalcular, con dos
+    sentencias independientes del número de favoritos.
+    """
+    tabla = Cancion.__table__
+    favorito = Favorito.__table__
+    canciones = db.select(favorito.c.id_cancion).where(favorito.c.id_usuario == target.id)
+    connection.execute(
+        tabla.update()
+        .where(tabla.c.id.in_(canciones))
+        .values(favoritos_count=tabla.c.favoritos_count - 1)
+    )
+    connection.execute(
+        SimilitudPendiente.__table__.insert().from_select(["id_cancion"], canciones)
+    )
+
+@event.listens_for(Cancion, "before_delete")
+def _marcar_similares_pendientes(mapper, connection, target):
+    """
+    Al eliminar una canción, sus favoritos y sus filas de similitud se borran en
+    cascada; las canciones que la tenían como similar quedan pendientes de recalcular.
+    """
+    similar = CancionSimilar.__table__
+    connection.execute(
+        SimilitudPendiente.__table__.insert().from_select(
+            ["id_cancion"],
+            db.select(similar.c.id_cancion).where(similar.c.id_similar == target.id)
+        )
+    )
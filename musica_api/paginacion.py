@@ -0,0 +1,183 @@
+"""
+Módulo de paginación por cursor (keyset).
+Permite recorrer listados grandes con un costo constante por petición,
+filtrando por la clave de ordenamiento en lugar de usar OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app, request, url_for
+from sqlalchemy import literal, tuple_
+
+
+def codificar_cursor(valores):
+    """
+    Codifica los valores de la clave de ordenamiento en un cursor opaco.
+
+    Args:
+        valores (list): Valores de las columnas de ordenamiento del último elemento
+
+    Returns:
+        str: Cursor codificado en base64 apto para URLs
+    """
+    crudo = json.dumps(list(valores), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor, cantidad):
+    """
+    Decodifica un cursor opaco generado por `codificar_cursor`.
+
+    Args:
+        cursor (str): Cursor recibido en el parámetro `after`
+        cantidad (int): Número de valores que debe contener el cursor
+
+    Returns:
+        list: Valores de la clave de ordenamiento
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor de paginación inválido") from e
+    if not isinstance(valores, list) or len(valores) != cantidad:
+        raise ValueError("Cursor de paginación inválido")
+    return valores
+
+
+def obtener_limite():
+    """
+    Lee el parámetro `limit` de la petición actual respetando los límites configurados.
+
+    Returns:
+        int: Número máximo de elementos a devolver
+
+    Raises:
+        ValueError: Si el límite no es un entero positivo
+    """
+    limite = request.args.get("limit")
+    if limite is None:
+        return current_app.config["PAGINACION_LIMITE_DEFECTO"]
+    try:
+        limite = int(limite)
+    except (TypeError, ValueError) as e:
+        raise ValueError("El parámetro 'limit' debe ser un entero") from e
+    if limite < 1:
+        raise ValueError("El parámetro 'limit' debe ser mayor que cero")
+    return min(limite, current_app.config["PAGINACION_LIMITE_MAXIMO"])
+
+
+def paginar(query, columnas, limite, cursor=None, descendente=False):
+    """
+    Aplica paginación keyset a una consulta.
+
+    La consulta se ordena por `columnas` (la última debe ser única, normalmente
+    la clave primaria) y se filtra con una comparación de tuplas contra el
+    cursor, de modo que la base de datos usa el índice en lugar de recorrer
+    las filas anteriores.
+
+    Args:
+        query: Consulta SQLAlchemy a paginar
+        columnas (list): Columnas de ordenamiento
+        limite (int): Número máximo de elementos por página
+        cursor (str): Cursor opaco de la página anterior
+        descendente (bool): Si el orden es descendente
+
+    Returns:
+        tuple: (elementos, siguiente_cursor) donde siguiente_cursor es None en la última página
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    if cursor:
+        query = query.filter(condicion_cursor(columnas, cursor, descendente))
+
+    filas = query.order_by(*orden_cursor(columnas, descendente)).limit(limite + 1).all()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(_valores_clave(filas[-1], columnas))
+    return filas, siguiente
+
+
+def condicion_cursor(columnas, cursor, descendente=False):
+    """
+    Construye la condición que selecciona los elementos posteriores al cursor.
+
+    Args:
+        columnas (list): Columnas de ordenamiento
+        cursor (str): Cursor opaco de la página anterior
+        descendente (bool): Si el orden es descendente
+
+    Returns:
+        Expresión SQLAlchemy para usar en un WHERE o en un ON
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    valores = [
+        _convertir_valor(valor, columna)
+        for valor, columna in zip(decodificar_cursor(cursor, len(columnas)), columnas)
+    ]
+    clave = tuple_(*columnas) if len(columnas) > 1 else columnas[0]
+    limite_clave = tuple_(*valores) if len(columnas) > 1 else valores[0]
+    return clave < limite_clave if descendente else clave > limite_clave
+
+
+def orden_cursor(columnas, descendente=False):
+    """Devuelve las cláusulas ORDER BY correspondientes a las columnas de ordenamiento."""
+    return [c.desc() for c in columnas] if descendente else [c.asc() for c in columnas]
+
+
+def _valores_clave(fila, columnas):
+    """Extrae de una fila (modelo o tupla) los valores de las columnas de ordenamiento."""
+    valores = []
+    for columna in columnas:
+        valor = getattr(fila, columna.key)
+        valores.append(valor.isoformat() if isinstance(valor, datetime) else valor)
+    return valores
+
+
+def _convertir_valor(valor, columna):
+    """Convierte un valor del cursor al tipo de la columna y lo enlaza como parámetro."""
+    try:
+        tipo_python = columna.type.python_type
+    except NotImplementedError:
+        tipo_python = None
+    # El cursor es JSON: solo se admiten escalares (bool se excluye por ser un int)
+    if isinstance(valor, (dict, list, bool)):
+        raise ValueError("Cursor de paginación inválido")
+    try:
+        if tipo_python is datetime and valor is not None:
+            valor = datetime.fromisoformat(valor)
+        elif tipo_python is int and valor is not None:
+            valor = int(valor)
+        elif tipo_python is float and valor is not None:
+            valor = float(valor)
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError("Cursor de paginación inválido") from e
+    return literal(valor, type_=columna.type)
+
+
+def cabeceras_paginacion(siguiente, limite):
+    """
+    Construye la cabecera `Link` (RFC 8288) para la página siguiente.
+
+    Args:
+        siguiente (str): Cursor de la página siguiente o None
+        limite (int): Límite utilizado en la página actual
+
+    Returns:
+        dict: Cabeceras HTTP a añadir a la respuesta
+    """
+    if not siguiente:
+        return {}
+    argumentos = request.args.to_dict()
+    argumentos.update({"limit": limite, "after": siguiente})
+    url = url_for(request.endpoint, _external=False, **(request.view_args or {}), **argumentos)
+    return {"Link": f'<{url}>; rel="next"'}
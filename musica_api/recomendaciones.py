@@ -0,0 +1,259 @@
+"""
+Módulo de recomendaciones ítem-ítem.
+Precalcula, para cada canción, las k canciones más similares según la
+co-ocurrencia en los favoritos (similitud coseno sobre la matriz dispersa
+usuario×canción) y responde las recomendaciones a partir de ese índice.
+
+El producto disperso XᵀX se resuelve en la base de datos con una autounión de
+`favorito` agrupada por pares de canciones, por lotes de canciones, de modo que
+nunca se materializa la matriz completa en memoria.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from .extensions import db
+from .models import Cancion, Favorito, CancionSimilar, SimilitudPendiente
+
+
+def _coocurrencias_lote(conexion, ids_cancion):
+    """
+    Calcula la similitud coseno de cada canción del lote con todas las que co-ocurren con ella.
+
+    Args:
+        conexion: Conexión SQLAlchemy
+        ids_cancion (list): IDs de las canciones del lote
+
+    Returns:
+        dict: {id_cancion: [(puntaje, id_similar), ...]}
+    """
+    a = aliased(Favorito.__table__)
+    b = aliased(Favorito.__table__)
+    ca = aliased(Cancion.__table__)
+    cb = aliased(Cancion.__table__)
+    coocurrencias = conexion.execute(
+        select(a.c.id_cancion, b.c.id_cancion, func.count(), ca.c.favoritos_count, cb.c.favoritos_count)
+        .select_from(a)
+        .join(b, (b.c.id_usuario == a.c.id_usuario) & (b.c.id_cancion != a.c.id_cancion))
+        .join(ca, ca.c.id == a.c.id_cancion)
+        .join(cb, cb.c.id == b.c.id_cancion)
+        .where(a.c.id_cancion.in_(ids_cancion))
+        .group_by(a.c.id_cancion, b.c.id_cancion, ca.c.favoritos_count, cb.c.favoritos_count)
+    )
+
+    candidatos = defaultdict(list)
+    for id_cancion, id_similar, comunes, total_a, total_b in coocurrencias:
+        if total_a and total_b:
+            candidatos[id_cancion].append((comunes / math.sqrt(total_a * total_b), id_similar))
+    return candidatos
+
+
+def _guardar_lote(conexion, ids_cancion, candidatos, top_k):
+    """Reemplaza en el índice las filas (top-k) de las canciones del lote."""
+    tabla = CancionSimilar.__table__
+    conexion.execute(tabla.delete().where(tabla.c.id_cancion.in_(ids_cancion)))
+    filas = [
+        {"id_cancion": id_cancion, "id_similar": id_similar, "puntaje": puntaje}
+        for id_cancion, lista in candidatos.items()
+        for puntaje, id_similar in heapq.nlargest(top_k, lista)
+    ]
+    if filas:
+        conexion.execute(tabla.insert(), filas)
+
+
+def _guardar_inversas(conexion, ids_cancion, candidatos, top_k):
+    """
+    Actualiza las filas de otras canciones que apuntan a las del lote, ya que la
+    similitud es simétrica: se recalcula su puntaje, se eliminan las que ya no
+    co-ocurren y se añaden las que entran en el top-k de la canción del lote.
+    """
+    tabla = CancionSimilar.__table__
+    lote = set(ids_cancion)
+    existentes = {
+        (fila.id_cancion, fila.id_similar)
+        for fila in conexion.execute(
+            select(tabla.c.id_cancion, tabla.c.id_similar)
+            .where(tabla.c.id_similar.in_(ids_cancion), tabla.c.id_cancion.not_in(ids_cancion))
+        )
+    }
+    conexion.execute(tabla.delete().where(
+        tabla.c.id_similar.in_(ids_cancion), tabla.c.id_cancion.not_in(ids_cancion)
+    ))
+
+    filas = []
+    for id_cancion in lote:
+        lista = candidatos.get(id_cancion, [])
+        mejores = {id_similar for _, id_similar in heapq.nlargest(top_k, lista)}
+        for puntaje, id_otra in lista:
+            if id_otra not in lote and (id_otra in mejores or (id_otra, id_cancion) in existentes):
+                filas.append({"id_cancion": id_otra, "id_similar": id_cancion, "puntaje": puntaje})
+    if filas:
+        conexion.execute(tabla.insert(), filas)
+
+
+def recalcular(engine, ids_cancion, top_k, tamano_lote, inversas=False):
+    """
+    Recalcula el índice de similitud de las canciones indicadas, por lotes y con
+    una transacción por lote.
+
+    Args:
+        engine: Motor SQLAlchemy
+        ids_cancion: Iterable de IDs de canciones
+        top_k (int): Número de similares a conservar por canción
+        tamano_lote (int): Canciones por lote
+        inversas (bool): Si también se actualizan las filas que apuntan a estas canciones
+
+    Returns:
+        int: Número de canciones recalculadas
+    """
+    ids_cancion = sorted(set(ids_cancion))
+    for inicio in range(0, len(ids_cancion), tamano_lote):
+        lote = ids_cancion[inicio:inicio + tamano_lote]
+        with engine.begin() as conexion:
+            candidatos = _coocurrencias_lote(conexion, lote)
+            if inversas:
+                _guardar_inversas(conexion, lote, candidatos, top_k)
+            _guardar_lote(conexion, lote, candidatos, top_k)
+    return len(ids_cancion)
+
+
+def recalcular_completo(engine, top_k, tamano_lote):
+    """
+    Reconstruye el índice completo a partir de todas las canciones con favoritos.
+
+    Args:
+        engine: Motor SQLAlchemy
+        top_k (int): Número de similares a conservar por canción
+        tamano_lote (int): Canciones por lote
+
+    Returns:
+        int: Número de canciones recalculadas
+    """
+    with engine.begin() as conexion:
+        ultima_pendiente = conexion.execute(select(func.max(SimilitudPendiente.id))).scalar()
+        conexion.execute(CancionSimilar.__table__.delete())
+        ids_cancion = conexion.execute(
+            select(Cancion.id).where(Cancion.favoritos_count > 0)
+        ).scalars().all()
+    total = recalcular(engine, ids_cancion, top_k, tamano_lote)
+    _descartar_pendientes(engine, ultima_pendiente)
+    return total
+
+
+def recalcular_pendientes(engine, top_k, tamano_lote, maximo=None):
+    """
+    Actualiza el índice solo para las canciones cuyos favoritos cambiaron, y las
+    filas de otras canciones que apuntan a ellas. El top-k de esas otras canciones
+    puede exceder k hasta la próxima reconstrucción completa.
+
+    Args:
+        engine: Motor SQLAlchemy
+        top_k (int): Número de similares a conservar por canción
+        tamano_lote (int): Canciones por lote
+        maximo (int): Marcas de la cola procesadas como máximo (las más antiguas),
+                      o None para procesarla entera
+
+    Returns:
+        int: Número de canciones recalculadas
+    """
+    with engine.connect() as conexion:
+        marcas = select(SimilitudPendiente.id).order_by(SimilitudPendiente.id).limit(maximo).subquery()
+        ultima_pendiente = conexion.execute(select(func.max(marcas.c.id))).scalar()
+        if ultima_pendiente is None:
+            return 0
+        ids_cancion = conexion.execute(
+            select(SimilitudPendiente.id_cancion).distinct()
+            .where(SimilitudPendiente.id <= ultima_pendiente)
+        ).scalars().all()
+    total = recalcular(engine, ids_cancion, top_k, tamano_lote, inversas=True)
+    _descartar_pendientes(engine, ultima_pendiente)
+    return total
+
+
+def _descartar_pendientes(engine, ultima_pendiente):
+    """Elimina de la cola las marcas ya procesadas."""
+    if ultima_pendiente is None:
+        return
+    with engine.begin() as conexion:
+        conexion.execute(
+            SimilitudPendiente.__table__.delete().where(SimilitudPendiente.id <= ultima_pendiente)
+        )
+
+
+def init_recomendaciones(app):
+    """
+    Prepara el estado de la actualización automática del índice de similitud.
+
+    Args:
+        app (Flask): Aplicación a configurar
+    """
+    app.extensions["recomendaciones"] = {"actualizado": None, "lock": threading.Lock()}
+
+
+def actualizar_pendientes():
+    """
+    Procesa un lote de la cola de canciones pendientes si ha pasado el intervalo
+    configurado (RECOMENDACIONES_REFRESCO) desde la última vez, de modo que la
+    cola no crece sin límite ni el índice queda desactualizado aunque no se
+    ejecute `flask recomendaciones`. Si otro hilo ya la está procesando, no espera.
+
+    Returns:
+        int: Número de canciones recalculadas
+    """
+    intervalo = current_app.config["RECOMENDACIONES_REFRESCO"]
+    estado = current_app.extensions.get("recomendaciones")
+    if not intervalo or estado is None:
+        return 0
+    if estado["actualizado"] is not None and time.monotonic() - estado["actualizado"] < intervalo:
+        return 0
+    if not estado["lock"].acquire(blocking=False):
+        return 0
+    try:
+        estado["actualizado"] = time.monotonic()
+        tamano_lote = current_app.config["RECOMENDACIONES_TAMANO_LOTE"]
+        return recalcular_pendientes(
+            db.engine, current_app.config["RECOMENDACIONES_TOP_K"], tamano_lote, maximo=tamano_lote
+        )
+    finally:
+        estado["lock"].release()
+
+
+def recomendar(id_usuario, limite):
+    """
+    Obtiene recomendaciones para un usuario a partir del índice precalculado:
+    suma las similitudes de las canciones vecinas de sus favoritas, excluyendo
+    las que ya tiene. Sin favoritos (o sin vecinas), recurre a las más populares.
+
+    Args:
+        id_usuario (int): ID del usuario
+        limite (int): Número máximo de recomendaciones
+
+    Returns:
+        list: Filas con id, titulo, artista y puntaje
+    """
+    actualizar_pendientes()
+    propias = select(Favorito.id_cancion).where(Favorito.id_usuario == id_usuario)
+    puntaje = func.sum(CancionSimilar.puntaje).label("puntaje")
+    filas = db.session.execute(
+        select(Cancion.id, Cancion.titulo, Cancion.artista, puntaje)
+        .join(CancionSimilar, CancionSimilar.id_similar == Cancion.id)
+        .where(CancionSimilar.id_cancion.in_(propias), Cancion.id.not_in(propias))
+        .group_by(Cancion.id, Cancion.titulo, Cancion.artista)
+        .order_by(puntaje.desc(), Cancion.id)
+        .limit(limite)
+    ).all()
+    if filas:
+        return filas
+
+    return db.session.execute(
+        select(Cancion.id, Cancion.titulo, Cancion.artista, db.literal(0.0).label("puntaje"))
+        .where(Cancion.id.not_in(propias))
+        .order_by(Cancion.favoritos_count.desc(), Cancion.id.desc())
+        .limit(limite)
+    ).all()
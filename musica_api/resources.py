@@ -2,20 +2,282 @@
 Módulo de recursos de la API.
 Define los endpoints, controladores y la lógica de negocio de la API.
 """
-from flask import request
+import hmac
+
+from flask import request, current_app
 from flask_restx import Resource, Namespace
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from sqlalchemy.orm.exc import StaleDataError
 from .api_models import (
     usuario_model, usuario_base, 
     cancion_model, cancion_base,
     favorito_model, favorito_input, 
-    favoritos_usuario_model, mensaje_model
+    favoritos_usuario_model, mensaje_model, importacion_model,
+    favoritos_lote_input, favoritos_lote_model,
+    usuario_pagina_model, cancion_pagina_model, favorito_pagina_model,
+    cancion_popular_pagina_model, recomendaciones_usuario_model,
+    usuario_lote_model, cancion_lote_model, autocompletado_model,
+    instrumentacion_model, consultas_lentas_model
 )
 from .extensions import db
-from .models import Usuario, Cancion, Favorito
+from .models import Usuario, Cancion, Favorito, ajustar_favoritos_count
+from .paginacion import (
+    paginar, obtener_limite, cabeceras_paginacion,
+    codificar_cursor, condicion_cursor, orden_cursor
+)
+from . import busqueda
+from .importacion import importar_canciones, leer_ndjson
+from .exportacion import respuesta_exportacion
+from .condicional import cabeceras_etag, no_modificado, precondicion_fallida, valor_etag_lote
+from .cache import obtener_entidad, obtener_entidades
+from .recomendaciones import recomendar
+from .autocompletado import autocompletar
+from .trigramas import buscar_difusa
+from .instrumentacion import instrumentacion_actual
+from .consultas_lentas import consultas_lentas_actual
+from .serializadores import (
+    serializar_con, campos_solicitados, compilar, proyectar, respuesta_json
+)
 
 # Namespace para agrupar los recursos de la API
 ns = Namespace("api", description="Operaciones de la API de música")
 
+# Parámetros comunes de paginación por cursor
+paginacion_params = {
+    "limit": "Número máximo de elementos por página",
+    "after": "Cursor opaco devuelto en 'next' por la página anterior"
+}
+
+# Parámetro de proyección de campos (sparse fieldsets)
+campos_params = {
+    "fields": "Campos a devolver separados por comas (p. ej. 'id,titulo,artista'); por defecto todos"
+}
+
+def _proyeccion(modelo, modelo_api):
+    """
+    Opciones de carga que limitan las columnas consultadas a los campos pedidos en `fields`.
+    
+    Args:
+        modelo: Clase del modelo SQLAlchemy
+        modelo_api: Modelo de API contra el que se validan los campos
+    
+    Returns:
+        list: Opciones para `Query.options` (vacía si no se pidió proyección)
+    """
+    try:
+        campos = campos_solicitados(modelo_api)
+    except ValueError as e:
+        ns.abort(400, str(e))
+    if not campos:
+        return []
+    return [load_only(*(getattr(modelo, campo) for campo in campos))]
+
+# Parámetro de obtención en lote por IDs
+ids_params = {
+    "ids": "IDs separados por comas; devuelve esos elementos en el mismo orden en lugar de la página"
+}
+
+def _obtener_por_ids(modelo, modelo_lote, modelo_api):
+    """
+    Atiende `?ids=` en los listados: resuelve los IDs pedidos a través de la caché
+    y, para los que falten, con una única consulta `IN`, conservando el orden
+    de la petición. Responde con un ETag de la colección y admite `If-None-Match`.
+    
+    Args:
+        modelo: Clase del modelo (Cancion o Usuario)
+        modelo_lote: Modelo de API de la respuesta en lote
+        modelo_api: Modelo de API de los elementos (valida `fields`)
+    
+    Returns:
+        Response: Respuesta JSON con los elementos y los IDs inexistentes
+    """
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.args["ids"].split(",") if i.strip()))
+    except ValueError:
+        ns.abort(400, "El parámetro 'ids' debe ser una lista de enteros separados por comas")
+    if not ids:
+        ns.abort(400, "El parámetro 'ids' no puede estar vacío")
+    maximo = current_app.config["LOTE_IDS_MAXIMO"]
+    if len(ids) > maximo:
+        ns.abort(400, f"Se admiten como máximo {maximo} IDs por petición")
+    try:
+        campos = campos_solicitados(modelo_api)
+    except ValueError as e:
+        ns.abort(400, str(e))
+    
+    encontradas = obtener_entidades(modelo, ids)
+    elementos = [encontradas[i] for i in ids if i in encontradas]
+    etag = valor_etag_lote(elementos)
+    codigo = 304 if no_modificado(etag) else 200
+    serializador = compilar(proyectar(modelo_lote, campos, "items") if campos else modelo_lote)
+    return respuesta_json(serializador, ({
+        "items": elementos,
+        "inexistentes": [i for i in ids if i not in encontradas]
+    }, codigo, cabeceras_etag(etag)))
+
+# Estrategias de carga de las relaciones de Favorito
+_estrategias_carga = {
+    "joined": joinedload,
+    "selectin": selectinload
+}
+
+def _opciones_carga_favorito():
+    """
+    Opciones de carga de `Favorito.usuario` y `Favorito.cancion` según la configuración.
+    Solo se cargan las columnas que serializan `usuario_simple` y `cancion_simple`,
+    evitando una consulta perezosa por fila durante el marshalling.
+    
+    Returns:
+        list: Opciones para `Query.options`
+    """
+    estrategia = _estrategias_carga.get(current_app.config["FAVORITOS_ESTRATEGIA_CARGA"])
+    if estrategia is None:
+        return []
+    return [
+        estrategia(Favorito.usuario).load_only(Usuario.id, Usuario.nombre),
+        estrategia(Favorito.cancion).load_only(Cancion.id, Cancion.titulo, Cancion.artista)
+    ]
+
+# Sentencias INSERT con soporte de ON CONFLICT DO NOTHING por dialecto
+_insert_por_dialecto = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert
+}
+
+def _insertar_favoritos(id_usuario, ids_cancion):
+    """
+    Inserta favoritos de un usuario ignorando los que ya existen.
+    
+    En SQLite y PostgreSQL se usa una única sentencia `INSERT ... ON CONFLICT DO NOTHING`
+    sobre `uq_usuario_cancion`, y las claves foráneas validan la existencia del
+    usuario y de las canciones. En otros motores se descartan antes los existentes.
+    
+    Args:
+        id_usuario (int): ID del usuario
+        ids_cancion (list): IDs de las canciones a marcar
+    
+    Returns:
+        set: IDs de las canciones efectivamente insertadas
+    
+    Raises:
+        IntegrityError: Si el usuario o alguna canción no existen
+    """
+    filas = [{"id_usuario": id_usuario, "id_cancion": i} for i in ids_cancion]
+    if not filas:
+        return set()
+    
+    insert = _insert_por_dialecto.get(db.session.get_bind().dialect.name)
+    if insert is None:
+        existentes = set(db.session.scalars(db.select(Favorito.id_cancion).where(
+            Favorito.id_usuario == id_usuario, Favorito.id_cancion.in_(ids_cancion)
+        )))
+        filas = [f for f in filas if f["id_cancion"] not in existentes]
+        if filas:
+            db.session.execute(db.insert(Favorito), filas)
+        insertadas = {f["id_cancion"] for f in filas}
+        ajustar_favoritos_count(db.session, insertadas, 1)
+        return insertadas
+    
+    sentencia = insert(Favorito).on_conflict_do_nothing(
+        index_elements=["id_usuario", "id_cancion"]
+    ).returning(Favorito.id_cancion)
+    if len(filas) == 1:
+        insertadas = set(db.session.scalars(sentencia.values(filas[0])))
+    else:
+        insertadas = set(db.session.scalars(sentencia, filas))
+    ajustar_favoritos_count(db.session, insertadas, 1)
+    return insertadas
+
+def _abortar_favorito_inexistente(id_usuario):
+    """Responde 404 indicando si falta el usuario o la canción tras un fallo de clave foránea."""
+    if obtener_entidad(Usuario, id_usuario) is None:
+        ns.abort(404, "Usuario no encontrado")
+    ns.abort(404, "Canción no encontrada")
+
+# Parámetros comunes de exportación en flujo
+exportacion_params = {
+    "formato": "Formato de salida: 'csv' (por defecto) o 'ndjson'",
+    "gzip": "Si es 'true', la salida se comprime con gzip"
+}
+
+def _exportar(nombre, query, columnas):
+    """
+    Exporta en flujo las columnas indicadas de una consulta.
+    
+    Args:
+        nombre (str): Nombre base del archivo descargado
+        query: Consulta SQLAlchemy de origen
+        columnas (list): Atributos de columna a exportar
+    
+    Returns:
+        Response: Respuesta en flujo CSV o NDJSON
+    """
+    filas = query.with_entities(*columnas).yield_per(current_app.config["EXPORTACION_YIELD_PER"])
+    
+    def recorrer():
+        # El flujo se recorre después de retirar la sesión de la petición: se
+        # cierra al terminar para devolver su conexión al pool
+        try:
+            for fila in filas:
+                yield tuple(fila)
+        finally:
+            filas.session.close()
+    
+    try:
+        return respuesta_exportacion(
+            nombre,
+            [c.key for c in columnas],
+            recorrer(),
+            formato=request.args.get("formato", "csv"),
+            gzip=request.args.get("gzip", "false").lower() == "true"
+        )
+    except ValueError as e:
+        ns.abort(400, str(e))
+
+def _obtener_o_404(modelo, id, mensaje):
+    """
+    Obtiene una entidad de solo lectura a través de la caché o responde 404.
+    
+    Args:
+        modelo: Clase del modelo (Cancion o Usuario)
+        id (int): Clave primaria
+        mensaje (str): Mensaje de error si no existe
+    
+    Returns:
+        La entidad encontrada
+    """
+    entidad = obtener_entidad(modelo, id)
+    if entidad is None:
+        ns.abort(404, mensaje)
+    return entidad
+
+def _pagina(query, columnas, descendente=False, transformar=None):
+    """
+    Pagina una consulta con los parámetros `limit` y `after` de la petición.
+    
+    Args:
+        query: Consulta SQLAlchemy a paginar
+        columnas (list): Columnas de ordenamiento (la última debe ser única)
+        descendente (bool): Si el orden es descendente
+        transformar (callable): Función opcional aplicada a cada fila antes de serializar
+    
+    Returns:
+        tuple: (sobre, código, cabeceras) listo para `serializar_con`
+    """
+    try:
+        limite = obtener_limite()
+        elementos, siguiente = paginar(
+            query, columnas, limite, request.args.get("after"), descendente
+        )
+    except ValueError as e:
+        ns.abort(400, str(e))
+    
+    if transformar:
+        elementos = [transformar(fila) for fila in elementos]
+    return {"items": elementos, "next": siguiente}, 200, cabeceras_paginacion(siguiente, limite)
+
 # Recurso para probar la API
 @ns.route("/ping")
 class Ping(Resource):
@@ -23,19 +285,73 @@ class Ping(Resource):
     @ns.marshal_with(mensaje_model)
     def get(self):
         """Endpoint para verificar que la API está funcionando"""
-        # TODO: pendiente de implementar
-        pass
+        return {"mensaje": "pong"}
+
+@ns.route("/instrumentacion")
+class InstrumentacionAPI(Resource):
+    @ns.doc("Consultar las mediciones acumuladas por ruta")
+    @ns.response(200, "Mediciones por ruta de este proceso", instrumentacion_model)
+    @ns.response(404, "Instrumentación deshabilitada")
+    @serializar_con(instrumentacion_model)
+    def get(self):
+        """Devuelve por ruta las consultas SQL y los tiempos medios medidos en este proceso"""
+        estadisticas = instrumentacion_actual()
+        if estadisticas is None:
+            ns.abort(404, "Instrumentación deshabilitada")
+        return {"rutas": estadisticas.estadisticas()}
+
+def _verificar_admin():
+    """
+    Exige la cabecera `X-Admin-Token` con el valor de `ADMIN_TOKEN`; sin token
+    configurado, los endpoints de administración solo responden en depuración y pruebas.
+    """
+    token = current_app.config["ADMIN_TOKEN"]
+    if token is None:
+        if not (current_app.debug or current_app.testing):
+            ns.abort(403, "Endpoint de administración deshabilitado (configure ADMIN_TOKEN)")
+    elif not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        ns.abort(403, "Token de administración inválido")
+
+@ns.route("/admin/consultas-lentas")
+@ns.response(403, "Token de administración ausente o inválido")
+@ns.response(404, "Registro de consultas lentas deshabilitado")
+class ConsultasLentasAPI(Resource):
+    def _registro(self):
+        _verificar_admin()
+        registro = consultas_lentas_actual()
+        if registro is None:
+            ns.abort(404, "Registro de consultas lentas deshabilitado")
+        return registro
+    
+    @ns.doc("Consultar las consultas SQL lentas recientes")
+    @ns.response(200, "Consultas lentas de este proceso", consultas_lentas_model)
+    @serializar_con(consultas_lentas_model)
+    def get(self):
+        """Devuelve las consultas que superaron CONSULTAS_LENTAS_UMBRAL_MS, con su ruta y plan de ejecución"""
+        registro = self._registro()
+        return {"total": registro.total, "items": registro.entradas()}
+    
+    @ns.doc("Vaciar el registro de consultas lentas")
+    @ns.response(204, "Registro vaciado")
+    def delete(self):
+        """Vacía el búfer de consultas lentas de este proceso"""
+        self._registro().limpiar()
+        return "", 204
 
 # Recursos para Usuarios
 @ns.route("/usuarios")
 class UsuarioListAPI(Resource):
-    @ns.doc("Listar todos los usuarios")
-    @ns.response(200, "Lista de usuarios obtenida con éxito")
-    @ns.marshal_list_with(usuario_model)
+    @ns.doc("Listar todos los usuarios", params={**paginacion_params, **campos_params, **ids_params})
+    @ns.response(200, "Lista de usuarios obtenida con éxito (con 'ids', UsuarioLote)", usuario_pagina_model)
+    @ns.response(304, "Los usuarios pedidos con 'ids' no han cambiado (If-None-Match)")
+    @ns.response(400, "Parámetros de paginación, campos o IDs inválidos")
+    @serializar_con(usuario_pagina_model, proyectable="items")
     def get(self):
-        """Obtiene todos los usuarios registrados"""
-        # TODO: pendiente de implementar
-        pass
+        """Obtiene los usuarios registrados, paginados por cursor, o los indicados en 'ids'"""
+        if "ids" in request.args:
+            return _obtener_por_ids(Usuario, usuario_lote_model, usuario_model)
+        query = Usuario.query.options(*_proyeccion(Usuario, usuario_model))
+        return _pagina(query, [Usuario.id])
     
     @ns.doc("Crear un nuevo usuario")
     @ns.expect(usuario_base)
@@ -68,18 +384,24 @@ class UsuarioListAPI(Resource):
 @ns.response(404, "Usuario no encontrado")
 class UsuarioAPI(Resource):
     @ns.doc("Obtener un usuario por su ID")
+    @ns.response(304, "El usuario no ha cambiado (If-None-Match)")
     @ns.marshal_with(usuario_model)
     def get(self, id):
         """Obtiene un usuario por su ID"""
-        # TODO: pendiente de implementar
-        pass
+        usuario = _obtener_o_404(Usuario, id, "Usuario no encontrado")
+        if no_modificado(usuario):
+            return None, 304, cabeceras_etag(usuario)
+        return usuario, 200, cabeceras_etag(usuario)
     
     @ns.doc("Actualizar un usuario")
     @ns.expect(usuario_base)
+    @ns.response(412, "El usuario cambió desde que se leyó (If-Match)")
     @ns.marshal_with(usuario_model)
     def put(self, id):
         """Actualiza un usuario existente"""
         usuario = Usuario.query.get_or_404(id)
+        if precondicion_fallida(usuario):
+            ns.abort(412, "El usuario fue modificado por otra petición")
         data = request.json
         
         # Verificar si se intenta cambiar el correo a uno ya existente
@@ -92,7 +414,10 @@ class UsuarioAPI(Resource):
         
         try:
             db.session.commit()
-            return usuario
+            return usuario, 200, cabeceras_etag(usuario)
+        except StaleDataError:
+            db.session.rollback()
+            ns.abort(412, "El usuario fue modificado por otra petición")
         except Exception as e:
             db.session.rollback()
             ns.abort(400, f"Error al actualizar usuario: {str(e)}")
@@ -113,13 +438,17 @@ class UsuarioAPI(Resource):
 # Recursos para Canciones
 @ns.route("/canciones")
 class CancionListAPI(Resource):
-    @ns.doc("Listar todas las canciones")
-    @ns.response(200, "Lista de canciones obtenida con éxito")
-    @ns.marshal_list_with(cancion_model)
+    @ns.doc("Listar todas las canciones", params={**paginacion_params, **campos_params, **ids_params})
+    @ns.response(200, "Lista de canciones obtenida con éxito (con 'ids', CancionLote)", cancion_pagina_model)
+    @ns.response(304, "Las canciones pedidas con 'ids' no han cambiado (If-None-Match)")
+    @ns.response(400, "Parámetros de paginación, campos o IDs inválidos")
+    @serializar_con(cancion_pagina_model, proyectable="items")
     def get(self):
-        """Obtiene todas las canciones registradas"""
-        # TODO: pendiente de implementar
-        pass
+        """Obtiene las canciones registradas, paginadas por cursor, o las indicadas en 'ids'"""
+        if "ids" in request.args:
+            return _obtener_por_ids(Cancion, cancion_lote_model, cancion_model)
+        query = Cancion.query.options(*_proyeccion(Cancion, cancion_model))
+        return _pagina(query, [Cancion.id])
     
     @ns.doc("Crear una nueva canción")
     @ns.expect(cancion_base)
@@ -146,23 +475,120 @@ class CancionListAPI(Resource):
             db.session.rollback()
             ns.abort(400, f"Error al crear canción: {str(e)}")
 
+@ns.route("/canciones/lote")
+class CancionLoteAPI(Resource):
+    @ns.doc("Importar canciones en lote")
+    @ns.expect([cancion_base])
+    @ns.response(200, "Importación procesada (ver errores por fila)")
+    @ns.response(400, "Cuerpo de la petición inválido")
+    @ns.marshal_with(importacion_model)
+    def post(self):
+        """
+        Importa canciones en lote desde un arreglo JSON o un flujo NDJSON
+        (Content-Type: application/x-ndjson), insertando por lotes
+        """
+        tamano_lote = current_app.config["IMPORTACION_TAMANO_LOTE"]
+        
+        if request.mimetype in ("application/x-ndjson", "application/jsonlines"):
+            return importar_canciones(leer_ndjson(request.stream), tamano_lote)
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            ns.abort(400, "Se esperaba un arreglo JSON o un cuerpo NDJSON")
+        return importar_canciones(enumerate(data, 1), tamano_lote)
+
+@ns.route("/canciones/exportar")
+class CancionExportarAPI(Resource):
+    @ns.doc("Exportar el catálogo de canciones", params=exportacion_params)
+    @ns.param("q", "Texto libre sobre título, artista, álbum y género")
+    @ns.param("titulo", "Título de la canción (búsqueda por palabras o prefijos)")
+    @ns.param("artista", "Nombre del artista (búsqueda por palabras o prefijos)")
+    @ns.param("genero", "Género musical (búsqueda exacta)")
+    @ns.response(200, "Exportación en flujo")
+    @ns.response(400, "Formato no soportado")
+    def get(self):
+        """Exporta en flujo las canciones, con los mismos filtros que la búsqueda"""
+        query, _ = busqueda.buscar(
+            q=request.args.get("q"),
+            titulo=request.args.get("titulo"),
+            artista=request.args.get("artista"),
+            genero=request.args.get("genero")
+        )
+        columnas = [
+            Cancion.id, Cancion.titulo, Cancion.artista, Cancion.album,
+            Cancion.duracion, Cancion.año, Cancion.genero, Cancion.fecha_creacion
+        ]
+        return _exportar("canciones", query.order_by(Cancion.id), columnas)
+
+@ns.route("/canciones/populares")
+class CancionPopularesAPI(Resource):
+    @ns.doc("Listar las canciones más favoritas", params=paginacion_params)
+    @ns.response(200, "Lista de canciones populares obtenida con éxito", cancion_popular_pagina_model)
+    @ns.response(400, "Parámetros de paginación inválidos")
+    @serializar_con(cancion_popular_pagina_model)
+    def get(self):
+        """Obtiene las canciones ordenadas por número de favoritos (índice ix_cancion_populares)"""
+        query = Cancion.query.options(load_only(
+            Cancion.id, Cancion.titulo, Cancion.artista, Cancion.favoritos_count
+        ))
+        return _pagina(query, [Cancion.favoritos_count, Cancion.id], descendente=True)
+
+@ns.route("/canciones/autocompletar")
+class CancionAutocompletarAPI(Resource):
+    @ns.doc("Sugerir canciones mientras se escribe")
+    @ns.param("q", "Prefijo del título o del artista (o de alguna de sus palabras)")
+    @ns.param("limit", "Número máximo de sugerencias")
+    @ns.response(200, "Sugerencias ordenadas por popularidad", autocompletado_model)
+    @ns.response(400, "Parámetros inválidos")
+    @serializar_con(autocompletado_model)
+    def get(self):
+        """Sugiere canciones por prefijo desde el índice en memoria"""
+        q = request.args.get("q", "").strip()
+        try:
+            limite = int(request.args.get("limit", current_app.config["AUTOCOMPLETADO_LIMITE"]))
+        except ValueError:
+            ns.abort(400, "El parámetro 'limit' debe ser un entero")
+        if limite < 1:
+            ns.abort(400, "El parámetro 'limit' debe ser mayor que cero")
+        limite = min(limite, current_app.config["PAGINACION_LIMITE_MAXIMO"])
+        if not q:
+            return {"items": []}
+        
+        sugerencias = autocompletar(q, limite)
+        if sugerencias is None:
+            # Sin índice en memoria: búsqueda por prefijo en la base de datos
+            patron = q.replace("%", r"\%").replace("_", r"\_") + "%"
+            sugerencias = Cancion.query.options(load_only(
+                Cancion.id, Cancion.titulo, Cancion.artista, Cancion.favoritos_count
+            )).filter(db.or_(
+                Cancion.titulo.ilike(patron, escape="\\"),
+                Cancion.artista.ilike(patron, escape="\\")
+            )).order_by(Cancion.favoritos_count.desc(), Cancion.id).limit(limite).all()
+        return {"items": sugerencias}
+
 @ns.route("/canciones/<int:id>")
 @ns.param("id", "Identificador único de la canción")
 @ns.response(404, "Canción no encontrada")
 class CancionAPI(Resource):
     @ns.doc("Obtener una canción por su ID")
+    @ns.response(304, "La canción no ha cambiado (If-None-Match)")
     @ns.marshal_with(cancion_model)
     def get(self, id):
         """Obtiene una canción por su ID"""
-        # TODO: pendiente de implementar
-        pass
+        cancion = _obtener_o_404(Cancion, id, "Canción no encontrada")
+        if no_modificado(cancion):
+            return None, 304, cabeceras_etag(cancion)
+        return cancion, 200, cabeceras_etag(cancion)
     
     @ns.doc("Actualizar una canción")
     @ns.expect(cancion_base)
+    @ns.response(412, "La canción cambió desde que se leyó (If-Match)")
     @ns.marshal_with(cancion_model)
     def put(self, id):
         """Actualiza una canción existente"""
         cancion = Cancion.query.get_or_404(id)
+        if precondicion_fallida(cancion):
+            ns.abort(412, "La canción fue modificada por otra petición")
         data = request.json
         
         cancion.titulo = data.get("titulo", cancion.titulo)
@@ -174,7 +600,10 @@ class CancionAPI(Resource):
         
         try:
             db.session.commit()
-            return cancion
+            return cancion, 200, cabeceras_etag(cancion)
+        except StaleDataError:
+            db.session.rollback()
+            ns.abort(412, "La canción fue modificada por otra petición")
         except Exception as e:
             db.session.rollback()
             ns.abort(400, f"Error al actualizar canción: {str(e)}")
@@ -192,82 +621,128 @@ class CancionAPI(Resource):
             db.session.rollback()
             ns.abort(400, f"Error al eliminar canción: {str(e)}")
 
+def _buscar_difusa(proyeccion):
+    """
+    Búsqueda tolerante a errores de escritura sobre título, artista y álbum
+    mediante el índice de trigramas. Devuelve una sola página, ordenada por
+    similitud y sin cursor (`next` siempre es null): la similitud se calcula en
+    Python sobre los mejores candidatos, así que no hay un orden estable en la
+    base de datos sobre el que continuar. Para ver más resultados se aumenta `limit`.
+    
+    Args:
+        proyeccion (list): Opciones de carga de los campos pedidos
+    
+    Returns:
+        tuple: (sobre, código, cabeceras) listo para `serializar_con`
+    """
+    texto = request.args.get("q") or " ".join(
+        request.args[p] for p in ("titulo", "artista") if request.args.get(p)
+    )
+    if not texto.strip():
+        ns.abort(400, "La búsqueda difusa requiere el parámetro 'q'")
+    if request.args.get("after"):
+        ns.abort(400, "La búsqueda difusa devuelve una sola página y no admite 'after'")
+    try:
+        limite = obtener_limite()
+    except ValueError as e:
+        ns.abort(400, str(e))
+    
+    puntuadas = buscar_difusa(
+        db.session, texto, limite,
+        umbral=current_app.config["BUSQUEDA_DIFUSA_UMBRAL"],
+        maximo_candidatos=current_app.config["BUSQUEDA_DIFUSA_CANDIDATOS"],
+        genero=request.args.get("genero")
+    )
+    query = Cancion.query.options(*proyeccion).filter(Cancion.id.in_([id for id, _ in puntuadas]))
+    canciones = {cancion.id: cancion for cancion in query}
+    return {"items": [canciones[id] for id, _ in puntuadas if id in canciones], "next": None}
+
 # Recursos para buscar canciones
 @ns.route("/canciones/buscar")
 class CancionBusquedaAPI(Resource):
-    @ns.doc("Buscar canciones por título, artista o género")
-    @ns.param("titulo", "Título de la canción (búsqueda parcial)")
-    @ns.param("artista", "Nombre del artista (búsqueda parcial)")
+    @ns.doc("Buscar canciones por título, artista o género", params={**paginacion_params, **campos_params})
+    @ns.param("q", "Texto libre sobre título, artista, álbum y género")
+    @ns.param("titulo", "Título de la canción (búsqueda por palabras o prefijos)")
+    @ns.param("artista", "Nombre del artista (búsqueda por palabras o prefijos)")
     @ns.param("genero", "Género musical (búsqueda exacta)")
-    @ns.marshal_list_with(cancion_model)
+    @ns.param("orden", "'relevancia' para ordenar por bm25 (solo con FTS5) o 'id' (por defecto)")
+    @ns.param("modo", "'difusa' para tolerar errores de escritura en q (una sola página ordenada por similitud)")
+    @ns.response(200, "Canciones encontradas", cancion_pagina_model)
+    @ns.response(400, "Parámetros de paginación o campos inválidos")
+    @serializar_con(cancion_pagina_model, proyectable="items")
     def get(self):
         """Busca canciones por título, artista o género"""
-        titulo = request.args.get("titulo")
-        artista = request.args.get("artista")
-        genero = request.args.get("genero")
-        
-        query = Cancion.query
+        proyeccion = _proyeccion(Cancion, cancion_model)
+        if request.args.get("modo") == "difusa":
+            return _buscar_difusa(proyeccion)
+        ranking = request.args.get("orden", "id") == "relevancia"
+        query, columnas = busqueda.buscar(
+            q=request.args.get("q"),
+            titulo=request.args.get("titulo"),
+            artista=request.args.get("artista"),
+            genero=request.args.get("genero"),
+            ranking=ranking
+        )
+        query = query.options(*proyeccion)
         
-        if titulo:
-            query = query.filter(Cancion.titulo.ilike(f"%{titulo}%"))
-        if artista:
-            query = query.filter(Cancion.artista.ilike(f"%{artista}%"))
-        if genero:
-            query = query.filter(Cancion.genero == genero)
-            
-        return query.all()
+        if len(columnas) > 1:
+            return _pagina(query, columnas, transformar=lambda fila: fila[0])
+        return _pagina(query, columnas)
 
 # Recursos para Favoritos
 @ns.route("/favoritos")
 class FavoritoListAPI(Resource):
-    @ns.doc("Listar todos los favoritos")
-    @ns.response(200, "Lista de favoritos obtenida con éxito")
-    @ns.marshal_list_with(favorito_model)
+    @ns.doc("Listar todos los favoritos", params=paginacion_params)
+    @ns.response(200, "Lista de favoritos obtenida con éxito", favorito_pagina_model)
+    @ns.response(400, "Parámetros de paginación inválidos")
+    @serializar_con(favorito_pagina_model)
     def get(self):
-        """Obtiene todos los registros de favoritos"""
-        # TODO: pendiente de implementar
-        pass
+        """Obtiene los registros de favoritos, paginados por cursor"""
+        return _pagina(Favorito.query.options(*_opciones_carga_favorito()), [Favorito.id])
     
     @ns.doc("Marcar una canción como favorita")
     @ns.expect(favorito_input)
+    @ns.response(200, "La canción ya estaba marcada como favorita")
     @ns.response(201, "Canción marcada como favorita")
-    @ns.response(400, "Datos inválidos o relación ya existe")
+    @ns.response(400, "Datos inválidos")
     @ns.response(404, "Usuario o canción no encontrada")
     @ns.marshal_with(favorito_model)
     def post(self):
-        """Marca una canción como favorita para un usuario"""
+        """Marca una canción como favorita para un usuario (idempotente)"""
         data = request.json
-        
-        # Verificar si existen el usuario y la canción
-        usuario = Usuario.query.get(data["id_usuario"])
-        cancion = Cancion.query.get(data["id_cancion"])
-        
-        if not usuario:
-            ns.abort(404, "Usuario no encontrado")
-        if not cancion:
-            ns.abort(404, "Canción no encontrada")
-        
-        # Verificar si ya existe el favorito
-        favorito_existente = Favorito.query.filter_by(
-            id_usuario=data["id_usuario"],
-            id_cancion=data["id_cancion"]
-        ).first()
-        
-        if favorito_existente:
-            ns.abort(400, "La canción ya está marcada como favorita para este usuario")
-        
-        favorito = Favorito(
-            id_usuario=data["id_usuario"],
-            id_cancion=data["id_cancion"]
-        )
+        id_usuario = data["id_usuario"]
+        id_cancion = data["id_cancion"]
         
         try:
-            db.session.add(favorito)
+            creado = bool(_insertar_favoritos(id_usuario, [id_cancion]))
             db.session.commit()
-            return favorito, 201
+        except IntegrityError:
+            db.session.rollback()
+            _abortar_favorito_inexistente(id_usuario)
         except Exception as e:
             db.session.rollback()
             ns.abort(400, f"Error al marcar como favorito: {str(e)}")
+        
+        favorito = Favorito.query.options(*_opciones_carga_favorito()).filter_by(
+            id_usuario=id_usuario,
+            id_cancion=id_cancion
+        ).one()
+        return favorito, 201 if creado else 200
+
+@ns.route("/favoritos/exportar")
+class FavoritoExportarAPI(Resource):
+    @ns.doc("Exportar los favoritos", params=exportacion_params)
+    @ns.param("id_usuario", "Exportar solo los favoritos de este usuario")
+    @ns.response(200, "Exportación en flujo")
+    @ns.response(400, "Formato no soportado")
+    def get(self):
+        """Exporta en flujo los registros de favoritos"""
+        query = Favorito.query
+        id_usuario = request.args.get("id_usuario", type=int)
+        if id_usuario is not None:
+            query = query.filter(Favorito.id_usuario == id_usuario)
+        columnas = [Favorito.id, Favorito.id_usuario, Favorito.id_cancion, Favorito.fecha_marcado]
+        return _exportar("favoritos", query.order_by(Favorito.id), columnas)
 
 @ns.route("/favoritos/<int:id>")
 @ns.param("id", "Identificador único del favorito")
@@ -277,7 +752,7 @@ class FavoritoAPI(Resource):
     @ns.marshal_with(favorito_model)
     def get(self, id):
         """Obtiene un registro de favorito por su ID"""
-        favorito = Favorito.query.get_or_404(id)
+        favorito = Favorito.query.options(*_opciones_carga_favorito()).get_or_404(id)
         return favorito
     
     @ns.doc("Eliminar un favorito")
@@ -297,73 +772,189 @@ class FavoritoAPI(Resource):
 @ns.param("id", "Identificador único del usuario")
 @ns.response(404, "Usuario no encontrado")
 class UsuarioFavoritosAPI(Resource):
-    @ns.doc("Obtener las canciones favoritas de un usuario")
-    @ns.marshal_with(favoritos_usuario_model)
+    @ns.doc("Obtener las canciones favoritas de un usuario", params=paginacion_params)
+    @ns.param("orden", "Orden por fecha de marcado: 'desc' (por defecto) o 'asc'")
+    @ns.response(200, "Canciones favoritas del usuario", favoritos_usuario_model)
+    @ns.response(400, "Parámetros de paginación inválidos")
+    @serializar_con(favoritos_usuario_model)
     def get(self, id):
-        """Obtiene todas las canciones favoritas de un usuario"""
-        usuario = Usuario.query.get_or_404(id)
+        """Obtiene las canciones favoritas de un usuario, paginadas por fecha de marcado"""
+        descendente = request.args.get("orden", "desc") != "asc"
+        columnas = [Favorito.fecha_marcado, Favorito.id]
+        
+        # La condición del cursor va en el ON del LEFT JOIN para conservar la
+        # fila del usuario aunque no tenga (más) favoritos
+        union = Favorito.id_usuario == Usuario.id
+        try:
+            limite = obtener_limite()
+            if request.args.get("after"):
+                union = db.and_(union, condicion_cursor(columnas, request.args["after"], descendente))
+        except ValueError as e:
+            ns.abort(400, str(e))
+        
+        # Una sola consulta: usuario + favoritos + columnas proyectadas de la canción
+        filas = db.session.execute(
+            db.select(
+                Usuario.id.label("usuario_id"),
+                Usuario.nombre,
+                Favorito.id.label("favorito_id"),
+                Favorito.fecha_marcado,
+                Cancion.id.label("cancion_id"),
+                Cancion.titulo,
+                Cancion.artista
+            )
+            .select_from(Usuario)
+            .outerjoin(Favorito, union)
+            .outerjoin(Cancion, Cancion.id == Favorito.id_cancion)
+            .where(Usuario.id == id)
+            .order_by(*orden_cursor(columnas, descendente))
+            .limit(limite + 1)
+        ).all()
         
-        # Obtener los favoritos del usuario
-        favoritos = Favorito.query.filter_by(id_usuario=id).all()
+        if not filas:
+            ns.abort(404, "Usuario no encontrado")
+        
+        favoritos = [fila for fila in filas if fila.favorito_id is not None]
+        siguiente = None
+        if len(favoritos) > limite:
+            favoritos = favoritos[:limite]
+            siguiente = codificar_cursor([favoritos[-1].fecha_marcado, favoritos[-1].favorito_id])
         
-        # Extraer las canciones de los favoritos
         canciones_favoritas = [
             {
-                "id": favorito.cancion.id,
-                "titulo": favorito.cancion.titulo,
-                "artista": favorito.cancion.artista
+                "id": fila.cancion_id,
+                "titulo": fila.titulo,
+                "artista": fila.artista,
+                "fecha_marcado": fila.fecha_marcado
             }
-            for favorito in favoritos
+            for fila in favoritos
         ]
         
         return {
             "usuario": {
-                "id": usuario.id,
-                "nombre": usuario.nombre
+                "id": filas[0].usuario_id,
+                "nombre": filas[0].nombre
             },
-            "canciones_favoritas": canciones_favoritas
+            "canciones_favoritas": canciones_favoritas,
+            "next": siguiente
+        }, 200, cabeceras_paginacion(siguiente, limite)
+
+@ns.route("/usuarios/<int:id>/recomendaciones")
+@ns.param("id", "Identificador único del usuario")
+@ns.response(404, "Usuario no encontrado")
+class UsuarioRecomendacionesAPI(Resource):
+    @ns.doc("Recomendar canciones a un usuario")
+    @ns.param("limit", "Número máximo de recomendaciones")
+    @ns.response(400, "Límite inválido")
+    @ns.marshal_with(recomendaciones_usuario_model)
+    def get(self, id):
+        """Recomienda canciones similares a las favoritas del usuario (índice precalculado)"""
+        usuario = _obtener_o_404(Usuario, id, "Usuario no encontrado")
+        try:
+            limite = obtener_limite()
+        except ValueError as e:
+            ns.abort(400, str(e))
+        
+        return {
+            "usuario": usuario,
+            "recomendaciones": recomendar(id, limite)
+        }
+
+@ns.route("/usuarios/<int:id_usuario>/favoritos/lote")
+@ns.param("id_usuario", "Identificador único del usuario")
+@ns.response(404, "Usuario no encontrado")
+class UsuarioFavoritosLoteAPI(Resource):
+    @ns.doc("Marcar y desmarcar canciones favoritas en lote")
+    @ns.expect(favoritos_lote_input)
+    @ns.response(200, "Cambios aplicados")
+    @ns.response(400, "Datos inválidos")
+    @ns.marshal_with(favoritos_lote_model)
+    def post(self, id_usuario):
+        """Marca y desmarca varias canciones favoritas de un usuario en una sola transacción"""
+        data = request.json
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            ns.abort(400, "Se esperaba un objeto JSON con 'agregar' y/o 'eliminar'")
+        agregar = data.get("agregar") or []
+        eliminar = data.get("eliminar") or []
+        
+        for ids in (agregar, eliminar):
+            if not isinstance(ids, list) or not all(
+                isinstance(i, int) and not isinstance(i, bool) for i in ids
+            ):
+                ns.abort(400, "'agregar' y 'eliminar' deben ser listas de enteros")
+        agregar = list(dict.fromkeys(agregar))
+        eliminar = list(dict.fromkeys(eliminar))
+        if len(agregar) + len(eliminar) > current_app.config["FAVORITOS_LOTE_MAXIMO"]:
+            ns.abort(400, "Se superó el número máximo de canciones por petición")
+        if set(agregar) & set(eliminar):
+            ns.abort(400, "Una canción no puede agregarse y eliminarse a la vez")
+        
+        if obtener_entidad(Usuario, id_usuario) is None:
+            ns.abort(404, "Usuario no encontrado")
+        
+        # Una consulta IN por tabla para validar existencia
+        existentes = set(db.session.scalars(
+            db.select(Cancion.id).where(Cancion.id.in_(agregar))
+        )) if agregar else set()
+        marcadas = set(db.session.scalars(
+            db.select(Favorito.id_cancion).where(
+                Favorito.id_usuario == id_usuario,
+                Favorito.id_cancion.in_(agregar + eliminar)
+            )
+        )) if agregar or eliminar else set()
+        
+        resultado = {
+            "agregadas": [i for i in agregar if i in existentes and i not in marcadas],
+            "ya_presentes": [i for i in agregar if i in marcadas],
+            "inexistentes": [i for i in agregar if i not in existentes],
+            "eliminadas": [i for i in eliminar if i in marcadas],
+            "no_marcadas": [i for i in eliminar if i not in marcadas]
         }
+        
+        try:
+            # Una petición concurrente pudo marcar alguna canción entre la lectura y la escritura
+            insertadas = _insertar_favoritos(id_usuario, resultado["agregadas"])
+            resultado["ya_presentes"] += [i for i in resultado["agregadas"] if i not in insertadas]
+            resultado["agregadas"] = [i for i in resultado["agregadas"] if i in insertadas]
+            if resultado["eliminadas"]:
+                eliminadas = db.session.scalars(db.delete(Favorito).where(
+                    Favorito.id_usuario == id_usuario,
+                    Favorito.id_cancion.in_(resultado["eliminadas"])
+                ).returning(Favorito.id_cancion)).all()
+                resultado["eliminadas"] = [i for i in resultado["eliminadas"] if i in eliminadas]
+                ajustar_favoritos_count(db.session, eliminadas, -1)
+            db.session.commit()
+            return resultado
+        except Exception as e:
+            db.session.rollback()
+            ns.abort(400, f"Error al actualizar favoritos: {str(e)}")
 
 @ns.route("/usuarios/<int:id_usuario>/favoritos/<int:id_cancion>")
 @ns.param("id_usuario", "Identificador único del usuario")
 @ns.param("id_cancion", "Identificador único de la canción")
 class UsuarioCancionFavoritoAPI(Resource):
     @ns.doc("Marcar o desmarcar una canción como favorita para un usuario")
+    @ns.response(200, "La canción ya estaba marcada como favorita")
     @ns.response(201, "Canción marcada como favorita")
     @ns.response(204, "Canción desmarcada como favorita")
     @ns.response(404, "Usuario o canción no encontrada")
     def post(self, id_usuario, id_cancion):
-        """Marca una canción como favorita para un usuario"""
-        # Verificar si existen el usuario y la canción
-        usuario = Usuario.query.get(id_usuario)
-        cancion = Cancion.query.get(id_cancion)
-        
-        if not usuario:
-            ns.abort(404, "Usuario no encontrado")
-        if not cancion:
-            ns.abort(404, "Canción no encontrada")
-        
-        # Verificar si ya existe el favorito
-        favorito = Favorito.query.filter_by(
-            id_usuario=id_usuario,
-            id_cancion=id_cancion
-        ).first()
-        
-        if favorito:
-            ns.abort(400, "La canción ya está marcada como favorita para este usuario")
-        
-        favorito = Favorito(
-            id_usuario=id_usuario,
-            id_cancion=id_cancion
-        )
-        
+        """Marca una canción como favorita para un usuario (idempotente)"""
         try:
-            db.session.add(favorito)
+            creado = bool(_insertar_favoritos(id_usuario, [id_cancion]))
             db.session.commit()
-            return {"mensaje": "Canción marcada como favorita"}, 201
+        except IntegrityError:
+            db.session.rollback()
+            _abortar_favorito_inexistente(id_usuario)
         except Exception as e:
             db.session.rollback()
             ns.abort(400, f"Error al marcar como favorito: {str(e)}")
+        
+        if creado:
+            return {"mensaje": "Canción marcada como favorita"}, 201
+        return {"mensaje": "La canción ya estaba marcada como favorita"}, 200
     
     @ns.doc("Eliminar una canción de favoritos")
     @ns.response(204, "Canción eliminada de favoritos")
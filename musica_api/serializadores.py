@@ -0,0 +1,247 @@
+"""
+Módulo de serializadores precompilados.
+Genera, a partir de los modelos de `api_models.py`, una función especializada
+por modelo que produce directamente los diccionarios de salida, evitando el
+recorrido genérico de `fields.*` que hace `marshal` por cada atributo y fila.
+La documentación Swagger se sigue generando con los mismos modelos.
+"""
+import json
+from datetime import date, datetime
+from functools import wraps
+
+from flask import Response, request
+from flask_restx import Model, fields
+
+from .instrumentacion import medir_serializacion
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+def dumps(datos):
+    """
+    Codifica datos como JSON en bytes, con orjson si está instalado.
+
+    Args:
+        datos: Estructura de diccionarios, listas y valores primitivos
+
+    Returns:
+        bytes: Documento JSON en UTF-8
+    """
+    if orjson is not None:
+        return orjson.dumps(datos)
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fecha(valor):
+    """Formatea una fecha como `fields.DateTime` (ISO 8601)."""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day).isoformat()
+    return datetime.fromisoformat(valor).isoformat()
+
+
+# Conversión de cada tipo de campo a una expresión de Python sobre la variable `v`
+_CONVERSIONES = [
+    (fields.DateTime, "_fecha({v})"),
+    (fields.Boolean, "bool({v})"),
+    (fields.Integer, "int({v})"),
+    (fields.Float, "float({v})"),
+    (fields.String, "str({v})"),
+]
+
+# Caché de serializadores compilados por modelo
+_compilados = {}
+
+
+def _campos(modelo):
+    """Devuelve los campos de un modelo incluyendo los heredados."""
+    return getattr(modelo, "resolved", modelo).items()
+
+
+def _expresion(campo, variable, dependencias):
+    """
+    Genera la expresión que serializa el valor de un campo.
+
+    Args:
+        campo: Campo de flask-restx
+        variable (str): Nombre de la variable con el valor crudo
+        dependencias (dict): Funciones auxiliares referenciadas por el código generado
+
+    Returns:
+        str: Expresión de Python
+    """
+    if isinstance(campo, type):
+        campo = campo()
+    if isinstance(campo, fields.Nested):
+        nombre = f"_s{len(dependencias)}"
+        dependencias[nombre] = compilar(campo.nested)
+        if campo.allow_null:
+            return f"(None if {variable} is None else {nombre}({variable}))"
+        return f"{nombre}({variable})"
+    if isinstance(campo, fields.List):
+        elemento = _expresion(campo.container, "x", dependencias)
+        return f"(None if {variable} is None else [{elemento} for x in {variable}])"
+    for tipo, plantilla in _CONVERSIONES:
+        if isinstance(campo, tipo):
+            return f"(None if {variable} is None else {plantilla.format(v=variable)})"
+    return variable
+
+
+def compilar(modelo):
+    """
+    Compila un modelo de API en una función `serializar(objeto) -> dict`.
+
+    La función acepta objetos (atributos) o diccionarios (claves), y reproduce
+    la salida de `marshal`: los campos ausentes son None y un `Nested` sin valor
+    produce un diccionario con todos sus campos a None.
+
+    Args:
+        modelo: Modelo de flask-restx
+
+    Returns:
+        callable: Serializador especializado del modelo
+    """
+    if modelo.name in _compilados:
+        return _compilados[modelo.name]
+
+    dependencias = {"_fecha": _fecha}
+    campos = list(_campos(modelo))
+    claves = [campo.attribute or clave if not isinstance(campo, type) else clave
+              for clave, campo in campos]
+
+    lineas = [f"def serializar(o):"]
+    lineas.append("    if o is None:")
+    lineas.append("        return {" + ", ".join(
+        f"{clave!r}: {_expresion(campo, 'None', dependencias)}" for clave, campo in campos
+    ) + "}")
+    lineas.append("    if isinstance(o, dict):")
+    for i, atributo in enumerate(claves):
+        lineas.append(f"        v{i} = o.get({atributo!r})")
+    lineas.append("    else:")
+    for i, atributo in enumerate(claves):
+        lineas.append(f"        v{i} = getattr(o, {atributo!r}, None)")
+    lineas.append("    return {" + ", ".join(
+        f"{clave!r}: {_expresion(campo, f'v{i}', dependencias)}"
+        for i, (clave, campo) in enumerate(campos)
+    ) + "}")
+
+    espacio = dict(dependencias)
+    exec(compile("\n".join(lineas), f"<serializador {modelo.name}>", "exec"), espacio)
+    serializar = espacio["serializar"]
+    serializar.__name__ = f"serializar_{modelo.name}"
+    _compilados[modelo.name] = serializar
+    return serializar
+
+
+def campos_solicitados(modelo):
+    """
+    Lee el parámetro `fields` de la petición actual (lista separada por comas).
+
+    Args:
+        modelo: Modelo de API contra el que se validan los campos
+
+    Returns:
+        tuple: Campos solicitados en el orden del modelo, o None si no se indicaron
+
+    Raises:
+        ValueError: Si algún campo no pertenece al modelo
+    """
+    valor = request.args.get("fields")
+    if not valor:
+        return None
+    solicitados = {campo.strip() for campo in valor.split(",") if campo.strip()}
+    disponibles = [clave for clave, _ in _campos(modelo)]
+    desconocidos = solicitados.difference(disponibles)
+    if desconocidos:
+        raise ValueError(
+            f"Campos no válidos: {', '.join(sorted(desconocidos))}. "
+            f"Disponibles: {', '.join(disponibles)}"
+        )
+    return tuple(clave for clave in disponibles if clave in solicitados) or None
+
+
+def proyectar(modelo, campos, anidado=None):
+    """
+    Deriva un modelo (no registrado en Swagger) que solo conserva los campos indicados.
+
+    Args:
+        modelo: Modelo de API de origen
+        campos (tuple): Campos a conservar
+        anidado (str): Si se indica, los campos se aplican al modelo de la lista
+            `fields.List(fields.Nested(...))` con esa clave (p. ej. "items" de un sobre)
+
+    Returns:
+        Model: Modelo proyectado
+    """
+    definicion = dict(_campos(modelo))
+    if anidado is None:
+        return Model(f"{modelo.name}[{','.join(campos)}]", {c: definicion[c] for c in campos})
+    lista = definicion[anidado]
+    definicion[anidado] = fields.List(
+        fields.Nested(proyectar(lista.container.nested, campos)), description=lista.description
+    )
+    return Model(f"{modelo.name}[{anidado}:{','.join(campos)}]", definicion)
+
+
+def serializar_con(modelo, proyectable=None):
+    """
+    Decorador que sustituye a `marshal_with` usando el serializador compilado y
+    respondiendo directamente con los bytes JSON.
+
+    El recurso puede devolver `datos`, `(datos, código, cabeceras)` o una
+    `Response` ya construida, que se devuelve sin cambios. La
+    documentación Swagger del modelo se declara con `@ns.response(200, ..., modelo)`.
+
+    Args:
+        modelo: Modelo de flask-restx de la respuesta
+        proyectable (str): Clave de la lista de elementos cuyo modelo se restringe
+            con el parámetro `fields` (el recurso debe validarlo antes con
+            `campos_solicitados`)
+
+    Returns:
+        callable: Decorador
+    """
+    serializar = compilar(modelo)
+    elemento = modelo.resolved[proyectable].container.nested if proyectable else None
+
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            resultado = funcion(*args, **kwargs)
+            if isinstance(resultado, Response):
+                return resultado
+            serializador = serializar
+            campos = campos_solicitados(elemento) if elemento is not None else None
+            if campos:
+                serializador = compilar(proyectar(modelo, campos, proyectable))
+            return respuesta_json(serializador, resultado)
+        return envoltura
+    return decorador
+
+
+def respuesta_json(serializador, resultado):
+    """
+    Construye la respuesta JSON de un recurso con un serializador compilado.
+
+    Args:
+        serializador (callable): Serializador devuelto por `compilar`
+        resultado: `datos` o `(datos, código, cabeceras)`; con código 304 no hay cuerpo
+
+    Returns:
+        Response: Respuesta de Flask
+    """
+    codigo, cabeceras = 200, {}
+    if isinstance(resultado, tuple):
+        resultado, codigo, cabeceras = (tuple(resultado) + (200, {}))[:3]
+    with medir_serializacion():
+        cuerpo = b"" if codigo == 304 else dumps(serializador(resultado))
+    return Response(
+        cuerpo,
+        status=codigo,
+        headers=cabeceras,
+        mimetype="application/json"
+    )
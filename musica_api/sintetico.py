@@ -0,0 +1,262 @@
+"""
+Módulo de generación de datos sintéticos para pruebas de escala.
+Genera usuarios, canciones y favoritos de forma determinista a partir de una
+semilla, con la popularidad de las canciones distribuida según una ley de Zipf,
+y los inserta con sentencias Core por lotes y un commit por lote.
+"""
+import random
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+from sqlalchemy import func, select
+
+from .models import Usuario, Cancion, Favorito, CancionTrigrama, reconciliar_favoritos_count
+from .trigramas import COLUMNAS_TRIGRAMAS, trigramas
+
+GENEROS = ["Rock", "Pop", "Jazz", "Blues", "Reggae", "Salsa", "Cumbia", "Metal", "Electrónica", "Folk"]
+
+PALABRAS = [
+    "amor", "noche", "luna", "fuego", "camino", "ciudad", "corazón", "sueño", "lluvia", "mar",
+    "cielo", "tiempo", "viento", "sombra", "canción", "río", "estrella", "silencio", "verano", "ausencia",
+    "night", "fire", "heart", "dream", "road", "rain", "light", "blue", "wild", "gold",
+]
+
+# Fecha de referencia fija para que las fechas generadas no dependan del momento de ejecución
+FECHA_BASE = datetime(2024, 1, 1)
+
+
+def _generador(semilla, nombre):
+    """Generador aleatorio independiente por tipo de dato, derivado de la semilla."""
+    return random.Random(f"{semilla}-{nombre}")
+
+
+def _texto(rng, minimo, maximo):
+    """Frase de entre `minimo` y `maximo` palabras, con mayúscula inicial."""
+    return " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(minimo, maximo))).capitalize()
+
+
+def generar_canciones(semilla, primer_id, cantidad):
+    """
+    Genera canciones con artistas y álbumes repartidos entre ellas.
+
+    Args:
+        semilla (int): Semilla de la generación
+        primer_id (int): ID de la primera canción
+        cantidad (int): Número de canciones
+
+    Yields:
+        dict: Valores de columna de cada canción
+    """
+    rng = _generador(semilla, "canciones")
+    artistas = [f"{_texto(rng, 1, 2)} {i}" for i in range(max(1, cantidad // 10))]
+    for id in range(primer_id, primer_id + cantidad):
+        artista = rng.randrange(len(artistas))
+        yield {
+            "id": id,
+            "titulo": _texto(rng, 1, 4),
+            "artista": artistas[artista],
+            "album": f"{_texto(rng, 1, 3)} {artista}",
+            "duracion": rng.randint(120, 420),
+            "año": rng.randint(1960, 2024),
+            "genero": rng.choice(GENEROS),
+            "fecha_creacion": FECHA_BASE + timedelta(seconds=id)
+        }
+
+
+def generar_usuarios(semilla, primer_id, cantidad):
+    """
+    Genera usuarios con correos únicos.
+
+    Args:
+        semilla (int): Semilla de la generación
+        primer_id (int): ID del primer usuario
+        cantidad (int): Número de usuarios
+
+    Yields:
+        dict: Valores de columna de cada usuario
+    """
+    rng = _generador(semilla, "usuarios")
+    for id in range(primer_id, primer_id + cantidad):
+        yield {
+            "id": id,
+            "nombre": f"{_texto(rng, 1, 2)} {id}",
+            "correo": f"usuario{id}@sintetico.test",
+            "fecha_registro": FECHA_BASE + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        }
+
+
+def generar_favoritos(semilla, ids_usuario, ids_cancion, cantidad, exponente):
+    """
+    Genera favoritos únicos por usuario. El número de favoritos de cada usuario
+    sigue una distribución exponencial con media `cantidad / usuarios`, y las
+    canciones se eligen según una ley de Zipf con el exponente indicado sobre
+    un orden de popularidad aleatorio (pero determinista).
+
+    Args:
+        semilla (int): Semilla de la generación
+        ids_usuario (range): IDs de los usuarios
+        ids_cancion (range): IDs de las canciones
+        cantidad (int): Número aproximado de favoritos
+        exponente (float): Exponente de la ley de Zipf (1 es la clásica)
+
+    Yields:
+        dict: Valores de columna de cada favorito
+    """
+    if not ids_usuario or not ids_cancion or cantidad <= 0:
+        return
+    rng = _generador(semilla, "favoritos")
+    por_popularidad = list(ids_cancion)
+    rng.shuffle(por_popularidad)
+    acumulados = list(accumulate(1 / rango ** exponente for rango in range(1, len(por_popularidad) + 1)))
+    media = cantidad / len(ids_usuario)
+
+    for id_usuario in ids_usuario:
+        elegidas = min(len(por_popularidad), round(rng.expovariate(1 / media)))
+        canciones = dict.fromkeys(rng.choices(por_popularidad, cum_weights=acumulados, k=elegidas))
+        for id_cancion in canciones:
+            yield {
+                "id_usuario": id_usuario,
+                "id_cancion": id_cancion,
+                "fecha_marcado": FECHA_BASE + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            }
+
+
+def _sentencia_insert(conexion, tabla, columnas):
+    """
+    Compila una vez el `INSERT` Core de la tabla y devuelve, además del SQL,
+    una función que convierte cada fila al formato de parámetros del driver
+    aplicando los procesadores de tipo de las columnas.
+    """
+    sentencia = tabla.insert().compile(dialect=conexion.dialect, column_keys=columnas)
+    # Columnas con valor por defecto escalar que la compilación añade a las indicadas
+    constantes = {
+        c.key: c.default.arg for c in tabla.c
+        if c.key not in columnas and c.default is not None and c.default.is_scalar
+    }
+    claves = list(sentencia.positiontup) if sentencia.positional else list(sentencia.params)
+    pares = [
+        (clave, tabla.c[clave].type.bind_processor(conexion.dialect) or (lambda valor: valor))
+        for clave in claves
+    ]
+
+    def valores(fila):
+        return [procesar(fila[clave] if clave in fila else constantes[clave]) for clave, procesar in pares]
+
+    if sentencia.positional:
+        return str(sentencia), lambda fila: tuple(valores(fila))
+    return str(sentencia), lambda fila: dict(zip(claves, valores(fila)))
+
+
+def insertar_por_lotes(engine, modelo, filas, tamano_lote, despues=None):
+    """
+    Inserta filas con un `INSERT` Core compilado una sola vez y ejecutado como
+    executemany del driver, con una transacción por lote.
+
+    Args:
+        engine: Motor SQLAlchemy
+        modelo: Clase del modelo (o tabla) de destino
+        filas: Iterable de diccionarios con los valores de columna (todos con las mismas claves)
+        tamano_lote (int): Filas por lote
+        despues (callable): Función opcional `(conexion, lote)` ejecutada en la misma transacción
+
+    Returns:
+        int: Número de filas insertadas
+    """
+    tabla = getattr(modelo, "__table__", modelo)
+    total = 0
+    filas = iter(filas)
+    sql = convertir = None
+    while True:
+        lote = list(islice(filas, tamano_lote))
+        if not lote:
+            return total
+        with engine.begin() as conexion:
+            if sql is None:
+                sql, convertir = _sentencia_insert(conexion, tabla, list(lote[0]))
+            conexion.exec_driver_sql(sql, [convertir(fila) for fila in lote])
+            if despues is not None:
+                despues(conexion, lote)
+        total += len(lote)
+
+
+@contextmanager
+def _sin_indices_secundarios(engine, *modelos):
+    """
+    Elimina los índices secundarios (no únicos) de las tablas durante la carga
+    y los vuelve a crear al final, de una sola pasada, en lugar de mantenerlos fila a fila.
+    """
+    indices = [i for modelo in modelos for i in modelo.__table__.indexes if not i.unique]
+    with engine.begin() as conexion:
+        for indice in indices:
+            indice.drop(conexion, checkfirst=True)
+    try:
+        yield
+    finally:
+        with engine.begin() as conexion:
+            for indice in indices:
+                indice.create(conexion, checkfirst=True)
+
+
+def _filas_trigramas(canciones):
+    """Filas del índice de trigramas de las canciones generadas."""
+    for cancion in canciones:
+        for trigrama in set().union(*(trigramas(cancion[c]) for c in COLUMNAS_TRIGRAMAS)):
+            yield {"trigrama": trigrama, "id_cancion": cancion["id"]}
+
+
+def sembrar(engine, canciones, usuarios, favoritos, exponente=1.0, semilla=42, tamano_lote=10000):
+    """
+    Genera e inserta datos sintéticos a continuación de los existentes.
+
+    Los índices secundarios se reconstruyen al final de la carga, los contadores
+    de favoritos se reconcilian en una sola sentencia y el índice de trigramas
+    se llena regenerando las mismas canciones a partir de la semilla.
+
+    Args:
+        engine: Motor SQLAlchemy
+        canciones (int): Número de canciones
+        usuarios (int): Número de usuarios
+        favoritos (int): Número aproximado de favoritos
+        exponente (float): Exponente de la ley de Zipf de la popularidad
+        semilla (int): Semilla de la generación
+        tamano_lote (int): Filas por lote
+
+    Returns:
+        dict: Filas insertadas por tabla
+    """
+    with engine.connect() as conexion:
+        primera_cancion = (conexion.execute(select(func.max(Cancion.id))).scalar() or 0) + 1
+        primer_usuario = (conexion.execute(select(func.max(Usuario.id))).scalar() or 0) + 1
+
+    ids_cancion = range(primera_cancion, primera_cancion + canciones)
+    ids_usuario = range(primer_usuario, primer_usuario + usuarios)
+    with _sin_indices_secundarios(engine, Cancion, Usuario, Favorito, CancionTrigrama):
+        insertadas = {
+            "canciones": insertar_por_lotes(
+                engine, Cancion, generar_canciones(semilla, primera_cancion, canciones), tamano_lote
+            ),
+            "usuarios": insertar_por_lotes(
+                engine, Usuario, generar_usuarios(semilla, primer_usuario, usuarios), tamano_lote
+            ),
+            "favoritos": insertar_por_lotes(
+                engine, Favorito,
+                generar_favoritos(semilla, ids_usuario, ids_cancion, favoritos, exponente),
+                tamano_lote
+            )
+        }
+        insertar_por_lotes(
+            engine, CancionTrigrama,
+            _filas_trigramas(generar_canciones(semilla, primera_cancion, canciones)),
+            tamano_lote * 10
+        )
+    with engine.begin() as conexion:
+        reconciliar_favoritos_count(conexion)
+        if conexion.dialect.name == "postgresql":
+            # Los IDs se insertaron explícitamente: se avanzan las secuencias
+            for tabla in ("cancion", "usuario"):
+                conexion.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {tabla}))"
+                )
+    return insertadas
@@ -0,0 +1,179 @@
+"""
+Módulo de búsqueda difusa de canciones por trigramas.
+Mantiene en la tabla `cancion_trigrama` un índice invertido de los trigramas
+de título, artista y álbum, sincronizado en la misma transacción que las
+escrituras de `Cancion`. La búsqueda obtiene candidatos por trigramas comunes
+y los ordena por similitud, de modo que tolera errores como "Metalica".
+"""
+import math
+
+from sqlalchemy import event, func, inspect, select
+
+from .autocompletado import normalizar
+from .models import Cancion, CancionTrigrama
+
+# Columnas de `cancion` indexadas por trigramas
+COLUMNAS_TRIGRAMAS = ("titulo", "artista", "album")
+
+
+def _trigramas_palabra(palabra):
+    """Trigramas de una palabra normalizada, rellenada con dos espacios delante y uno detrás."""
+    relleno = f"  {palabra} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def trigramas(texto):
+    """
+    Obtiene los trigramas de un texto normalizado, al estilo de pg_trgm.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        set: Trigramas del texto
+    """
+    return set().union(*(_trigramas_palabra(p) for p in normalizar(texto).split()))
+
+
+def similitud(texto, campo, buscados=None):
+    """
+    Similitud entre un texto buscado y el valor de un campo: el máximo del
+    coeficiente de Jaccard de sus trigramas con el campo completo y con cada
+    secuencia de tantas palabras del campo como tiene el texto.
+
+    Args:
+        texto (str): Texto buscado
+        campo (str): Valor del campo de la canción
+        buscados (set): Trigramas del texto, si ya se calcularon
+
+    Returns:
+        float: Similitud entre 0 y 1
+    """
+    if buscados is None:
+        buscados = trigramas(texto)
+    por_palabra = [_trigramas_palabra(p) for p in normalizar(campo).split()]
+    if not buscados or not por_palabra:
+        return 0.0
+    n = len(normalizar(texto).split())
+    ventanas = [set().union(*por_palabra)]
+    if len(por_palabra) > n:
+        ventanas.extend(set().union(*por_palabra[i:i + n]) for i in range(len(por_palabra) - n + 1))
+    return max(len(buscados & propios) / len(buscados | propios) for propios in ventanas)
+
+
+def indexar(conexion, canciones, nuevas=False):
+    """
+    Reemplaza los trigramas de las canciones indicadas.
+
+    Args:
+        conexion: Conexión o sesión SQLAlchemy (se usa su transacción)
+        canciones: Iterable de (id, titulo, artista, album)
+        nuevas (bool): Si las canciones aún no están indexadas (evita borrar sus trigramas)
+    """
+    canciones = list(canciones)
+    if not canciones:
+        return
+    tabla = CancionTrigrama.__table__
+    if not nuevas:
+        conexion.execute(tabla.delete().where(tabla.c.id_cancion.in_([c[0] for c in canciones])))
+    filas = [
+        {"trigrama": trigrama, "id_cancion": id}
+        for id, *valores in canciones
+        for trigrama in set().union(*(trigramas(v) for v in valores))
+    ]
+    if filas:
+        conexion.execute(tabla.insert(), filas)
+
+
+def reindexar(conexion, tamano_lote=1000):
+    """
+    Reconstruye el índice de trigramas de todas las canciones, por lotes de IDs.
+
+    Args:
+        conexion: Conexión SQLAlchemy
+        tamano_lote (int): Canciones por lote
+
+    Returns:
+        int: Número de canciones indexadas
+    """
+    conexion.execute(CancionTrigrama.__table__.delete())
+    columnas = [Cancion.id] + [getattr(Cancion, c) for c in COLUMNAS_TRIGRAMAS]
+    total, ultimo = 0, 0
+    while True:
+        lote = conexion.execute(
+            select(*columnas).where(Cancion.id > ultimo).order_by(Cancion.id).limit(tamano_lote)
+        ).all()
+        if not lote:
+            return total
+        indexar(conexion, lote, nuevas=True)
+        total += len(lote)
+        ultimo = lote[-1][0]
+
+
+def buscar_difusa(sesion, texto, limite, umbral, maximo_candidatos, genero=None):
+    """
+    Busca canciones cuyo título, artista o álbum se parece al texto.
+
+    Los candidatos se obtienen del índice invertido con una sola consulta
+    agrupada, exigiendo los trigramas comunes mínimos para poder alcanzar el
+    umbral; después se calcula la similitud exacta de los mejores candidatos.
+    El género se filtra ya al elegir los candidatos, de modo que el límite se
+    aplica solo a canciones del género pedido.
+
+    Args:
+        sesion: Sesión SQLAlchemy
+        texto (str): Texto buscado
+        limite (int): Número máximo de resultados
+        umbral (float): Similitud mínima (0 a 1)
+        maximo_candidatos (int): Candidatos evaluados como máximo
+        genero (str): Género exacto de las canciones, si se indica
+
+    Returns:
+        list: Tuplas (id, similitud) ordenadas de mayor a menor similitud
+    """
+    buscados = trigramas(texto)
+    if not buscados:
+        return []
+    comunes = func.count().label("comunes")
+    candidatos = (
+        select(CancionTrigrama.id_cancion)
+        .where(CancionTrigrama.trigrama.in_(buscados))
+        .group_by(CancionTrigrama.id_cancion)
+        .having(comunes >= max(1, math.ceil(umbral * len(buscados))))
+        .order_by(comunes.desc(), CancionTrigrama.id_cancion)
+        .limit(maximo_candidatos)
+    )
+    if genero:
+        candidatos = candidatos.join(Cancion, Cancion.id == CancionTrigrama.id_cancion).where(Cancion.genero == genero)
+    candidatos = candidatos.subquery()
+    filas = sesion.execute(
+        select(Cancion.id, *(getattr(Cancion, c) for c in COLUMNAS_TRIGRAMAS))
+        .join(candidatos, candidatos.c.id_cancion == Cancion.id)
+    ).all()
+
+    puntuadas = []
+    for id, *valores in filas:
+        puntaje = max(similitud(texto, v, buscados) for v in valores)
+        if puntaje >= umbral:
+            puntuadas.append((id, puntaje))
+    puntuadas.sort(key=lambda p: (-p[1], p[0]))
+    return puntuadas[:limite]
+
+
+# Sincronización del índice en la misma transacción que las escrituras del ORM
+@event.listens_for(Cancion, "after_insert")
+def _indexar_cancion(mapper, connection, target):
+    indexar(connection, [(target.id, *(getattr(target, c) for c in COLUMNAS_TRIGRAMAS))], nuevas=True)
+
+
+@event.listens_for(Cancion, "after_update")
+def _reindexar_cancion(mapper, connection, target):
+    estado = inspect(target)
+    if any(estado.attrs[c].history.has_changes() for c in COLUMNAS_TRIGRAMAS):
+        indexar(connection, [(target.id, *(getattr(target, c) for c in COLUMNAS_TRIGRAMAS))])
+
+
+@event.listens_for(Cancion, "after_delete")
+def _desindexar_cancion(mapper, connection, target):
+    tabla = CancionTrigrama.__table__
+    connection.execute(tabla.delete().where(tabla.c.id_cancion == target.id))
@@ -4,6 +4,8 @@ Contiene pruebas unitarias y de integración para verificar el funcionamiento co
 """
 import unittest
 import json
+from contextlib import contextmanager
+from sqlalchemy import event
 from musica_api import create_app
 from musica_api.extensions import db
 from musica_api.models import Usuario, Cancion, Favorito
@@ -14,7 +16,7 @@ class TestAPI(unittest.TestCase):
     def setUp(self):
         """Prepara el entorno de prueba antes de cada test."""
         # Configurar la aplicación para pruebas
-        self.app = create_app()
+        self.app = create_app('testing')
         self.app.config['TESTING'] = True
         self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         
@@ -32,6 +34,22 @@ class TestAPI(unittest.TestCase):
             db.session.remove()
             db.drop_all()
     
+    @contextmanager
+    def _capturar_sentencias(self):
+        """Recoge en una lista las sentencias SQL ejecutadas dentro del bloque."""
+        sentencias = []
+        with self.app.app_context():
+            engine = db.engine
+        
+        def registrar(conn, cursor, statement, *args):
+            sentencias.append(statement)
+        
+        event.listen(engine, "before_cursor_execute", registrar)
+        try:
+            yield sentencias
+        finally:
+            event.remove(engine, "before_cursor_execute", registrar)
+    
     def _crear_datos_prueba(self):
         """Crea datos de prueba en la base de datos."""
         # Crear usuarios
@@ -73,7 +91,8 @@ class TestUsuarios(TestAPI):
         response = self.client.get('/api/usuarios')
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data)
-        self.assertEqual(len(data), 2)
+        self.assertEqual(len(data['items']), 2)
+        self.assertIsNone(data['next'])
     
     def test_obtener_usuario(self):
         """Prueba el endpoint para obtener un usuario por ID."""
@@ -110,15 +129,78 @@ class TestCanciones(TestAPI):
         response = self.client.get('/api/canciones')
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data)
-        self.assertEqual(len(data), 2)
+        self.assertEqual(len(data['items']), 2)
     
     def test_buscar_canciones(self):
         """Prueba el endpoint para buscar canciones."""
         response = self.client.get('/api/canciones/buscar?genero=Rock')
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data)
-        self.assertEqual(len(data), 1)
-        self.assertEqual(data[0]['titulo'], "Canción Test 1")
+        self.assertEqual(len(data['items']), 1)
+        self.assertEqual(data['items'][0]['titulo'], "Canción Test 1")
+
+class TestBusquedaTextoCompleto(TestAPI):
+    """Pruebas para la búsqueda de texto completo de canciones."""
+    
+    def _buscar(self, consulta):
+        response = self.client.get(f'/api/canciones/buscar?{consulta}')
+        self.assertEqual(response.status_code, 200)
+        return [c['id'] for c in json.loads(response.data)['items']]
+    
+    def test_buscar_por_prefijo_sin_acentos(self):
+        """Prueba que la búsqueda ignora acentos y acepta prefijos de palabras."""
+        self.assertEqual(self._buscar('q=cancion'), [1, 2])
+        self.assertEqual(self._buscar('titulo=canc%20test%202'), [2])
+        self.assertEqual(self._buscar('artista=artista&genero=Rock'), [1])
+    
+    def test_indice_sincronizado(self):
+        """Prueba que el índice refleja actualizaciones y eliminaciones de canciones."""
+        self.client.put(
+            '/api/canciones/1',
+            data=json.dumps({"titulo": "Nothing Else Matters"}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._buscar('titulo=nothing'), [1])
+        self.assertEqual(self._buscar('titulo=test'), [2])
+        
+        self.client.delete('/api/canciones/2')
+        self.assertEqual(self._buscar('titulo=test'), [])
+    
+    def test_orden_por_relevancia(self):
+        """Prueba el modo de búsqueda ordenado por bm25 y su paginación."""
+        with self.app.app_context():
+            db.session.add(Cancion(titulo="Rock Rock Rock", artista="Rock", genero="Rock"))
+            db.session.commit()
+        
+        response = self.client.get('/api/canciones/buscar?q=rock&orden=relevancia&limit=1')
+        data = json.loads(response.data)
+        self.assertEqual(data['items'][0]['id'], 3)
+        
+        response = self.client.get(f"/api/canciones/buscar?q=rock&orden=relevancia&limit=1&after={data['next']}")
+        data = json.loads(response.data)
+        self.assertEqual([c['id'] for c in data['items']], [1])
+        self.assertIsNone(data['next'])
+    
+    def test_cursor_relevancia_invalido(self):
+        """Prueba que un cursor de relevancia con un puntaje no numérico devuelve 400."""
+        from musica_api.paginacion import codificar_cursor
+        for valores in ([{"a": 1}, 1], ["rock", 1], [-1.5, "x"]):
+            response = self.client.get(
+                f'/api/canciones/buscar?q=rock&orden=relevancia&after={codificar_cursor(valores)}'
+            )
+            self.assertEqual(response.status_code, 400, valores)
+    
+    def test_filtro_sin_palabras(self):
+        """Prueba que un filtro con solo signos de puntuación no devuelve canciones."""
+        self.assertEqual(self._buscar('titulo=!!!'), [])
+        self.assertEqual(self._buscar('q=%22*%22&genero=Rock'), [])
+        self.assertEqual(self._buscar('artista=...&orden=relevancia'), [])
+    
+    def test_busqueda_sin_fts(self):
+        """Prueba el camino alternativo con `ilike` cuando FTS5 está deshabilitado."""
+        self.app.config['BUSQUEDA_FTS'] = False
+        self.assertEqual(self._buscar('titulo=ón%20Test%202'), [2])
+        self.assertEqual(self._buscar('q=album%20test&orden=relevancia'), [1, 2])
 
 class TestFavoritos(TestAPI):
     """Pruebas para los endpoints de favoritos."""
@@ -131,6 +213,1170 @@ class TestFavoritos(TestAPI):
         self.assertEqual(len(data['canciones_favoritas']), 1)
         self.assertEqual(data['canciones_favoritas'][0]['titulo'], "Canción Test 1")
 
+class TestPaginacion(TestAPI):
+    """Pruebas para la paginación por cursor de los listados."""
+    
+    def test_recorrer_paginas(self):
+        """Prueba que el cursor 'next' recorre todas las canciones sin repetir."""
+        with self.app.app_context():
+            db.session.add_all([
+                Cancion(titulo=f"Extra {i}", artista="Artista Extra") for i in range(3)
+            ])
+            db.session.commit()
+        
+        ids = []
+        url = '/api/canciones?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertLessEqual(len(data['items']), 2)
+            ids.extend(c['id'] for c in data['items'])
+            if data['next']:
+                self.assertIn('rel="next"', response.headers['Link'])
+                url = f"/api/canciones?limit=2&after={data['next']}"
+            else:
+                self.assertNotIn('Link', response.headers)
+                url = None
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+    
+    def test_cursor_invalido(self):
+        """Prueba que un cursor o límite inválido devuelve 400."""
+        self.assertEqual(self.client.get('/api/favoritos?after=no-valido').status_code, 400)
+        self.assertEqual(self.client.get('/api/usuarios?limit=0').status_code, 400)
+    
+    def test_cursor_manipulado(self):
+        """Prueba que un cursor con valores fuera de rango o no escalares devuelve 400."""
+        from musica_api.paginacion import codificar_cursor
+        cursores = [
+            'W0luZmluaXR5XQ',
+            codificar_cursor([float('inf')]),
+            codificar_cursor([{"a": 1}]),
+            codificar_cursor([[1]]),
+            codificar_cursor([True])
+        ]
+        for cursor in cursores:
+            self.assertEqual(self.client.get(f'/api/canciones?after={cursor}').status_code, 400, cursor)
+
+class TestFavoritosUsuario(TestAPI):
+    """Pruebas para el listado paginado de favoritos de un usuario."""
+    
+    def _marcar(self, id_usuario, id_cancion, fecha):
+        with self.app.app_context():
+            db.session.add(Favorito(id_usuario=id_usuario, id_cancion=id_cancion, fecha_marcado=fecha))
+            db.session.commit()
+    
+    def test_orden_y_paginacion(self):
+        """Prueba el orden por fecha de marcado y el recorrido por cursor."""
+        from datetime import datetime
+        with self.app.app_context():
+            db.session.add(Cancion(titulo="Canción Test 3", artista="Artista Test 3"))
+            db.session.commit()
+        self._marcar(2, 1, datetime(2024, 1, 1))
+        self._marcar(2, 2, datetime(2024, 3, 1))
+        self._marcar(2, 3, datetime(2024, 2, 1))
+        
+        response = self.client.get('/api/usuarios/2/favoritos?limit=2')
+        data = json.loads(response.data)
+        self.assertEqual(data['usuario']['nombre'], "Usuario Test 2")
+        self.assertEqual([c['id'] for c in data['canciones_favoritas']], [2, 3])
+        self.assertIn('Link', response.headers)
+        
+        response = self.client.get(f"/api/usuarios/2/favoritos?limit=2&after={data['next']}")
+        data = json.loads(response.data)
+        self.assertEqual([c['id'] for c in data['canciones_favoritas']], [1])
+        self.assertEqual(data['usuario']['id'], 2)
+        self.assertIsNone(data['next'])
+        
+        response = self.client.get('/api/usuarios/2/favoritos?orden=asc')
+        data = json.loads(response.data)
+        self.assertEqual([c['id'] for c in data['canciones_favoritas']], [1, 3, 2])
+    
+    def test_usuario_sin_favoritos_e_inexistente(self):
+        """Prueba un usuario sin favoritos y un usuario inexistente."""
+        response = self.client.get('/api/usuarios/2/favoritos')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['canciones_favoritas'], [])
+        self.assertEqual(self.client.get('/api/usuarios/99/favoritos').status_code, 404)
+
+class TestCargaFavoritos(TestAPI):
+    """Pruebas de la carga ansiosa de relaciones al listar favoritos."""
+    
+    def _contar_sentencias(self, url):
+        """Cuenta las sentencias SQL ejecutadas al atender una petición."""
+        with self._capturar_sentencias() as sentencias:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(sentencias)
+    
+    def _crear_favoritos(self, cantidad):
+        with self.app.app_context():
+            canciones = [Cancion(titulo=f"Extra {i}", artista="Extra") for i in range(cantidad)]
+            db.session.add_all(canciones)
+            db.session.flush()
+            db.session.add_all([Favorito(id_usuario=2, id_cancion=c.id) for c in canciones])
+            db.session.commit()
+    
+    def test_sentencias_constantes(self):
+        """Prueba que el número de sentencias no depende del número de favoritos."""
+        for estrategia in ("joined", "selectin"):
+            self.app.config['FAVORITOS_ESTRATEGIA_CARGA'] = estrategia
+            pocas = self._contar_sentencias('/api/favoritos')
+            self._crear_favoritos(5)
+            muchas = self._contar_sentencias('/api/favoritos')
+            self.assertEqual(pocas, muchas, estrategia)
+        
+        data = json.loads(self.client.get('/api/favoritos').data)
+        self.assertEqual(data['items'][0]['usuario']['nombre'], "Usuario Test 1")
+        self.assertEqual(data['items'][-1]['cancion']['titulo'], "Extra 4")
+    
+    def test_obtener_favorito(self):
+        """Prueba que un favorito individual incluye usuario y canción anidados."""
+        data = json.loads(self.client.get('/api/favoritos/1').data)
+        self.assertEqual(data['usuario']['id'], 1)
+        self.assertEqual(data['cancion']['titulo'], "Canción Test 1")
+
+class TestImportacionCanciones(TestAPI):
+    """Pruebas para la importación masiva de canciones."""
+    
+    def test_importar_arreglo_json(self):
+        """Prueba la importación de un arreglo JSON con filas inválidas."""
+        self.app.config['IMPORTACION_TAMANO_LOTE'] = 2
+        filas = [
+            {"titulo": "Lote 1", "artista": "Artista Lote", "año": 1999},
+            {"titulo": "Lote 2"},
+            {"titulo": "Lote 3", "artista": "Artista Lote", "duracion": "largo"},
+            {"titulo": "Lote 4", "artista": "Artista Lote", "genero": "Jazz"},
+            {"titulo": "Lote 5", "artista": "Artista Lote"}
+        ]
+        response = self.client.post(
+            '/api/canciones/lote',
+            data=json.dumps(filas),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['procesadas'], 5)
+        self.assertEqual(data['insertadas'], 3)
+        self.assertEqual([e['fila'] for e in data['errores']], [2, 3])
+        
+        with self.app.app_context():
+            self.assertEqual(Cancion.query.filter_by(artista="Artista Lote").count(), 3)
+            self.assertIsNotNone(Cancion.query.filter_by(titulo="Lote 4").one().fecha_creacion)
+    
+    def test_importar_ndjson(self):
+        """Prueba la importación de un cuerpo NDJSON con una línea ilegible."""
+        cuerpo = '{"titulo": "Nd 1", "artista": "Nd"}\n\nno es json\n{"titulo": "Nd 2", "artista": "Nd"}\n'
+        response = self.client.post(
+            '/api/canciones/lote',
+            data=cuerpo,
+            content_type='application/x-ndjson'
+        )
+        data = json.loads(response.data)
+        self.assertEqual(data['insertadas'], 2)
+        self.assertEqual(data['errores'][0]['fila'], 2)
+        
+        # Las canciones importadas quedan indexadas para la búsqueda
+        response = self.client.get('/api/canciones/buscar?artista=nd')
+        self.assertEqual(len(json.loads(response.data)['items']), 2)
+    
+    def test_cuerpo_invalido(self):
+        """Prueba que un cuerpo que no es un arreglo devuelve 400."""
+        response = self.client.post(
+            '/api/canciones/lote',
+            data=json.dumps({"titulo": "Sola"}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+class TestFavoritosLote(TestAPI):
+    """Pruebas para marcar y desmarcar favoritos en lote."""
+    
+    def _lote(self, id_usuario, cuerpo):
+        return self.client.post(
+            f'/api/usuarios/{id_usuario}/favoritos/lote',
+            data=json.dumps(cuerpo),
+            content_type='application/json'
+        )
+    
+    def test_agregar_y_eliminar(self):
+        """Prueba el informe de cambios aplicados en lote."""
+        response = self._lote(1, {"agregar": [1, 2, 99, 2], "eliminar": []})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['agregadas'], [2])
+        self.assertEqual(data['ya_presentes'], [1])
+        self.assertEqual(data['inexistentes'], [99])
+        
+        data = json.loads(self._lote(1, {"eliminar": [1, 2, 50]}).data)
+        self.assertEqual(data['eliminadas'], [1, 2])
+        self.assertEqual(data['no_marcadas'], [50])
+        
+        with self.app.app_context():
+            self.assertEqual(Favorito.query.filter_by(id_usuario=1).count(), 0)
+    
+    def test_lote_invalido(self):
+        """Prueba las validaciones del cuerpo y del usuario."""
+        self.assertEqual(self._lote(1, {"agregar": [1], "eliminar": [1]}).status_code, 400)
+        self.assertEqual(self._lote(1, {"agregar": ["1"]}).status_code, 400)
+        self.assertEqual(self._lote(99, {"agregar": [1]}).status_code, 404)
+    
+    def test_cuerpo_no_objeto(self):
+        """Prueba que un arreglo o un escalar JSON se rechazan con 400."""
+        for cuerpo in ([1, 2], 5, "agregar"):
+            response = self._lote(1, cuerpo)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("objeto JSON", json.loads(response.data)['message'])
+
+class TestMarcarFavorito(TestAPI):
+    """Pruebas para la creación idempotente de favoritos."""
+    
+    def _marcar(self, id_usuario, id_cancion):
+        return self.client.post(
+            '/api/favoritos',
+            data=json.dumps({"id_usuario": id_usuario, "id_cancion": id_cancion}),
+            content_type='application/json'
+        )
+    
+    def test_marcar_idempotente(self):
+        """Prueba que repetir la petición no duplica ni falla."""
+        response = self._marcar(2, 1)
+        self.assertEqual(response.status_code, 201)
+        primero = json.loads(response.data)
+        self.assertEqual(primero['cancion']['titulo'], "Canción Test 1")
+        
+        response = self._marcar(2, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['id'], primero['id'])
+        
+        self.assertEqual(self.client.post('/api/usuarios/2/favoritos/2').status_code, 201)
+        self.assertEqual(self.client.post('/api/usuarios/2/favoritos/2').status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(Favorito.query.filter_by(id_usuario=2).count(), 2)
+    
+    def test_marcar_inexistentes(self):
+        """Prueba que las claves foráneas rechazan usuarios o canciones inexistentes."""
+        response = self._marcar(99, 1)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("Usuario", json.loads(response.data)['message'])
+        response = self.client.post('/api/usuarios/1/favoritos/99')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("Canción", json.loads(response.data)['message'])
+
+class TestExportacion(TestAPI):
+    """Pruebas para la exportación en flujo."""
+    
+    def test_exportar_canciones_csv(self):
+        """Prueba la exportación CSV con filtros de búsqueda."""
+        import csv
+        import io
+        response = self.client.get('/api/canciones/exportar?genero=Pop')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        filas = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(filas[0][:3], ['id', 'titulo', 'artista'])
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][1], "Canción Test 2")
+    
+    def test_exportar_favoritos_ndjson_gzip(self):
+        """Prueba la exportación NDJSON comprimida de favoritos."""
+        import gzip
+        response = self.client.get('/api/favoritos/exportar?formato=ndjson&gzip=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.ndjson.gz', response.headers['Content-Disposition'])
+        lineas = gzip.decompress(response.data).decode('utf-8').splitlines()
+        self.assertEqual(len(lineas), 1)
+        self.assertEqual(json.loads(lineas[0])['id_cancion'], 1)
+    
+    def test_formato_invalido(self):
+        """Prueba que un formato desconocido devuelve 400."""
+        self.assertEqual(self.client.get('/api/favoritos/exportar?formato=xml').status_code, 400)
+
+    def test_exportacion_devuelve_la_conexion(self):
+        """Prueba que el flujo devuelve su conexión al pool al terminar."""
+        import tempfile
+        with tempfile.TemporaryDirectory() as directorio:
+            app = create_app('testing', {
+                'SQLALCHEMY_DATABASE_URI': f"sqlite:///{directorio}/exportacion.db"
+            })
+            with app.app_context():
+                db.create_all()
+                engine = db.engine
+            cliente = app.test_client()
+            for _ in range(3):
+                response = cliente.get('/api/canciones/exportar?formato=ndjson')
+                self.assertEqual(response.status_code, 200)
+                response.get_data()
+            self.assertEqual(engine.pool.checkedout(), 0)
+            engine.dispose()
+
+class TestPeticionesCondicionales(TestAPI):
+    """Pruebas para ETag, If-None-Match e If-Match."""
+    
+    def test_if_none_match(self):
+        """Prueba que una lectura repetida con el ETag vigente devuelve 304."""
+        for url in ('/api/canciones/1', '/api/usuarios/1'):
+            response = self.client.get(url)
+            etag = response.headers['ETag']
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+    
+    def test_etag_cambia_al_actualizar(self):
+        """Prueba que actualizar la canción invalida el ETag anterior."""
+        etag = self.client.get('/api/canciones/1').headers['ETag']
+        response = self.client.put(
+            '/api/canciones/1',
+            data=json.dumps({"genero": "Metal"}),
+            content_type='application/json',
+            headers={'If-Match': etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        
+        response = self.client.get('/api/canciones/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['genero'], "Metal")
+    
+    def test_if_match_obsoleto(self):
+        """Prueba que una escritura con un ETag obsoleto devuelve 412."""
+        etag = self.client.get('/api/usuarios/1').headers['ETag']
+        self.client.put(
+            '/api/usuarios/1',
+            data=json.dumps({"nombre": "Primer cambio"}),
+            content_type='application/json'
+        )
+        response = self.client.put(
+            '/api/usuarios/1',
+            data=json.dumps({"nombre": "Segundo cambio"}),
+            content_type='application/json',
+            headers={'If-Match': etag}
+        )
+        self.assertEqual(response.status_code, 412)
+        response = self.client.get('/api/usuarios/1')
+        self.assertEqual(json.loads(response.data)['nombre'], "Primer cambio")
+
+class TestCacheEntidades(TestAPI):
+    """Pruebas para la caché en proceso de canciones y usuarios."""
+    
+    def _cache(self):
+        return self.app.extensions['cache_entidades']
+    
+    def test_aciertos_e_invalidacion(self):
+        """Prueba que las lecturas repetidas aciertan y que las escrituras invalidan."""
+        self.client.get('/api/canciones/1')
+        self.client.get('/api/canciones/1')
+        estadisticas = self._cache().estadisticas()
+        self.assertEqual(estadisticas['fallos'], 1)
+        self.assertEqual(estadisticas['aciertos'], 1)
+        
+        self.client.put(
+            '/api/canciones/1',
+            data=json.dumps({"titulo": "Título Nuevo"}),
+            content_type='application/json'
+        )
+        data = json.loads(self.client.get('/api/canciones/1').data)
+        self.assertEqual(data['titulo'], "Título Nuevo")
+        
+        self.client.delete('/api/canciones/1')
+        self.assertEqual(self.client.get('/api/canciones/1').status_code, 404)
+    
+    def test_lectura_concurrente_obsoleta(self):
+        """Prueba que una lectura anterior al commit de una escritura no vuelve a la caché."""
+        from musica_api.cache import clave_entidad, _valores
+        with self.app.app_context():
+            lectura = db.session.get(Cancion, 1)
+            valores_anteriores = _valores(lectura)
+            db.session.remove()
+        self.client.put(
+            '/api/canciones/1',
+            data=json.dumps({"titulo": "Título Nuevo"}),
+            content_type='application/json'
+        )
+        # La lectura lenta termina después del commit e intenta guardar la versión anterior
+        self._cache().guardar(clave_entidad(Cancion, 1), valores_anteriores, valores_anteriores['version'])
+        data = json.loads(self.client.get('/api/canciones/1').data)
+        self.assertEqual(data['titulo'], "Título Nuevo")
+        
+        self.client.delete('/api/canciones/2')
+        self._cache().guardar(clave_entidad(Cancion, 2), {'id': 2}, 1)
+        self.assertEqual(self.client.get('/api/canciones/2').status_code, 404)
+    
+    def test_desalojo_lru(self):
+        """Prueba el desalojo de la entrada menos usada."""
+        from musica_api.cache import CacheLRU
+        cache = CacheLRU(tamano_maximo=2, ttl=0)
+        cache.guardar('a', 1)
+        cache.guardar('b', 2)
+        cache.obtener('a')
+        cache.guardar('c', 3)
+        self.assertIsNone(cache.obtener('b'))
+        self.assertEqual(cache.obtener('a'), 1)
+        self.assertEqual(cache.estadisticas()['desalojos'], 1)
+    
+    def test_cache_deshabilitada(self):
+        """Prueba que con CACHE_ENTIDADES=False no se crea la caché."""
+        from unittest import mock
+        from musica_api.config import TestingConfig
+        with mock.patch.object(TestingConfig, 'CACHE_ENTIDADES', False):
+            app = create_app('testing')
+        self.assertNotIn('cache_entidades', app.extensions)
+        with app.app_context():
+            db.session.add(Cancion(titulo="Sin caché", artista="Artista"))
+            db.session.commit()
+        response = app.test_client().get('/api/canciones/1')
+        self.assertEqual(json.loads(response.data)['titulo'], "Sin caché")
+
+class TestConfiguracionMotor(TestAPI):
+    """Pruebas para el perfil del motor de base de datos."""
+    
+    def test_pragmas_aplicados(self):
+        """Prueba que los PRAGMA configurados se aplican a las conexiones."""
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(db.text("PRAGMA foreign_keys")).scalar(), 1)
+            self.assertEqual(db.session.execute(db.text("PRAGMA busy_timeout")).scalar(), 5000)
+    
+    def test_produccion_en_wal(self):
+        """Prueba el perfil de producción sobre una base de datos en archivo."""
+        import os
+        import tempfile
+        from unittest import mock
+        from musica_api.config import ProductionConfig
+        with tempfile.TemporaryDirectory() as directorio:
+            uri = 'sqlite:///' + os.path.join(directorio, 'musica.db')
+            with mock.patch.object(ProductionConfig, 'SQLALCHEMY_DATABASE_URI', uri):
+                app = create_app('production')
+            with app.app_context():
+                self.assertEqual(db.session.execute(db.text("PRAGMA journal_mode")).scalar(), 'wal')
+                self.assertEqual(db.session.execute(db.text("PRAGMA synchronous")).scalar(), 1)
+                db.session.remove()
+                db.engine.dispose()
+    
+    def test_opciones_servidor(self):
+        """Prueba que los motores de servidor reciben opciones de pool."""
+        from musica_api.config import opciones_motor
+        opciones = opciones_motor('postgresql://usuario@localhost/musica')
+        self.assertTrue(opciones['pool_pre_ping'])
+        self.assertIn('pool_size', opciones)
+        self.assertEqual(opciones_motor('sqlite:///musica.db'), {})
+    
+    def test_opciones_desde_uri_final(self):
+        """Prueba que las opciones del motor se calculan con la URI final salvo si se indican."""
+        from unittest import mock
+        import musica_api
+        from musica_api.config import opciones_motor
+        with mock.patch.object(musica_api, 'opciones_motor', wraps=opciones_motor) as calcular:
+            app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+            calcular.assert_called_once_with('sqlite://')
+            self.assertEqual(app.config['SQLALCHEMY_ENGINE_OPTIONS'], {})
+            
+            calcular.reset_mock()
+            app = create_app('testing', {'SQLALCHEMY_ENGINE_OPTIONS': {'echo': False}})
+            calcular.assert_not_called()
+            self.assertEqual(app.config['SQLALCHEMY_ENGINE_OPTIONS'], {'echo': False})
+
+class TestMigraciones(TestAPI):
+    """Pruebas para las migraciones del esquema."""
+    
+    def test_migrar_base_existente(self):
+        """Prueba que una base de datos con el esquema original se actualiza."""
+        from sqlalchemy import create_engine, inspect
+        from musica_api.migraciones import MIGRACIONES, migrar
+        engine = create_engine('sqlite://')
+        with engine.begin() as conexion:
+            conexion.exec_driver_sql(
+                "CREATE TABLE usuario (id INTEGER PRIMARY KEY, nombre VARCHAR(100) NOT NULL, "
+                "correo VARCHAR(100) NOT NULL UNIQUE, fecha_registro DATETIME)"
+            )
+            conexion.exec_driver_sql(
+                "CREATE TABLE cancion (id INTEGER PRIMARY KEY, titulo VARCHAR(200) NOT NULL, "
+                "artista VARCHAR(100) NOT NULL, album VARCHAR(200), duracion INTEGER, "
+                "\"año\" INTEGER, genero VARCHAR(50), fecha_creacion DATETIME)"
+            )
+            conexion.exec_driver_sql(
+                "CREATE TABLE favorito (id INTEGER PRIMARY KEY, "
+                "id_usuario INTEGER NOT NULL REFERENCES usuario (id), "
+                "id_cancion INTEGER NOT NULL REFERENCES cancion (id), fecha_marcado DATETIME, "
+                "CONSTRAINT uq_usuario_cancion UNIQUE (id_usuario, id_cancion))"
+            )
+            conexion.exec_driver_sql("INSERT INTO cancion (titulo, artista) VALUES ('Vieja', 'Artista')")
+            conexion.exec_driver_sql("INSERT INTO usuario (nombre, correo) VALUES ('Ana', 'ana@test.com')")
+            conexion.exec_driver_sql("INSERT INTO favorito (id_usuario, id_cancion) VALUES (1, 1)")
+        
+        self.assertEqual(migrar(engine), [v for v, _, _ in MIGRACIONES])
+        self.assertEqual(migrar(engine), [])
+        
+        inspector = inspect(engine)
+        self.assertIn('version', {c['name'] for c in inspector.get_columns('cancion')})
+        self.assertIn('ix_favorito_usuario_fecha', {i['name'] for i in inspector.get_indexes('favorito')})
+        with engine.connect() as conexion:
+            self.assertEqual(conexion.exec_driver_sql("SELECT version FROM cancion").scalar(), 1)
+            self.assertGreater(conexion.exec_driver_sql("SELECT count(*) FROM cancion_trigrama").scalar(), 0)
+            self.assertEqual(conexion.exec_driver_sql("SELECT favoritos_count FROM cancion").scalar(), 1)
+            self.assertEqual(conexion.exec_driver_sql("SELECT count(*) FROM favorito").scalar(), 1)
+        self.assertEqual(
+            {fk['options'].get('ondelete') for fk in inspector.get_foreign_keys('favorito')}, {'CASCADE'}
+        )
+    
+    def test_comando_migrar(self):
+        """Prueba el comando `flask migrar`."""
+        resultado = self.app.test_cli_runner().invoke(args=['migrar', '--estado'])
+        self.assertIn('Versión del esquema', resultado.output)
+
+class TestCancionesPopulares(TestAPI):
+    """Pruebas para el contador de favoritos y las canciones populares."""
+    
+    def _contadores(self):
+        with self.app.app_context():
+            return {c.id: c.favoritos_count for c in Cancion.query.all()}
+    
+    def test_contador_en_todas_las_rutas(self):
+        """Prueba que el contador sigue a las altas, bajas y cascadas de favoritos."""
+        self.assertEqual(self._contadores(), {1: 1, 2: 0})
+        
+        self.client.post('/api/usuarios/2/favoritos/1')
+        self.client.post('/api/usuarios/2/favoritos/1')
+        self.client.post(
+            '/api/usuarios/2/favoritos/lote',
+            data=json.dumps({"agregar": [2]}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._contadores(), {1: 2, 2: 1})
+        
+        self.client.delete('/api/usuarios/2/favoritos/1')
+        self.client.post(
+            '/api/usuarios/2/favoritos/lote',
+            data=json.dumps({"eliminar": [2, 1]}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._contadores(), {1: 1, 2: 0})
+        
+        self.client.delete('/api/usuarios/1')
+        self.assertEqual(self._contadores(), {1: 0, 2: 0})
+    
+    def test_listar_populares(self):
+        """Prueba el orden por número de favoritos y la paginación."""
+        self.client.post('/api/usuarios/2/favoritos/2')
+        self.client.post('/api/usuarios/1/favoritos/2')
+        
+        response = self.client.get('/api/canciones/populares?limit=1')
+        data = json.loads(response.data)
+        self.assertEqual(data['items'], [
+            {"id": 2, "titulo": "Canción Test 2", "artista": "Artista Test 2", "favoritos_count": 2}
+        ])
+        data = json.loads(self.client.get(f"/api/canciones/populares?limit=1&after={data['next']}").data)
+        self.assertEqual(data['items'][0]['id'], 1)
+    
+    def test_reconciliar(self):
+        """Prueba que el comando de reconciliación corrige contadores desviados."""
+        with self.app.app_context():
+            db.session.execute(db.text("UPDATE cancion SET favoritos_count = 7"))
+            db.session.commit()
+        resultado = self.app.test_cli_runner().invoke(args=['reconciliar-favoritos'])
+        self.assertIn('Canciones corregidas: 2', resultado.output)
+        self.assertEqual(self._contadores(), {1: 1, 2: 0})
+
+class TestRecomendaciones(TestAPI):
+    """Pruebas para las recomendaciones ítem-ítem."""
+    
+    def _preparar(self):
+        """Tres usuarios más y canciones 3 y 4; la 2 co-ocurre con la 1 más que la 3."""
+        with self.app.app_context():
+            db.session.add_all([
+                Usuario(nombre=f"Oyente {i}", correo=f"oyente{i}@test.com") for i in range(3)
+            ] + [
+                Cancion(titulo=f"Canción Test {i}", artista="Artista") for i in (3, 4)
+            ])
+            db.session.commit()
+        for id_usuario, canciones in {3: [1, 2], 4: [1, 2, 3], 5: [3, 4]}.items():
+            self.client.post(
+                f'/api/usuarios/{id_usuario}/favoritos/lote',
+                data=json.dumps({"agregar": canciones}),
+                content_type='application/json'
+            )
+    
+    def _recomendaciones(self, id_usuario):
+        response = self.client.get(f'/api/usuarios/{id_usuario}/recomendaciones')
+        self.assertEqual(response.status_code, 200)
+        return [c['id'] for c in json.loads(response.data)['recomendaciones']]
+    
+    def test_recomendar_desde_indice(self):
+        """Prueba las recomendaciones tras reconstruir el índice."""
+        self._preparar()
+        resultado = self.app.test_cli_runner().invoke(args=['recomendaciones', '--completo'])
+        self.assertIn('Canciones recalculadas: 4', resultado.output)
+        
+        # El usuario 1 solo tiene la canción 1: la 2 es la más similar, luego la 3
+        self.assertEqual(self._recomendaciones(1), [2, 3])
+        # El usuario 2 no tiene favoritos: se recurre a las más populares
+        self.assertEqual(self._recomendaciones(2)[0], 1)
+        self.assertEqual(self.client.get('/api/usuarios/99/recomendaciones').status_code, 404)
+    
+    def test_actualizacion_incremental(self):
+        """Prueba que solo se recalculan las canciones con favoritos modificados."""
+        self._preparar()
+        self.app.test_cli_runner().invoke(args=['recomendaciones', '--completo'])
+        self.assertNotIn(4, self._recomendaciones(1))
+        
+        self.client.post('/api/usuarios/3/favoritos/4')
+        resultado = self.app.test_cli_runner().invoke(args=['recomendaciones'])
+        self.assertIn('Canciones recalculadas: 1', resultado.output)
+        self.assertIn(4, self._recomendaciones(1))
+        
+        resultado = self.app.test_cli_runner().invoke(args=['recomendaciones'])
+        self.assertIn('Canciones recalculadas: 0', resultado.output)
+    
+    def test_actualizacion_automatica(self):
+        """Prueba que las peticiones de recomendaciones procesan la cola por lotes tras el intervalo."""
+        from musica_api.models import SimilitudPendiente
+        self._preparar()
+        self.app.test_cli_runner().invoke(args=['recomendaciones', '--completo'])
+        self.app.config['RECOMENDACIONES_TAMANO_LOTE'] = 1
+        self.client.post('/api/usuarios/3/favoritos/4')
+        self.client.post('/api/usuarios/4/favoritos/4')
+        
+        # Dentro del intervalo no se procesa la cola
+        self.app.extensions['recomendaciones']['actualizado'] = float('inf')
+        self.assertNotIn(4, self._recomendaciones(1))
+        
+        # Pasado el intervalo, cada petición procesa como máximo un lote
+        for pendientes in (1, 0):
+            self.app.extensions['recomendaciones']['actualizado'] = None
+            self._recomendaciones(1)
+            with self.app.app_context():
+                self.assertEqual(SimilitudPendiente.query.count(), pendientes)
+        self.assertIn(4, self._recomendaciones(1))
+
+class TestSerializadores(TestAPI):
+    """Pruebas de los serializadores precompilados."""
+    
+    def test_equivalencia_con_marshal(self):
+        """Prueba que el serializador compilado produce lo mismo que `marshal`."""
+        from flask_restx import marshal
+        from musica_api.api_models import (
+            cancion_pagina_model, favorito_pagina_model, favoritos_usuario_model
+        )
+        from musica_api.serializadores import compilar
+        
+        with self.app.app_context():
+            casos = [
+                (cancion_pagina_model, {"items": Cancion.query.all(), "next": "abc"}),
+                (favorito_pagina_model, {"items": Favorito.query.all(), "next": None}),
+                (cancion_pagina_model, {"items": None, "next": None}),
+                (favoritos_usuario_model, {"usuario": None, "canciones_favoritas": []}),
+            ]
+            for modelo, datos in casos:
+                self.assertEqual(compilar(modelo)(datos), marshal(datos, modelo))
+    
+    def test_respuesta_json(self):
+        """Prueba que los listados responden JSON con las cabeceras de paginación."""
+        response = self.client.get('/api/canciones?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertIn('Link', response.headers)
+        self.assertEqual(len(response.get_json()['items']), 1)
+        
+        # La documentación Swagger se sigue generando a partir de los modelos
+        spec = self.client.get('/swagger.json').get_json()
+        self.assertEqual(
+            spec['paths']['/api/canciones']['get']['responses']['200']['schema']['$ref'],
+            '#/definitions/CancionPagina'
+        )
+
+class TestProyeccionCampos(TestAPI):
+    """Pruebas del parámetro `fields` (sparse fieldsets)."""
+    
+    def _consultar(self, url):
+        """Devuelve la respuesta y las sentencias SELECT ejecutadas."""
+        with self._capturar_sentencias() as sentencias:
+            response = self.client.get(url)
+        return response, [s for s in sentencias if s.lstrip().upper().startswith("SELECT")]
+    
+    def test_listar_canciones_con_campos(self):
+        """Prueba que solo se consultan y devuelven los campos pedidos."""
+        response, sentencias = self._consultar('/api/canciones?fields=titulo,id,artista&limit=1')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(set(data['items'][0]), {'id', 'titulo', 'artista'})
+        self.assertIn('fields=titulo', response.headers['Link'])
+        self.assertNotIn('album', sentencias[-1])
+        self.assertNotIn('genero', sentencias[-1])
+    
+    def test_buscar_y_usuarios_con_campos(self):
+        """Prueba la proyección en la búsqueda y en el listado de usuarios."""
+        data = json.loads(self.client.get('/api/canciones/buscar?q=test&orden=relevancia&fields=id').data)
+        self.assertEqual([c for c in data['items']], [{'id': 1}, {'id': 2}])
+        
+        data = json.loads(self.client.get('/api/usuarios?fields=correo').data)
+        self.assertEqual(data['items'][0], {'correo': 'usuario1@test.com'})
+    
+    def test_campos_invalidos(self):
+        """Prueba que un campo desconocido responde 400."""
+        response = self.client.get('/api/canciones?fields=id,letra')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('letra', json.loads(response.data)['message'])
+        self.assertEqual(self.client.get('/api/usuarios?fields=titulo').status_code, 400)
+
+class TestObtenerPorIds(TestAPI):
+    """Pruebas de la obtención en lote con `?ids=`."""
+    
+    def test_orden_e_inexistentes(self):
+        """Prueba que se respeta el orden pedido y se informan los IDs inexistentes."""
+        response = self.client.get('/api/canciones?ids=2,99,1,2')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([c['id'] for c in data['items']], [2, 1])
+        self.assertEqual(data['inexistentes'], [99])
+        self.assertEqual(data['items'][1]['titulo'], "Canción Test 1")
+        
+        data = json.loads(self.client.get('/api/usuarios?ids=2&fields=nombre').data)
+        self.assertEqual(data, {'items': [{'nombre': 'Usuario Test 2'}], 'inexistentes': []})
+    
+    def test_una_consulta_y_cache(self):
+        """Prueba que los IDs se resuelven con una única consulta y luego desde la caché."""
+        with self._capturar_sentencias() as sentencias:
+            self.client.get('/api/canciones?ids=1,2')
+            self.assertEqual(len(sentencias), 1)
+            self.assertIn(' IN ', sentencias[0])
+            self.client.get('/api/canciones?ids=2,1')
+            self.assertEqual(len(sentencias), 1)
+    
+    def test_etag(self):
+        """Prueba el ETag de la colección con If-None-Match."""
+        etag = self.client.get('/api/canciones?ids=1,2').headers['ETag']
+        response = self.client.get('/api/canciones?ids=1,2', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        
+        self.client.put(
+            '/api/canciones/2',
+            data=json.dumps({"titulo": "Nuevo", "artista": "Artista Test 2"}),
+            content_type='application/json'
+        )
+        response = self.client.get('/api/canciones?ids=1,2', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['items'][1]['titulo'], "Nuevo")
+    
+    def test_ids_invalidos(self):
+        """Prueba la validación del parámetro `ids`."""
+        self.assertEqual(self.client.get('/api/canciones?ids=1,a').status_code, 400)
+        self.assertEqual(self.client.get('/api/canciones?ids=').status_code, 400)
+        self.app.config['LOTE_IDS_MAXIMO'] = 2
+        self.assertEqual(self.client.get('/api/usuarios?ids=1,2,3').status_code, 400)
+
+class TestAutocompletado(TestAPI):
+    """Pruebas del autocompletado por prefijo."""
+    
+    def _sugerencias(self, q):
+        response = self.client.get(f'/api/canciones/autocompletar?q={q}')
+        self.assertEqual(response.status_code, 200)
+        return [c['id'] for c in json.loads(response.data)['items']]
+    
+    def test_prefijos_normalizados_y_popularidad(self):
+        """Prueba la búsqueda sin acentos ni mayúsculas, por palabras y por popularidad."""
+        # La canción 1 tiene un favorito: va primero
+        self.assertEqual(self._sugerencias('CANCION'), [1, 2])
+        self.assertEqual(self._sugerencias('test 2'), [2])
+        self.assertEqual(self._sugerencias('artista test 1'), [1])
+        self.assertEqual(self._sugerencias('xyz'), [])
+        self.assertEqual(self._sugerencias(''), [])
+        self.assertEqual(self.client.get('/api/canciones/autocompletar?q=a&limit=x').status_code, 400)
+    
+    def test_actualizacion_incremental(self):
+        """Prueba que el índice refleja las escrituras confirmadas de canciones."""
+        self.client.post(
+            '/api/canciones',
+            data=json.dumps({"titulo": "Bohemian Rhapsody", "artista": "Queen"}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._sugerencias('rhap'), [3])
+        self.client.put(
+            '/api/canciones/3',
+            data=json.dumps({"titulo": "Under Pressure", "artista": "Queen"}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._sugerencias('rhap'), [])
+        self.assertEqual(self._sugerencias('pressure'), [3])
+        self.client.delete('/api/canciones/3')
+        self.assertEqual(self._sugerencias('queen'), [])
+    
+    def test_memoria_acotada(self):
+        """Prueba que, lleno el índice, solo entran canciones más populares que la menos popular."""
+        from musica_api.autocompletado import IndicePrefijos
+        indice = IndicePrefijos(maximo_canciones=2)
+        indice.agregar(1, "Uno", "A", 5)
+        indice.agregar(2, "Dos", "B", 1)
+        indice.agregar(3, "Tres", "C", 0)
+        indice.agregar(4, "Cuatro", "D", 3)
+        self.assertEqual(len(indice), 2)
+        self.assertEqual([c['id'] for c in indice.buscar('', 10)], [])
+        self.assertEqual([c['id'] for c in indice.buscar('c', 10)], [4])
+        self.assertEqual(indice.buscar('dos', 10), [])
+        
+        # Tras cambiar la popularidad, el desalojo usa los valores vigentes
+        indice.actualizar_popularidad({1: 2, 4: 8})
+        indice.agregar(4, "Cuatro", "D", 1)
+        indice.agregar(5, "Cinco", "E", 4)
+        self.assertEqual(sorted(c['id'] for c in indice.buscar('c', 10)), [5])
+        self.assertEqual([c['id'] for c in indice.buscar('uno', 10)], [1])
+    
+    def test_sin_indice(self):
+        """Prueba la búsqueda por prefijo en la base de datos con el índice deshabilitado."""
+        self.app.extensions.pop('autocompletado')
+        self.assertEqual(self._sugerencias('Canción'), [1, 2])
+        self.assertEqual(self._sugerencias('Artista Test 2'), [2])
+
+class TestBusquedaDifusa(TestAPI):
+    """Pruebas de la búsqueda difusa por trigramas."""
+    
+    def _buscar(self, q):
+        response = self.client.get(f'/api/canciones/buscar?modo=difusa&q={q}')
+        self.assertEqual(response.status_code, 200)
+        return [c['titulo'] for c in json.loads(response.data)['items']]
+    
+    def _crear(self, titulo, artista, album=None):
+        response = self.client.post(
+            '/api/canciones',
+            data=json.dumps({"titulo": titulo, "artista": artista, "album": album}),
+            content_type='application/json'
+        )
+        return json.loads(response.data)['id']
+    
+    def test_tolera_errores(self):
+        """Prueba que se encuentran artistas y títulos mal escritos, ordenados por similitud."""
+        self._crear("Enter Sandman", "Metallica", "Metallica")
+        self._crear("One", "Metallica", "...And Justice for All")
+        self._crear("Paranoid", "Black Sabbath")
+        
+        self.assertEqual(self._buscar('Metalica'), ["Enter Sandman", "One"])
+        self.assertEqual(self._buscar('sabath'), ["Paranoid"])
+        self.assertEqual(self._buscar('entr sandmn'), ["Enter Sandman"])
+        self.assertEqual(self._buscar('zzzz'), [])
+        self.assertEqual(
+            self.client.get('/api/canciones/buscar?modo=difusa').status_code, 400
+        )
+    
+    def test_genero_antes_del_limite(self):
+        """Prueba que el género se filtra antes de aplicar el límite."""
+        for titulo in ("Metallica I", "Metallica II", "Metallica III"):
+            self._crear(titulo, "Metallica")
+        response = self.client.post(
+            '/api/canciones',
+            data=json.dumps({"titulo": "Metallica Jazz", "artista": "Metalica", "genero": "Jazz"}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        
+        response = self.client.get('/api/canciones/buscar?modo=difusa&q=Metallica&genero=Jazz&limit=1')
+        data = json.loads(response.data)
+        self.assertEqual([c['titulo'] for c in data['items']], ["Metallica Jazz"])
+    
+    def test_una_sola_pagina(self):
+        """Prueba que la búsqueda difusa no devuelve cursor y rechaza `after`."""
+        for titulo in ("Metallica I", "Metallica II", "Metallica III"):
+            self._crear(titulo, "Metallica")
+        response = self.client.get('/api/canciones/buscar?modo=difusa&q=Metallica&limit=2')
+        data = json.loads(response.data)
+        self.assertEqual(len(data['items']), 2)
+        self.assertIsNone(data['next'])
+        
+        response = self.client.get('/api/canciones/buscar?modo=difusa&q=Metallica&after=abc')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_indice_sincronizado(self):
+        """Prueba que el índice sigue las escrituras y la importación masiva."""
+        id = self._crear("Yesterday", "The Beatles")
+        self.client.put(
+            f'/api/canciones/{id}',
+            data=json.dumps({"titulo": "Yesterday", "artista": "Rolling Stones"}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._buscar('beatles'), [])
+        self.assertEqual(self._buscar('roling'), ["Yesterday"])
+        self.client.delete(f'/api/canciones/{id}')
+        self.assertEqual(self._buscar('roling'), [])
+        
+        self.client.post(
+            '/api/canciones/lote',
+            data=json.dumps([{"titulo": "Bohemian Rhapsody", "artista": "Queen"}]),
+            content_type='application/json'
+        )
+        self.assertEqual(self._buscar('bohemain'), ["Bohemian Rhapsody"])
+
+class TestEliminacionEnCascada(TestAPI):
+    """Pruebas de la eliminación en cascada de favoritos en la base de datos."""
+    
+    def _sentencias_al_eliminar(self, url):
+        """Devuelve las sentencias SQL ejecutadas al atender un DELETE."""
+        with self._capturar_sentencias() as sentencias:
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        return sentencias
+    
+    def _crear_favoritos(self, cantidad):
+        with self.app.app_context():
+            canciones = [Cancion(titulo=f"Extra {i}", artista="Extra") for i in range(cantidad)]
+            db.session.add_all(canciones)
+            db.session.flush()
+            db.session.add_all([Favorito(id_usuario=1, id_cancion=c.id) for c in canciones])
+            db.session.commit()
+    
+    def test_eliminar_usuario(self):
+        """Prueba que los favoritos se borran sin cargarlos y se ajustan los contadores."""
+        self._crear_favoritos(5)
+        sentencias = self._sentencias_al_eliminar('/api/usuarios/1')
+        self.assertFalse([s for s in sentencias if s.lstrip().startswith('SELECT') and 'FROM favorito' in s])
+        self.assertFalse([s for s in sentencias if s.lstrip().startswith('DELETE FROM favorito')])
+        
+        with self.app.app_context():
+            self.assertEqual(Favorito.query.count(), 0)
+            self.assertEqual(db.session.get(Cancion, 1).favoritos_count, 0)
+            self.assertEqual(db.session.get(Cancion, 3).favoritos_count, 0)
+    
+    def test_eliminar_cancion(self):
+        """Prueba que eliminar una canción borra sus favoritos en la base de datos."""
+        sentencias = self._sentencias_al_eliminar('/api/canciones/1')
+        self.assertFalse([s for s in sentencias if 'FROM favorito' in s and s.lstrip().startswith('SELECT')])
+        
+        data = json.loads(self.client.get('/api/usuarios/1/favoritos').data)
+        self.assertEqual(data['canciones_favoritas'], [])
+        with self.app.app_context():
+            self.assertEqual(Favorito.query.count(), 0)
+
+class TestDatosSinteticos(TestAPI):
+    """Pruebas del generador de datos sintéticos (`flask sembrar`)."""
+    
+    def _sembrar(self, app):
+        resultado = app.test_cli_runner().invoke(args=[
+            'sembrar', '--canciones', '50', '--usuarios', '10', '--favoritos', '100',
+            '--semilla', '7', '--lote', '16'
+        ])
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        with app.app_context():
+            return (
+                [(c.titulo, c.artista, c.favoritos_count) for c in Cancion.query.order_by(Cancion.id)],
+                [(f.id_usuario, f.id_cancion) for f in Favorito.query.order_by(Favorito.id)]
+            )
+    
+    def test_determinista_y_coherente(self):
+        """Prueba que la misma semilla genera los mismos datos, con contadores coherentes."""
+        canciones, favoritos = self._sembrar(self.app)
+        self.assertEqual(len(canciones), 52)
+        self.assertGreater(len(favoritos), 0)
+        self.assertEqual(len(favoritos), len(set(favoritos)))
+        self.assertEqual(sum(c[2] for c in canciones), len(favoritos))
+        
+        otra = create_app('testing')
+        with otra.app_context():
+            db.create_all()
+            self._crear_datos_prueba()
+        self.assertEqual(self._sembrar(otra), (canciones, favoritos))
+        with otra.app_context():
+            db.drop_all()
+    
+    def test_indices_y_busquedas(self):
+        """Prueba que los índices y las búsquedas incluyen los datos generados."""
+        canciones, _ = self._sembrar(self.app)
+        with self.app.app_context():
+            from sqlalchemy import inspect
+            indices = {i['name'] for i in inspect(db.engine).get_indexes('favorito')}
+        self.assertIn('ix_favorito_usuario_fecha', indices)
+        
+        titulo = canciones[10][0]
+        data = json.loads(self.client.get(f'/api/canciones/buscar?modo=difusa&q={titulo}&limit=500').data)
+        self.assertIn(11, [c['id'] for c in data['items']])
+        data = json.loads(self.client.get('/api/usuarios/3/favoritos').data)
+        self.assertEqual(data['usuario']['id'], 3)
+
+class TestInstrumentacion(TestAPI):
+    """Pruebas para la medición por petición y la cabecera Server-Timing."""
+    
+    def setUp(self):
+        """Prepara una aplicación con la instrumentación habilitada."""
+        self.app = create_app('testing', {'INSTRUMENTACION': True})
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self._crear_datos_prueba()
+    
+    def test_cabecera_server_timing(self):
+        """Prueba que la respuesta informa de las consultas y los tiempos."""
+        response = self.client.get('/api/canciones?limit=10')
+        self.assertEqual(response.status_code, 200)
+        metricas = {m.split(';')[0].strip(): m for m in response.headers['Server-Timing'].split(',')}
+        self.assertEqual(set(metricas), {'db', 'serializacion', 'app', 'total'})
+        self.assertIn('desc="1 consultas"', metricas['db'])
+    
+    def test_acumulado_por_ruta(self):
+        """Prueba que las mediciones se acumulan por método y regla de URL."""
+        for id in (1, 2, 1):
+            self.client.get(f'/api/usuarios/{id}/favoritos')
+        self.client.post('/api/usuarios', json={'nombre': 'Nuevo', 'correo': 'nuevo@test.com'})
+        rutas = {r['ruta']: r for r in self.client.get('/api/instrumentacion').get_json()['rutas']}
+        self.assertEqual(rutas['GET /api/usuarios/<int:id>/favoritos']['peticiones'], 3)
+        self.assertGreaterEqual(rutas['POST /api/usuarios']['consultas_media'], 1)
+    
+    def test_deshabilitada(self):
+        """Prueba que sin instrumentación no hay cabecera ni endpoint."""
+        otra = create_app('testing').test_client()
+        self.assertNotIn('Server-Timing', otra.get('/api/ping').headers)
+        self.assertEqual(otra.get('/api/instrumentacion').status_code, 404)
+
+class TestMetricas(TestAPI):
+    """Pruebas para el endpoint /metrics en formato Prometheus."""
+    
+    def _metricas(self, cliente=None):
+        response = (cliente or self.client).get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        valores = {}
+        for linea in response.get_data(as_text=True).splitlines():
+            if linea and not linea.startswith('#'):
+                serie, valor = linea.rsplit(' ', 1)
+                valores[serie] = float(valor)
+        return valores
+    
+    def test_peticiones_y_latencias_por_ruta(self):
+        """Prueba los contadores por ruta, método y código y el histograma de latencias."""
+        for id in (1, 1, 99):
+            self.client.get(f'/api/canciones/{id}')
+        valores = self._metricas()
+        ruta = 'ruta="/api/canciones/<int:id>",metodo="GET"'
+        self.assertEqual(valores[f'musica_peticiones_total{{{ruta},codigo="200"}}'], 2)
+        self.assertEqual(valores[f'musica_peticiones_total{{{ruta},codigo="404"}}'], 1)
+        self.assertEqual(valores[f'musica_peticion_duracion_segundos_count{{{ruta}}}'], 3)
+        self.assertEqual(valores[f'musica_peticion_duracion_segundos_bucket{{{ruta},le="+Inf"}}'], 3)
+        self.assertEqual(valores['musica_peticiones_en_curso'], 1)
+        self.assertEqual(valores['musica_cache_aciertos_total'], 1)
+        self.assertAlmostEqual(
+            valores['musica_cache_tasa_aciertos'],
+            1 / (1 + valores['musica_cache_fallos_total'])
+        )
+    
+    def test_fragmentos_por_hilo(self):
+        """Prueba que los contadores de varios hilos se suman al exportar."""
+        import threading
+        from musica_api.metricas import Metricas
+        metricas = Metricas()
+        hilos = [
+            threading.Thread(target=lambda: [metricas.incrementar(('x',)) for _ in range(1000)])
+            for _ in range(4)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        metricas.incrementar(('x',))
+        self.assertEqual(metricas.instantanea()[('x',)], 4001)
+    
+    def test_agregacion_entre_procesos(self):
+        """Prueba que se suman los contadores de todos los procesos y los indicadores de los vivos."""
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        from musica_api.metricas import identidad_proceso
+        proceso = subprocess.Popen([sys.executable, '-c', 'pass'])
+        proceso.wait()
+        with tempfile.TemporaryDirectory() as directorio:
+            clave = ['musica_peticiones_total', '/api/ping', 'GET', '200']
+            # Un proceso vivo, uno terminado y uno anterior que tuvo el mismo PID que el vivo
+            for pid, inicio, en_curso in ((os.getppid(), 2, 2), (proceso.pid, 1, 5), (os.getppid(), 1, 7)):
+                with open(os.path.join(directorio, f'metricas-{pid}-{inicio}.json'), 'w') as archivo:
+                    json.dump({
+                        'pid': pid,
+                        'inicio': inicio,
+                        'contadores': [[clave, 10]],
+                        'indicadores': [[['musica_peticiones_en_curso'], en_curso]]
+                    }, archivo)
+            app = create_app('testing', {'METRICAS_DIRECTORIO': directorio})
+            cliente = app.test_client()
+            cliente.get('/api/ping')
+            valores = self._metricas(cliente)
+            serie = 'musica_peticiones_total{ruta="/api/ping",metodo="GET",codigo="200"}'
+            self.assertEqual(valores[serie], 31)
+            self.assertEqual(valores['musica_peticiones_en_curso'], 3)
+            
+            # Los archivos de procesos terminados se borran tras heredar sus contadores
+            pid, inicio = identidad_proceso()
+            self.assertEqual(
+                sorted(os.listdir(directorio)),
+                sorted([f'metricas-{os.getppid()}-2.json', f'metricas-{pid}-{inicio}.json'])
+            )
+            valores = self._metricas(cliente)
+            self.assertEqual(valores[serie], 31)
+
+class TestConsultasLentas(TestAPI):
+    """Pruebas para el registro de consultas lentas."""
+    
+    def setUp(self):
+        """Prepara una aplicación que registra todas las consultas."""
+        self.app = create_app('testing', {
+            'CONSULTAS_LENTAS_UMBRAL_MS': 0,
+            'CONSULTAS_LENTAS_MAXIMO': 5,
+            'CONSULTAS_LENTAS_EXPLAIN': True
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self._crear_datos_prueba()
+    
+    def _consultas(self, **cabeceras):
+        return self.client.get('/api/admin/consultas-lentas', headers=cabeceras)
+    
+    def test_captura_ruta_parametros_y_plan(self):
+        """Prueba que se registran la ruta, los parámetros y el plan de una búsqueda con ilike."""
+        self.app.config['BUSQUEDA_FTS'] = False
+        self.client.get('/api/canciones/buscar?titulo=Test')
+        response = self._consultas()
+        self.assertEqual(response.status_code, 200)
+        busqueda = next(c for c in response.get_json()['items'] if 'LIKE' in c['sentencia'].upper())
+        self.assertEqual(busqueda['ruta'], 'GET /api/canciones/buscar')
+        self.assertIn('%Test%', busqueda['parametros'])
+        self.assertTrue(any('SCAN cancion' in linea for linea in busqueda['plan']))
+    
+    def test_bufer_circular(self):
+        """Prueba que solo se conservan las últimas entradas y que DELETE vacía el registro."""
+        for id in (1, 2, 1, 2):
+            self.client.get(f'/api/usuarios/{id}/favoritos')
+        data = self._consultas().get_json()
+        self.assertEqual(len(data['items']), 5)
+        self.assertGreater(data['total'], 5)
+        self.assertEqual(self.client.delete('/api/admin/consultas-lentas').status_code, 204)
+        self.assertEqual(self._consultas().get_json()['items'], [])
+    
+    def test_log_json(self):
+        """Prueba la escritura de cada consulta lenta como log JSON, sin sus parámetros."""
+        self.app = create_app('testing', {'CONSULTAS_LENTAS_UMBRAL_MS': 0, 'CONSULTAS_LENTAS_LOG': True})
+        with self.assertLogs('musica_api.consultas_lentas', 'WARNING') as logs:
+            self.app.test_client().get('/api/usuarios/1')
+        entrada = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entrada['evento'], 'consulta_lenta')
+        self.assertIn('duracion_ms', entrada)
+        self.assertNotIn('parametros', entrada)
+    
+    def test_valores_por_defecto(self):
+        """Prueba que el plan y los logs solo están activos por defecto en desarrollo."""
+        from musica_api.config import DevelopmentConfig, ProductionConfig, TestingConfig
+        for config in (ProductionConfig, TestingConfig):
+            self.assertFalse(config.CONSULTAS_LENTAS_EXPLAIN)
+            self.assertFalse(config.CONSULTAS_LENTAS_LOG)
+        self.assertTrue(DevelopmentConfig.CONSULTAS_LENTAS_EXPLAIN)
+        self.assertTrue(DevelopmentConfig.CONSULTAS_LENTAS_LOG)
+    
+    def test_sentencia_vacia(self):
+        """Prueba que una sentencia vacía no rompe el registro."""
+        with self.app.app_context():
+            with db.engine.connect() as conexion:
+                conexion.exec_driver_sql("   ")
+        self.assertEqual(self._consultas().status_code, 200)
+    
+    def test_token_de_administracion(self):
+        """Prueba que, con ADMIN_TOKEN configurado, el endpoint exige la cabecera X-Admin-Token."""
+        self.app.config['ADMIN_TOKEN'] = 'secreto'
+        self.assertEqual(self._consultas().status_code, 403)
+        self.assertEqual(self._consultas(**{'X-Admin-Token': 'otro'}).status_code, 403)
+        self.assertEqual(self._consultas(**{'X-Admin-Token': 'secreto'}).status_code, 200)
+
 if __name__ == '__main__':
     unittest.main()
 